@@ -1,8 +1,109 @@
-from django.contrib import admin
-from django.db.models import Count
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Count, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse
+from django.utils.functional import cached_property
 import core.models as models
 from django.contrib.admin.sites import AlreadyRegistered
-from django.utils.html import format_html
+from django.contrib.admin.views.main import ChangeList
+from django.utils.html import format_html, format_html_join
+
+from core import choice_cache, plan_archive, plan_calendar
+from core.library_copy import copy_activities
+
+
+def count_related(model, field):
+    """Count of the `model` rows whose `field` points at the outer row.
+
+    A correlated subquery per count, so several of them don't join their
+    tables together and count the product, as ``Count(distinct=True)`` does.
+    """
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def estimate_count(model, using):
+    """The database's estimate of the rows in `model`'s table, or None.
+
+    Estimates come from the planner statistics (``ANALYZE``; PostgreSQL's
+    autovacuum keeps them fresh), so there are none before it has run.
+    """
+    connection = connections[using]
+    queries = {
+        "postgresql": "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+        "mysql": "SELECT table_rows FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_name = %s",
+        # The first number of an index's stat is the rows in the table
+        "sqlite": "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(queries[connection.vendor], [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # No statistics table (SQLite before its first ANALYZE)
+        return None
+    if row is None or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    # PostgreSQL says -1 for a table never analyzed
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that doesn't count every row of a big unfiltered table.
+
+    Without filters, and once the table's row estimate passes
+    ``ADMIN_COUNT_ESTIMATE_ABOVE``, the estimate is used as the count.
+    Filtered lists are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > settings.ADMIN_COUNT_ESTIMATE_ABOVE:
+                return estimate
+        return super().count
+
+
+class EstimatedCountMixin:
+    """For the admins of tables that can grow to millions of rows."""
+
+    paginator = EstimatedCountPaginator
+    # Otherwise every filtered page also counts the whole table
+    show_full_result_count = False
+
+
+class CachedRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """RelatedFieldListFilter with its choices cached, see core.choice_cache."""
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        return choice_cache.get_choices(
+            field.related_model,
+            [ordering],
+            lambda: super(CachedRelatedFieldListFilter, self).field_choices(
+                field, request, model_admin
+            ),
+        )
 
 
 # Inline for team members
@@ -12,11 +113,16 @@ class TeamMembershipInline(admin.TabularInline):
     fields = ("user", "role")
     raw_id_fields = ("user",)
 
+    def get_queryset(self, request):
+        # TeamMembership.__str__ (shown for each inline row) uses both sides;
+        # the formset only sets team_id, not the team itself.
+        return super().get_queryset(request).select_related("team", "user").seal()
+
 
 # Admin helper for Team-owned objects
 class TeamOwnedAdmin(admin.ModelAdmin):
     raw_id_fields = ("owner_team",)
-    list_filter = ("owner_team",)
+    list_filter = (("owner_team", CachedRelatedFieldListFilter),)
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "owner_team":
@@ -25,7 +131,7 @@ class TeamOwnedAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         """Add select_related for owner_team to avoid N+1 queries"""
-        return super().get_queryset(request).select_related("owner_team")
+        return super().get_queryset(request).select_related("owner_team").seal()
 
 
 # Inlines to show the through-model (activityEquipment) on both Activity and Equipment admin pages
@@ -35,6 +141,11 @@ class ActivityEquipmentInlineForActivity(admin.TabularInline):
     fields = ("equipment", "quantity_needed")
     raw_id_fields = ("equipment",)
 
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request).select_related("activity", "equipment").seal()
+        )
+
 
 class ActivityEquipmentInlineForEquipment(admin.TabularInline):
     model = models.ActivityEquipment
@@ -42,6 +153,11 @@ class ActivityEquipmentInlineForEquipment(admin.TabularInline):
     fields = ("activity", "quantity_needed")
     raw_id_fields = ("activity",)
 
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request).select_related("activity", "equipment").seal()
+        )
+
 
 # Inline to show activity images on Activity admin
 class ActivityImageInline(admin.TabularInline):
@@ -50,6 +166,9 @@ class ActivityImageInline(admin.TabularInline):
     fields = ("imageUrl", "description")
     readonly_fields = ()
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("activity").seal()
+
 
 # Inline to show location images on Location admin
 class LocationImageInline(admin.TabularInline):
@@ -58,6 +177,9 @@ class LocationImageInline(admin.TabularInline):
     fields = ("imageUrl", "description")
     readonly_fields = ()
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("location").seal()
+
 
 class VenueAdmin(TeamOwnedAdmin):
     list_display = ("name", "description", "address", "owner_team")
@@ -69,23 +191,72 @@ class LocationAdmin(TeamOwnedAdmin):
     inlines = [LocationImageInline]
     search_fields = ("name", "venue__name")
 
+    def get_queryset(self, request):
+        # Location.__str__ includes the venue name
+        return super().get_queryset(request).select_related("venue")
+
 
 class LocationImageAdmin(admin.ModelAdmin):
     list_display = ("id", "location", "imageUrl", "description")
     search_fields = ("location__name", "description")
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("location__venue").seal()
+
+
+class CopyToTeamActionForm(ActionForm):
+    target_team = forms.ModelChoiceField(
+        queryset=models.Team.objects.order_by("name"),
+        required=False,
+        label="Target team",
+    )
+
 
 class ActivityAdmin(TeamOwnedAdmin):
     list_display = ("name", "description", "difficultyLevel", "owner_team")
     inlines = [ActivityImageInline, ActivityEquipmentInlineForActivity]
     search_fields = ("name",)
     list_filter = ("difficultyLevel",)
+    action_form = CopyToTeamActionForm
+    actions = ["copy_to_team"]
+
+    @admin.action(
+        description="Copy selected activities to the target team",
+        permissions=["add"],
+    )
+    def copy_to_team(self, request, queryset):
+        # The action choices aren't set on a fresh form, so clean just the team
+        field = CopyToTeamActionForm.base_fields["target_team"]
+        try:
+            team = field.clean(request.POST.get("target_team"))
+        except ValidationError:
+            team = None
+        if team is None:
+            self.message_user(request, "Pick a target team.", messages.WARNING)
+            return
+        copy = copy_activities(queryset.values_list("pk", flat=True), team)
+        summary = copy.summary()
+        self.message_user(
+            request,
+            f"Copied {summary['activities']} activities to {team} "
+            f"({summary['equipment_created']} new equipment, "
+            f"{summary['images']} images).",
+        )
+        if copy.skipped:
+            self.message_user(
+                request,
+                f"Skipped, already in {team}: {', '.join(copy.skipped)}",
+                messages.WARNING,
+            )
 
 
 class ActivityImageAdmin(admin.ModelAdmin):
     list_display = ("id", "activity", "imageUrl", "description")
     search_fields = ("activity__name", "description")
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("activity").seal()
+
 
 class EquipmentAdmin(TeamOwnedAdmin):
     list_display = ("name", "quantityAvailable", "owner_team")
@@ -97,6 +268,9 @@ class ActivityEquipmentAdmin(TeamOwnedAdmin):
     list_display = ("activity", "equipment", "quantity_needed", "owner_team")
     search_fields = ("activity__name", "equipment__name")
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("activity", "equipment")
+
 
 class TeamAdmin(admin.ModelAdmin):
     list_display = (
@@ -113,11 +287,11 @@ class TeamAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.annotate(
-            _member_count=Count("memberships", distinct=True),
-            _activities_count=Count("core_activity_owned_objects", distinct=True),
-            _equipment_count=Count("core_equipment_owned_objects", distinct=True),
-            _venues_count=Count("core_venue_owned_objects", distinct=True),
-        )
+            _member_count=count_related(models.TeamMembership, "team"),
+            _activities_count=count_related(models.Activity, "owner_team"),
+            _equipment_count=count_related(models.Equipment, "owner_team"),
+            _venues_count=count_related(models.Venue, "owner_team"),
+        ).seal()
 
     def member_count(self, obj):
         return obj._member_count
@@ -147,7 +321,10 @@ class TeamAdmin(admin.ModelAdmin):
 class TeamMembershipAdmin(admin.ModelAdmin):
     list_display = ("team", "user", "role", "role_permissions")
     search_fields = ("team__name", "user__username")
-    list_filter = ("role", "team")
+    list_filter = ("role", ("team", CachedRelatedFieldListFilter))
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("team", "user").seal()
 
     def role_permissions(self, obj):
         perms = []
@@ -169,7 +346,13 @@ class PlanSectionItemInline(admin.TabularInline):
     raw_id_fields = ("location", "activity")
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related("location", "activity")
+        # PlanSectionItem.__str__ goes through location -> venue
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("location__venue", "activity")
+            .seal()
+        )
 
 
 class PlanSectionInline(admin.TabularInline):
@@ -178,8 +361,49 @@ class PlanSectionInline(admin.TabularInline):
     fields = ("name", "order")
     show_change_link = True  # Allows clicking through to edit section items
 
+    def get_queryset(self, request):
+        # PlanSection.__str__ goes through plan -> venue
+        return super().get_queryset(request).select_related("plan__venue").seal()
+
+
+class PlanCalendarChangeList(ChangeList):
+    """ChangeList whose date drill-down reads core.plan_calendar's rollup.
+
+    Used when there is no search and every filter is one the rollup has
+    (team, venue and session date); otherwise the plans are read as usual.
+    The rollup leaves out plans with no team, so without a team filter it is
+    only used while there are none.
+    """
+
+    rollup_params = {
+        "owner_team__id__exact",
+        "venue__id__exact",
+        "session_date__year",
+        "session_date__month",
+        "session_date__day",
+        "session_date__gte",
+        "session_date__lt",
+    }
+
+    def get_results(self, request):
+        super().get_results(request)
+        params = self.get_filters_params()
+        if self.query or not params.keys() <= self.rollup_params:
+            return
+        if any(len(values) != 1 for values in params.values()):
+            return
+        if (
+            "owner_team__id__exact" not in params
+            and models.Plan.objects.filter(owner_team__isnull=True).exists()
+        ):
+            return
+        # With the results fetched, only the date hierarchy reads this
+        self.queryset = plan_calendar.days(
+            {name: values[0] for name, values in params.items()}
+        )
+
 
-class PlanAdmin(TeamOwnedAdmin):
+class PlanAdmin(EstimatedCountMixin, TeamOwnedAdmin):
     list_display = (
         "venue",
         "session_date",
@@ -191,29 +415,193 @@ class PlanAdmin(TeamOwnedAdmin):
         "owner_team",
     )
     list_filter = (
-        "venue",
+        ("venue", CachedRelatedFieldListFilter),
         "ability_level",
         "session_date",
         "coach_qualification_required",
-        "owner_team",
+        ("owner_team", CachedRelatedFieldListFilter),
     )
     search_fields = ("venue__name", "plan_goal")
     inlines = [PlanSectionInline]
     date_hierarchy = "session_date"
 
+    def get_changelist(self, request, **kwargs):
+        return PlanCalendarChangeList
+
     def get_queryset(self, request):
         return super().get_queryset(request).select_related("venue")
 
 
-class PlanSectionAdmin(admin.ModelAdmin):
+class PlanSectionAdmin(EstimatedCountMixin, admin.ModelAdmin):
     list_display = ("name", "plan", "order")
-    list_filter = ("plan__venue", "plan__session_date")
+    list_filter = (
+        ("plan__venue", CachedRelatedFieldListFilter),
+        "plan__session_date",
+    )
     search_fields = ("name", "plan__venue__name")
     inlines = [PlanSectionItemInline]
     ordering = ["plan", "order"]
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related("plan", "plan__venue")
+        return (
+            super().get_queryset(request).select_related("plan", "plan__venue").seal()
+        )
+
+
+class ArchivedPlanAdmin(EstimatedCountMixin, TeamOwnedAdmin):
+    list_display = (
+        "venue",
+        "session_date",
+        "session_time",
+        "owner_team",
+        "original_id",
+        "archived_at",
+    )
+    search_fields = ("venue__name",)
+    date_hierarchy = "session_date"
+    fields = (
+        "original_id",
+        "owner_team",
+        "venue",
+        "session_date",
+        "session_time",
+        "archived_at",
+        "contents",
+    )
+    readonly_fields = fields
+    actions = ["restore"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        # The compressed document is only needed on the detail page
+        queryset = super().get_queryset(request).select_related("venue")
+        return queryset.defer("data")
+
+    @admin.display(description="Plan")
+    def contents(self, obj):
+        document = plan_archive.decompress(obj)
+        plan = document["plan"]
+        return format_html(
+            "<p>{} players, {}; {}</p><ol>{}</ol>",
+            plan["group_size"],
+            plan["ability_level"],
+            plan["plan_goal"] or "no goal",
+            format_html_join(
+                "",
+                "<li>{} ({} items)</li>",
+                (
+                    (section["name"], len(section["items"]))
+                    for section in document["sections"]
+                ),
+            ),
+        )
+
+    @admin.action(description="Restore selected plans", permissions=["delete"])
+    def restore(self, request, queryset):
+        done = 0
+        for done in plan_archive.restore_plans(queryset):
+            pass
+        self.message_user(request, f"Restored {done} plans.")
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        "created_at",
+        "method",
+        "path",
+        "user",
+        "status_code",
+        "profiler",
+        "duration_ms",
+        "query_count",
+        "sql_ms",
+    )
+    list_filter = ("profiler", "method", "status_code")
+    search_fields = ("path", "user__username")
+    fields = (
+        "created_at",
+        "method",
+        "path",
+        "user",
+        "status_code",
+        "profiler",
+        "duration_ms",
+        "query_count",
+        "sql_ms",
+        "time_by_area",
+        "top_functions",
+    )
+    readonly_fields = fields
+    actions = ["download_pstats", "download_collapsed_stacks"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("user").seal()
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def time_by_area(self, obj):
+        areas = sorted(
+            obj.summary.get("areas", {}).items(), key=lambda a: a[1], reverse=True
+        )
+        return format_html(
+            "<table><tr><th>Area</th><th>{}</th></tr>{}</table>",
+            obj.summary.get("unit", ""),
+            format_html_join("", "<tr><td>{}</td><td>{}</td></tr>", areas),
+        )
+
+    time_by_area.short_description = "Time by area"
+
+    def top_functions(self, obj):
+        functions = obj.summary.get("functions", [])
+        if not functions:
+            return "-"
+        columns = list(functions[0])
+        return format_html(
+            "<table><tr>{}</tr>{}</table>",
+            format_html_join("", "<th>{}</th>", ((c,) for c in columns)),
+            format_html_join(
+                "",
+                "<tr>{}</tr>",
+                (
+                    (format_html_join("", "<td>{}</td>", ((row[c],) for c in columns)),)
+                    for row in functions
+                ),
+            ),
+        )
+
+    top_functions.short_description = "Top functions"
+
+    @admin.action(description="Download pstats of the first selected cProfile profile")
+    def download_pstats(self, request, queryset):
+        profile = queryset.exclude(pstats=None).first()
+        if profile is None:
+            self.message_user(request, "None of the selected profiles use cProfile.")
+            return None
+        response = HttpResponse(
+            bytes(profile.pstats), content_type="application/octet-stream"
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="profile-{profile.pk}.pstats"'
+        )
+        return response
+
+    @admin.action(description="Download collapsed stacks (sampled profiles)")
+    def download_collapsed_stacks(self, request, queryset):
+        stacks = queryset.exclude(collapsed_stacks="").values_list(
+            "collapsed_stacks", flat=True
+        )
+        response = HttpResponse("\n".join(stacks), content_type="text/plain")
+        response["Content-Disposition"] = 'attachment; filename="profiles.folded"'
+        return response
 
 
 # Register models with safe AlreadyRegistered handling (use admin classes where defined)
@@ -229,6 +617,8 @@ for model, admin_class in (
     (models.TeamMembership, TeamMembershipAdmin),
     (models.Plan, PlanAdmin),
     (models.PlanSection, PlanSectionAdmin),
+    (models.ArchivedPlan, ArchivedPlanAdmin),
+    (models.RequestProfile, RequestProfileAdmin),
 ):
     try:
         if admin_class:
@@ -1,6 +1,27 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from core import (
+            choice_cache,
+            plan_calendar,
+            plan_versions,
+            sealing,
+            team_cache,
+            tree_stamps,
+        )
+
+        team_cache.connect()
+        choice_cache.connect()
+        plan_calendar.connect()
+        tree_stamps.connect()
+        if settings.PLAN_VERSIONING:
+            plan_versions.connect()
+
+        if sealing.sealing_mode() != "off":
+            sealing.install()
@@ -0,0 +1,80 @@
+"""Cached choice lists for the admin's related-field filters.
+
+A related-field filter lists every row of the related model (every team,
+every venue) on each changelist load. Here each such list is cached under a
+version token for its model, which is replaced once a transaction that
+saved or deleted one of the model's rows commits (see core.commit_batch).
+
+Only the models in ``MODELS`` are watched. Bulk operations send no
+signals; code using them on one of these models calls ``bump``.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+
+from core import commit_batch, models
+from core.routing import use_replica
+from core.team_cache import get_cache
+
+MODELS = (models.Team, models.Venue)
+
+
+def version_key(model):
+    return f"choices:{model._meta.label_lower}:version"
+
+
+def get_version(model):
+    cache = get_cache()
+    version = cache.get(version_key(model))
+    if version is None:
+        cache.add(version_key(model), time.time_ns(), None)
+        version = cache.get(version_key(model))
+    return version
+
+
+def get_choices(model, parts, build):
+    """The cached ``build()``, a choice list of `model`'s rows.
+
+    `parts` are whatever else the list depends on, e.g. its ordering.
+    """
+    if model not in MODELS:
+        return build()
+    digest = hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest()
+    key = f"choices:{model._meta.label_lower}:{get_version(model)}:{digest}"
+    cache = get_cache()
+    choices = cache.get(key)
+    if choices is None:
+        with use_replica(False):
+            choices = list(build())
+        cache.set(key, choices, settings.TEAM_CACHE_TIMEOUT)
+    return choices
+
+
+# Invalidation
+
+
+def flush(using, changed=()):
+    token = time.time_ns()
+    get_cache().set_many({version_key(model): token for model in changed}, None)
+
+
+def bump(model, using=DEFAULT_DB_ALIAS):
+    """Invalidate `model`'s choice lists when the current transaction commits."""
+    commit_batch.add(flush, using, changed=[model])
+
+
+def _row_changed(sender, using, raw=False, **kwargs):
+    if not raw:
+        bump(sender, using)
+
+
+def connect():
+    """Start invalidating on saves and deletes (done in CoreConfig.ready)."""
+    for model in MODELS:
+        post_save.connect(_row_changed, sender=model, dispatch_uid="choice_cache")
+        post_delete.connect(_row_changed, sender=model, dispatch_uid="choice_cache")
@@ -0,0 +1,53 @@
+"""Work batched until the current transaction commits.
+
+Signal handlers that react to changed rows (cache invalidation, version
+history) note what changed with ``add``. The handler then runs once after
+the transaction commits, with everything noted during it::
+
+    commit_batch.add(flush, using, plans=[plan.pk])
+    # ... after the commit: flush(using, plans={...}, sections=set())
+
+The batch is the on_commit callback itself, so it lives in the connection's
+queue: a rollback, of the transaction or of the savepoint it was queued in,
+drops it together with what it noted. Outside a transaction the handler
+runs straight away. Connections are per thread, so batches are too.
+"""
+
+from django.db import connections, transaction
+
+
+class Batch:
+    """What was noted for one handler in one transaction, as sets by name."""
+
+    def __init__(self, handler, using):
+        self.handler = handler
+        self.using = using
+        self.values = {}
+
+    def __call__(self):
+        self.handler(self.using, **self.values)
+
+
+def add(handler, using, **values):
+    """Run ``handler(using, name=set, ...)`` on commit, with `values` included.
+
+    Each keyword is an iterable whose items are added to the set of that
+    name; calls within one transaction share one batch and one call.
+    """
+    queued = connections[using].run_on_commit
+    batch = next(
+        (
+            entry[1]
+            for entry in queued
+            if isinstance(entry[1], Batch) and entry[1].handler is handler
+        ),
+        None,
+    )
+    queue = batch is None
+    if queue:
+        batch = Batch(handler, using)
+    for name, items in values.items():
+        batch.values.setdefault(name, set()).update(items)
+    if queue:
+        # Last: outside a transaction this calls the handler
+        transaction.on_commit(batch, using=using)
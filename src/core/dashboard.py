@@ -0,0 +1,138 @@
+"""A team's dashboard, built from independent panels run concurrently.
+
+Each panel is a plain function of ``(team_id, today)`` that runs its own
+queries. ``build()`` runs every panel at once, each on a thread from a
+small shared pool (``DASHBOARD_THREADS``), so the dashboard takes about as
+long as its slowest panel instead of the sum of all of them. Django's async
+ORM methods wouldn't help with that: they all run on one shared thread, one
+query after another.
+
+Each pool thread has its own database connection. As at the end of a
+request, it is closed after each panel if it has outlived CONN_MAX_AGE.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from core import models
+
+UPCOMING = 10
+RECENT_EDITS = 10
+CONFLICT_DAYS = 14
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.DASHBOARD_THREADS,
+                thread_name_prefix="dashboard",
+            )
+    return _executor
+
+
+# Panels
+
+
+def upcoming_plans(team_id, today):
+    return list(
+        models.Plan.objects.filter(owner_team=team_id, session_date__gte=today)
+        .order_by("session_date", "session_time")
+        .values(
+            "id",
+            "session_date",
+            "session_time",
+            "group_size",
+            "plan_goal",
+            venue_name=F("venue__name"),
+        )[:UPCOMING]
+    )
+
+
+def equipment_conflicts(team_id, today):
+    """Equipment that the plans on one day need more of than the team has.
+
+    Counted per day: each activity in a plan needs its own set.
+    """
+    items = "activity__plansectionitem__section__plan"
+    return list(
+        models.ActivityEquipment.objects.filter(
+            **{
+                f"{items}__owner_team": team_id,
+                f"{items}__session_date__range": (
+                    today,
+                    today + timedelta(days=CONFLICT_DAYS),
+                ),
+            }
+        )
+        .values(
+            "equipment_id",
+            day=F(f"{items}__session_date"),
+            name=F("equipment__name"),
+            available=F("equipment__quantityAvailable"),
+        )
+        .annotate(needed=Sum("quantity_needed"))
+        .filter(needed__gt=F("available"))
+        .order_by("day", "name")
+    )
+
+
+def recent_edits(team_id, today):
+    return list(
+        models.Activity.objects.filter(owner_team=team_id)
+        .order_by("-updated_at")
+        .values("id", "name", "updated_at")[:RECENT_EDITS]
+    )
+
+
+def member_counts(team_id, today):
+    """``{role: members}`` for the team."""
+    return dict(
+        models.TeamMembership.objects.filter(team=team_id)
+        .values_list("role")
+        .annotate(members=Count("pk"))
+        .order_by()
+    )
+
+
+PANELS = {
+    "upcoming_plans": upcoming_plans,
+    "equipment_conflicts": equipment_conflicts,
+    "recent_edits": recent_edits,
+    "member_counts": member_counts,
+}
+
+
+def _run(panel, team_id, today):
+    try:
+        return panel(team_id, today)
+    finally:
+        close_old_connections()
+
+
+async def build(team_id, today=None):
+    """``{panel name: data}`` for the team, with the panels run concurrently."""
+    today = today or timezone.localdate()
+    run = sync_to_async(_run, thread_sensitive=False, executor=get_executor())
+    results = await asyncio.gather(
+        *(run(panel, team_id, today) for panel in PANELS.values())
+    )
+    return dict(zip(PANELS, results))
+
+
+def build_serially(team_id, today=None):
+    """build(), one panel after another on this thread."""
+    today = today or timezone.localdate()
+    return {name: panel(team_id, today) for name, panel in PANELS.items()}
@@ -0,0 +1,102 @@
+"""Helpers for data migrations that have to touch large tables.
+
+Instead of loading every row and calling ``save()``, updates run as
+set-based ``UPDATE`` statements over keyset-paginated primary key ranges.
+Each batch commits on its own, so the write lock is released between
+batches and an interrupted run keeps the work it already did. Use them
+from a migration with ``atomic = False``, otherwise the whole migration is
+still one transaction::
+
+    def forwards(apps, schema_editor):
+        Plan = apps.get_model("core", "Plan")
+        remap_values(
+            Plan.objects.using(schema_editor.connection.alias),
+            "coach_qualification_required",
+            OLD_TO_NEW,
+        )
+
+Resuming is natural when the queryset excludes rows that are already done
+(``remap_values`` only selects rows still holding an old value); otherwise
+pass ``start_after`` with the last primary key that was logged.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, Max, Value, When
+
+logger = logging.getLogger("core.data_migrations")
+
+
+def keyset_batches(queryset, batch_size=1000, start_after=None):
+    """Yield ``(after, upto)`` primary key bounds covering `queryset` in order.
+
+    Each range ``after < pk <= upto`` holds at most `batch_size` matching
+    rows. Bounds are computed lazily, so rows updated out of the queryset
+    by an earlier batch are not counted again.
+    """
+    queryset = queryset.order_by("pk")
+    after = start_after
+    while True:
+        remaining = queryset if after is None else queryset.filter(pk__gt=after)
+        upto = remaining.values_list("pk", flat=True)[batch_size - 1 : batch_size]
+        upto = next(iter(upto), None)
+        if upto is None:
+            # Fewer than batch_size rows left: the last batch runs to the end
+            upto = remaining.aggregate(last=Max("pk"))["last"]
+            if upto is None:
+                return
+            yield after, upto
+            return
+        yield after, upto
+        after = upto
+
+
+def batched_update(queryset, batch_size=1000, start_after=None, label=None, **updates):
+    """Run ``queryset.update(**updates)`` in committed keyset batches.
+
+    Progress is logged to ``core.data_migrations`` after every batch,
+    including the last primary key done, which can be passed back as
+    `start_after`. Returns the number of rows updated.
+    """
+    label = label or queryset.model._meta.label
+    total = queryset.count()
+    done = 0
+    for after, upto in keyset_batches(queryset, batch_size, start_after):
+        batch = queryset.filter(pk__lte=upto)
+        if after is not None:
+            batch = batch.filter(pk__gt=after)
+        with transaction.atomic(using=queryset.db):
+            done += batch.update(**updates)
+        logger.info(
+            "%s: %d/%d rows updated (%d%%), up to pk %s",
+            label,
+            done,
+            total,
+            100 * done // total if total else 100,
+            upto,
+        )
+    return done
+
+
+def case_mapping(field, mapping):
+    """``CASE`` expression mapping `field`'s values, leaving others unchanged."""
+    return Case(
+        *[When(**{field: old}, then=Value(new)) for old, new in mapping.items()],
+        default=F(field),
+    )
+
+
+def remap_values(queryset, field, mapping, batch_size=1000, **kwargs):
+    """Rewrite `field` through `mapping` for every row still holding an old value.
+
+    One ``UPDATE ... SET field = CASE ... END`` per batch, whatever the size
+    of the mapping. Running it again only touches rows that were missed.
+    """
+    return batched_update(
+        queryset.filter(**{f"{field}__in": list(mapping)}),
+        batch_size=batch_size,
+        label=f"{queryset.model._meta.label}.{field}",
+        **{field: case_mapping(field, mapping)},
+        **kwargs,
+    )
@@ -0,0 +1,91 @@
+"""Batched, memoised loading of related rows for nested responses.
+
+Serializing nested data one object at a time follows each foreign key with
+a query of its own, so a page of plans with their sections, items,
+activities and equipment costs a query per row. A DataLoader is instead
+handed all the objects of one level together: ``loader.related(items,
+"activity")`` looks up every item's activity with one ``IN`` query, and
+``loader.children(activities, ActivityEquipment, "activity")`` every
+activity's equipment links with another. A response nested N levels deep
+then costs about N queries, however many rows it has.
+
+Loaded rows are kept for the life of the loader, so a row that is needed
+again (the same activity in ten plans, say) is never fetched twice. Use
+``for_request(request)`` to share one loader across a request.
+"""
+
+from collections import defaultdict
+
+
+class DataLoader:
+    def __init__(self, using=None):
+        self.using = using
+        # model -> {pk: instance, or None if there is no such row}
+        self._rows = defaultdict(dict)
+        # (model, foreign key attname) -> {parent pk: [instances]}
+        self._children = defaultdict(dict)
+
+    def _queryset(self, model):
+        queryset = model._default_manager.all()
+        return queryset.using(self.using) if self.using else queryset
+
+    def load(self, model, ids):
+        """``{pk: instance}`` for the rows of `model` with `ids`.
+
+        Only ids not loaded before are queried. Ids with no row (and None)
+        are left out of the result.
+        """
+        rows = self._rows[model]
+        missing = {pk for pk in ids if pk is not None and pk not in rows}
+        if missing:
+            rows.update(dict.fromkeys(missing))
+            for obj in self._queryset(model).filter(pk__in=missing):
+                rows[obj.pk] = obj
+        return {pk: rows[pk] for pk in ids if rows.get(pk) is not None}
+
+    def related(self, instances, name):
+        """Follow the foreign key `name` from all `instances` at once.
+
+        The related object (or None) is cached on each instance, so reading
+        ``instance.<name>`` afterwards makes no query. Returns ``{pk:
+        related instance}`` for the rows found.
+        """
+        if not instances:
+            return {}
+        field = instances[0]._meta.get_field(name)
+        loaded = self.load(
+            field.related_model, [getattr(obj, field.attname) for obj in instances]
+        )
+        for obj in instances:
+            field.set_cached_value(obj, loaded.get(getattr(obj, field.attname)))
+        return loaded
+
+    def children(self, instances, model, name):
+        """``{instance pk: [rows of model]}`` for the rows of `model` whose
+        foreign key `name` points at one of `instances`.
+
+        Each group keeps the model's default ordering, and each child has
+        its parent cached.
+        """
+        field = model._meta.get_field(name)
+        groups = self._children[model, field.attname]
+        parents = {obj.pk: obj for obj in instances}
+        missing = parents.keys() - groups.keys()
+        if missing:
+            for pk in missing:
+                groups[pk] = []
+            queryset = self._queryset(model).filter(**{f"{field.attname}__in": missing})
+            for row in queryset:
+                parent_id = getattr(row, field.attname)
+                field.set_cached_value(row, parents[parent_id])
+                groups[parent_id].append(row)
+                self._rows[model].setdefault(row.pk, row)
+        return {pk: groups[pk] for pk in parents}
+
+
+def for_request(request):
+    """The DataLoader for `request`, created on first use."""
+    loader = getattr(request, "_dataloader", None)
+    if loader is None:
+        loader = request._dataloader = DataLoader()
+    return loader
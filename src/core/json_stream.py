@@ -0,0 +1,97 @@
+"""Stream query results as a JSON array or NDJSON, a chunk at a time.
+
+Rows are read with ``values()`` through ``iterator(chunk_size=...)``, so
+only one chunk of them is in memory at once, and are encoded as they
+arrive. The text is handed on in pieces of about ``FLUSH_BYTES``: the first
+piece goes out as soon as the first row is read, so a large export starts
+arriving straight away instead of after the whole list has been built.
+
+Under WSGI the response iterates a generator. Under ASGI it gets an async
+generator over ``aiterator()`` instead: Django would otherwise read a sync
+iterator to the end before sending any of it.
+"""
+
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+FORMATS = ("json", "ndjson")
+CONTENT_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+
+class JsonWriter:
+    """Encodes rows for one response and collects the text into pieces."""
+
+    def __init__(self, fmt, flush_bytes=FLUSH_BYTES):
+        self.fmt = fmt
+        self.flush_bytes = flush_bytes
+        self.encode = DjangoJSONEncoder(
+            ensure_ascii=False, separators=(",", ":")
+        ).encode
+        self.rows = 0
+        self._parts = ["["] if fmt == "json" else []
+        self._size = 0
+
+    def write(self, row):
+        """Add `row`; returns a piece of text when one is ready, else None."""
+        text = self.encode(row)
+        if self.fmt == "ndjson":
+            text += "\n"
+        elif self.rows:
+            text = "," + text
+        self.rows += 1
+        self._parts.append(text)
+        self._size += len(text)
+        if self.rows == 1 or self._size >= self.flush_bytes:
+            return self.flush()
+        return None
+
+    def flush(self):
+        text = "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        return text
+
+    def finish(self):
+        """The rest of the text, closing the array."""
+        if self.fmt == "json":
+            self._parts.append("]")
+        return self.flush()
+
+
+def iter_json(rows, fmt):
+    """Yield `rows` (dicts) as JSON text in pieces."""
+    writer = JsonWriter(fmt)
+    for row in rows:
+        text = writer.write(row)
+        if text:
+            yield text
+    text = writer.finish()
+    if text:
+        yield text
+
+
+async def aiter_json(rows, fmt):
+    """iter_json for an async iterator of rows."""
+    writer = JsonWriter(fmt)
+    async for row in rows:
+        text = writer.write(row)
+        if text:
+            yield text
+    text = writer.finish()
+    if text:
+        yield text
+
+
+def stream_queryset(request, queryset, fields, fmt, chunk_size=CHUNK_SIZE):
+    """StreamingHttpResponse with the `fields` of every row in `queryset`."""
+    # The rows are read after the view has returned, outside any routing
+    # context it set up, so pin the database chosen now
+    queryset = queryset.using(queryset.db).values(*fields)
+    if isinstance(request, ASGIRequest):
+        content = aiter_json(queryset.aiterator(chunk_size=chunk_size), fmt)
+    else:
+        content = iter_json(queryset.iterator(chunk_size=chunk_size), fmt)
+    return StreamingHttpResponse(content, content_type=CONTENT_TYPES[fmt])
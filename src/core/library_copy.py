@@ -0,0 +1,180 @@
+"""Copy a subset of one team's activity library into another team.
+
+The selected activities are cloned together with their ActivityEquipment
+rows, the equipment those rows reference and their ActivityImage files.
+Equipment is matched to the target team's existing equipment by name
+(case-insensitively) and only created when missing. Activities whose name
+is already in the target library are skipped, since names are unique per
+team.
+
+Everything is read and written in bulk, so the number of queries is fixed
+per model, however many activities are copied: the rows are loaded with one
+query per model, new ids come back from ``bulk_create``, and the old→new ids
+are kept in ``activity_ids``/``equipment_ids`` to remap the through rows.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from core import models, team_cache
+
+
+def clone(obj, **overrides):
+    """Unsaved copy of `obj` with the given attribute values replaced."""
+    values = {
+        field.attname: getattr(obj, field.attname)
+        for field in obj._meta.concrete_fields
+        if not field.primary_key
+    }
+    values.update(overrides)
+    return type(obj)(**values)
+
+
+def _copy_file(storage, name):
+    try:
+        source = storage.open(name, "rb")
+    except FileNotFoundError:
+        return None
+    with source:
+        return storage.save(name, source)
+
+
+class LibraryCopy:
+    def __init__(self, target_team, storage=default_storage, workers=4):
+        self.team = target_team
+        self.storage = storage
+        self.workers = workers
+        self.activity_ids = {}
+        self.equipment_ids = {}
+        self.created_equipment = 0
+        self.links = 0
+        self.images = 0
+        self.skipped = []
+
+    def run(self, activity_ids):
+        activities = list(
+            models.Activity.objects.filter(pk__in=activity_ids)
+            .exclude(owner_team=self.team)
+            .order_by("pk")
+        )
+        taken = set(
+            models.Activity.objects.filter(
+                owner_team=self.team, name__in=[a.name for a in activities]
+            ).values_list("name", flat=True)
+        )
+        selected = []
+        for activity in activities:
+            if activity.name in taken:
+                self.skipped.append(activity.name)
+            else:
+                # The same name from two source teams: the first one wins
+                taken.add(activity.name)
+                selected.append(activity)
+        activities = selected
+        if not activities:
+            return self
+
+        source_ids = [a.pk for a in activities]
+        links = list(
+            models.ActivityEquipment.objects.filter(
+                activity_id__in=source_ids
+            ).select_related("equipment")
+        )
+        images = list(models.ActivityImage.objects.filter(activity_id__in=source_ids))
+
+        # Files first: a storage copy can't be rolled back with the rows
+        copies = self.copy_files([image.imageUrl.name for image in images])
+        try:
+            with transaction.atomic():
+                self.copy_equipment(links)
+                created = models.Activity.objects.bulk_create(
+                    [clone(a, owner_team_id=self.team.pk) for a in activities]
+                )
+                self.activity_ids = {
+                    old.pk: new.pk for old, new in zip(activities, created)
+                }
+                self.links = len(
+                    models.ActivityEquipment.objects.bulk_create(
+                        [
+                            clone(
+                                link,
+                                owner_team_id=self.team.pk,
+                                activity_id=self.activity_ids[link.activity_id],
+                                equipment_id=self.equipment_ids[link.equipment_id],
+                            )
+                            for link in links
+                        ]
+                    )
+                )
+                self.images = len(
+                    models.ActivityImage.objects.bulk_create(
+                        [
+                            clone(
+                                image,
+                                owner_team_id=self.team.pk,
+                                activity_id=self.activity_ids[image.activity_id],
+                                imageUrl=name,
+                            )
+                            for image, name in zip(images, copies)
+                            if name is not None
+                        ]
+                    )
+                )
+                team_cache.bump(self.team.pk)
+        except BaseException:
+            for name in filter(None, copies):
+                self.storage.delete(name)
+            raise
+        return self
+
+    def copy_files(self, names):
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = [pool.submit(_copy_file, self.storage, name) for name in names]
+        failed = [future for future in futures if future.exception() is not None]
+        if failed:
+            for future in futures:
+                if future.exception() is None and future.result():
+                    self.storage.delete(future.result())
+            raise failed[0].exception()
+        return [future.result() for future in futures]
+
+    def copy_equipment(self, links):
+        # A team's equipment list is short, so match names in Python, exactly
+        # as the (owner_team, name) constraint does
+        existing = dict(
+            models.Equipment.objects.filter(owner_team=self.team).values_list(
+                "name", "pk"
+            )
+        )
+        missing = {}
+        for link in links:
+            equipment = link.equipment
+            key = equipment.name
+            if key in existing:
+                self.equipment_ids[equipment.pk] = existing[key]
+            else:
+                missing.setdefault(key, []).append(equipment)
+
+        created = models.Equipment.objects.bulk_create(
+            [clone(group[0], owner_team_id=self.team.pk) for group in missing.values()]
+        )
+        self.created_equipment = len(created)
+        for group, new in zip(missing.values(), created):
+            for equipment in group:
+                self.equipment_ids[equipment.pk] = new.pk
+
+    def summary(self):
+        return {
+            "activities": len(self.activity_ids),
+            "equipment_created": self.created_equipment,
+            "activity_equipment": self.links,
+            "images": self.images,
+            "skipped": self.skipped,
+        }
+
+
+def copy_activities(activity_ids, target_team, **kwargs):
+    """Copy the activities with `activity_ids` into `target_team`."""
+    return LibraryCopy(target_team, **kwargs).run(activity_ids)
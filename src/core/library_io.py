@@ -0,0 +1,367 @@
+"""Streaming import/export of a team's activity library as CSV or JSON Lines.
+
+Two kinds of file are supported:
+
+``equipment``
+    name, description, quantityAvailable, safetyInstructions
+``activities``
+    name, description, durationMinutes, difficultyLevel, coachingPoints,
+    safetyConsiderations, equipment
+
+An activity's ``equipment`` names the equipment it needs, with an optional
+quantity: ``Cones:4; Bibs`` in CSV, ``[{"name": "Cones", "quantity": 4},
+{"name": "Bibs"}]`` in JSONL. Names are looked up in the team's equipment
+(case-insensitively), so import equipment first. When the column is present
+it replaces the activity's equipment list; when it is absent the existing
+links are left alone.
+
+Imports upsert on ``(owner_team, name)`` with ``bulk_create(update_conflicts=
+True)``, committing one batch at a time. An existing row only has the
+columns the record supplies updated; columns a JSONL record leaves out keep
+their values. Invalid rows are reported with their
+line number and skipped instead of aborting the import. Both directions work
+a batch at a time, so memory use does not grow with the size of the file.
+"""
+
+import codecs
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from core import models, team_cache, tree_stamps
+
+FORMATS = ("csv", "jsonl")
+CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+KINDS = {
+    "equipment": (
+        models.Equipment,
+        ["name", "description", "quantityAvailable", "safetyInstructions"],
+    ),
+    "activities": (
+        models.Activity,
+        [
+            "name",
+            "description",
+            "durationMinutes",
+            "difficultyLevel",
+            "coachingPoints",
+            "safetyConsiderations",
+        ],
+    ),
+}
+
+
+def columns(kind):
+    _, fields = KINDS[kind]
+    return fields + ["equipment"] if kind == "activities" else fields
+
+
+def find_team(value):
+    """Look a team up by primary key or exact name."""
+    if str(value).isdigit():
+        return models.Team.objects.get(pk=value)
+    return models.Team.objects.get(name=value)
+
+
+# Export
+
+
+def iter_records(team, kind, batch_size=2000):
+    """Yield the team's library entries as dicts, in primary key order."""
+    model, fields = KINDS[kind]
+    queryset = model.objects.filter(owner_team=team).order_by("pk")
+    last = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last).values("pk", *fields)[:batch_size])
+        if not batch:
+            return
+        last = batch[-1]["pk"]
+        needs = {}
+        if kind == "activities":
+            links = (
+                models.ActivityEquipment.objects.filter(
+                    activity_id__in=[row["pk"] for row in batch]
+                )
+                .order_by("equipment__name")
+                .values_list("activity_id", "equipment__name", "quantity_needed")
+            )
+            for activity_id, name, quantity in links:
+                needs.setdefault(activity_id, []).append(
+                    {"name": name, "quantity": quantity}
+                )
+        for row in batch:
+            pk = row.pop("pk")
+            if kind == "activities":
+                row["equipment"] = needs.get(pk, [])
+            yield row
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def write_records(records, kind, fmt):
+    """Serialize `records` to an iterator of text chunks, one per row."""
+    if fmt == "jsonl":
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+        return
+
+    writer = csv.writer(_Echo())
+    header = columns(kind)
+    yield writer.writerow(header)
+    for record in records:
+        if "equipment" in record:
+            record = {**record, "equipment": format_equipment(record["equipment"])}
+        yield writer.writerow(
+            ["" if record[name] is None else record[name] for name in header]
+        )
+
+
+def format_equipment(needs):
+    return "; ".join(
+        need["name"] if need["quantity"] == 1 else f"{need['name']}:{need['quantity']}"
+        for need in needs
+    )
+
+
+# Import
+
+
+def read_records(lines, fmt):
+    """Yield ``(line number, record, error)`` for each row of the input.
+
+    `lines` is any iterable of text lines, e.g. an open file or a decoded
+    upload.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            record.pop(None, None)  # Cells beyond the header
+            yield reader.line_num, record, None
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield number, None, f"Invalid JSON: {exc.msg}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Expected a JSON object"
+            continue
+        yield number, record, None
+
+
+def decode_lines(stream, encoding="utf-8-sig"):
+    """Decode an iterable of byte lines, such as an upload or a request body."""
+    return codecs.iterdecode(stream, encoding)
+
+
+def parse_equipment(value):
+    """Turn the ``equipment`` cell into ``{name: quantity}``."""
+    if value in (None, ""):
+        return {}
+    if isinstance(value, str):
+        value = [part.strip() for part in value.split(";") if part.strip()]
+    if not isinstance(value, list):
+        raise ValidationError("equipment must be a list")
+
+    needs = {}
+    for need in value:
+        quantity = 1
+        if isinstance(need, dict):
+            name, quantity = need.get("name"), need.get("quantity", 1)
+        elif isinstance(need, str):
+            name, _, count = need.rpartition(":")
+            if not name or not count.strip().isdigit():
+                name, count = need, "1"
+            quantity = int(count)
+        else:
+            raise ValidationError(f"Invalid equipment entry {need!r}")
+        if not isinstance(name, str) or not name.strip():
+            raise ValidationError(f"Invalid equipment entry {need!r}")
+        if not isinstance(quantity, int) or quantity < 1:
+            raise ValidationError(f"Invalid quantity for {name!r}")
+        needs[name.strip()] = quantity
+    return needs
+
+
+class ImportReport:
+    def __init__(self, max_errors=1000):
+        self.rows = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+class LibraryImporter:
+    """Upsert library rows into one team, `batch_size` rows per transaction."""
+
+    def __init__(self, team, kind, batch_size=1000, max_errors=1000):
+        self.team = team
+        self.kind = kind
+        self.model, self.fields = KINDS[kind]
+        self.batch_size = batch_size
+        self.report = ImportReport(max_errors)
+        self.equipment = {}
+        if kind == "activities":
+            # Exact names, as the (owner_team, name) constraint compares them
+            self.equipment = dict(
+                models.Equipment.objects.filter(owner_team=team).values_list(
+                    "name", "pk"
+                )
+            )
+
+    def run(self, lines, fmt):
+        # Keyed by name: a repeated name within a batch keeps the last row,
+        # since one upsert statement can't touch the same row twice
+        pending = {}
+        try:
+            for line, record, error in read_records(lines, fmt):
+                self.report.rows += 1
+                if error is None:
+                    try:
+                        obj, needs, supplied = self.build(record)
+                    except ValidationError as exc:
+                        error = "; ".join(format_errors(exc))
+                if error is not None:
+                    self.report.add_error(line, error)
+                    continue
+                pending[obj.name] = (obj, needs, supplied)
+                if len(pending) >= self.batch_size:
+                    self.flush(pending)
+                    pending = {}
+        except (UnicodeDecodeError, csv.Error) as exc:
+            self.report.add_error(None, f"Unreadable input, stopped: {exc}")
+        if pending:
+            self.flush(pending)
+        return self.report
+
+    def build(self, record):
+        data = {}
+        for name in self.fields:
+            if name not in record:
+                continue
+            field = self.model._meta.get_field(name)
+            value = record[name]
+            if value in ("", None):
+                if field.has_default():
+                    value = field.get_default()
+                else:
+                    value = None if field.null else ""
+            data[name] = value
+
+        obj = self.model(owner_team=self.team, **data)
+        # The team is trusted; validating the FK would cost a query per row
+        obj.full_clean(
+            exclude=["owner_team"], validate_unique=False, validate_constraints=False
+        )
+        supplied = frozenset(data) - {"name"}
+
+        needs = None
+        if self.kind == "activities" and "equipment" in record:
+            needs = parse_equipment(record["equipment"])
+            unknown = [name for name in needs if name not in self.equipment]
+            if unknown:
+                raise ValidationError(f"Unknown equipment: {', '.join(unknown)}")
+            needs = {self.equipment[name]: qty for name, qty in needs.items()}
+        return obj, needs, supplied
+
+    def flush(self, pending):
+        # One upsert per set of supplied columns, so that no row overwrites
+        # a column it left out (one group for CSV, where every row has all)
+        groups = {}
+        for obj, _, supplied in pending.values():
+            groups.setdefault(supplied, []).append(obj)
+        with transaction.atomic():
+            for supplied, objs in groups.items():
+                if supplied:
+                    self.model.objects.bulk_create(
+                        objs,
+                        update_conflicts=True,
+                        unique_fields=["owner_team", "name"],
+                        update_fields=sorted(supplied | {"updated_at"}),
+                    )
+                else:
+                    self.model.objects.bulk_create(objs, ignore_conflicts=True)
+            if self.kind == "activities":
+                self.link_equipment(pending)
+                tree_stamps.touch_plans(
+                    models.Plan.objects.filter(
+                        sections__items__activity__owner_team=self.team,
+                        sections__items__activity__name__in=list(pending),
+                    )
+                )
+            team_cache.bump(self.team.pk)
+        self.report.imported += len(pending)
+
+    def link_equipment(self, pending):
+        replace = {
+            name: needs for name, (_, needs, _) in pending.items() if needs is not None
+        }
+        if not replace:
+            return
+        ids = dict(
+            models.Activity.objects.filter(
+                owner_team=self.team, name__in=list(replace)
+            ).values_list("name", "pk")
+        )
+        wanted = {
+            (ids[name], equipment_id): quantity
+            for name, needs in replace.items()
+            for equipment_id, quantity in needs.items()
+        }
+        existing = models.ActivityEquipment.objects.filter(
+            activity_id__in=ids.values()
+        ).values_list("pk", "activity_id", "equipment_id")
+        stale = [pk for pk, *key in existing if tuple(key) not in wanted]
+        if stale:
+            models.ActivityEquipment.objects.filter(pk__in=stale).delete()
+        if wanted:
+            models.ActivityEquipment.objects.bulk_create(
+                [
+                    models.ActivityEquipment(
+                        owner_team=self.team,
+                        activity_id=activity_id,
+                        equipment_id=equipment_id,
+                        quantity_needed=quantity,
+                    )
+                    for (activity_id, equipment_id), quantity in wanted.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["activity", "equipment"],
+                update_fields=["quantity_needed", "owner_team", "updated_at"],
+            )
+
+
+def format_errors(exc):
+    if hasattr(exc, "error_dict"):
+        return [
+            f"{field}: {message}"
+            for field, messages in exc.message_dict.items()
+            for message in messages
+        ]
+    return exc.messages
@@ -0,0 +1,566 @@
+"""In-process load generation for the WSGI and ASGI applications.
+
+Virtual users play a weighted mix of scenarios (browse the library, open a
+plan, edit a plan item, log in) against one of three transports:
+
+``wsgi``
+    ``flowforge.wsgi.application`` called directly, one thread per user,
+    the way a threaded WSGI server would run it.
+``asgi``
+    ``flowforge.asgi.application`` awaited directly, one task per user on a
+    single event loop, the way an ASGI server would run it.
+``http``
+    A real server over HTTP keep-alive connections, one thread per user.
+
+Scenarios are generators that yield ``Request`` objects and receive the
+``Response`` back, so the same scenario code runs on the sync and async
+drivers. Latencies go into ``LatencyHistogram``, a log-linear histogram in
+the style of HdrHistogram: constant relative error at any magnitude, cheap
+to record into and to merge across users.
+"""
+
+import asyncio
+import http.client
+import math
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from http.cookies import SimpleCookie
+from io import BytesIO
+from random import Random
+from urllib.parse import urlencode, urlsplit
+
+
+class LatencyHistogram:
+    """Latencies in microseconds, bucketed with `significant_bits` of precision.
+
+    Values below ``2 ** significant_bits`` are exact; above that each power
+    of two is split into ``2 ** (significant_bits - 1)`` buckets, so the
+    default of 7 bits keeps every reported value within about 1.6%.
+    """
+
+    def __init__(self, significant_bits=7):
+        self.significant_bits = significant_bits
+        self.counts = Counter()
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds):
+        value = max(1, round(seconds * 1_000_000))
+        shift = max(0, value.bit_length() - self.significant_bits)
+        self.counts[(value >> shift) << shift] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """Highest value equivalent to the recorded one at `percent`, in µs."""
+        if not self.count:
+            return 0
+        target = max(1, math.ceil(percent / 100 * self.count))
+        seen = 0
+        for lower in sorted(self.counts):
+            seen += self.counts[lower]
+            if seen >= target:
+                shift = max(0, lower.bit_length() - self.significant_bits)
+                return min(lower + (1 << shift) - 1, self.max)
+        return self.max
+
+    def as_dict(self):
+        result = {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count / 1000, 3) if self.count else 0,
+        }
+        for percent in (50, 90, 99, 99.9):
+            result[f"p{percent}_ms"] = round(self.percentile(percent) / 1000, 3)
+        result["max_ms"] = round(self.max / 1000, 3)
+        return result
+
+
+class LoadStats:
+    """Per-scenario latency histograms and error counts for one or more users."""
+
+    def __init__(self):
+        self.latency = {}
+        self.errors = Counter()
+
+    def record(self, scenario, seconds, ok):
+        self.latency.setdefault(scenario, LatencyHistogram()).record(seconds)
+        if not ok:
+            self.errors[scenario] += 1
+
+    def merge(self, other):
+        for scenario, histogram in other.latency.items():
+            self.latency.setdefault(scenario, LatencyHistogram()).merge(histogram)
+        self.errors.update(other.errors)
+
+    def as_dict(self, elapsed):
+        overall = LatencyHistogram()
+        for histogram in self.latency.values():
+            overall.merge(histogram)
+        return {
+            "seconds": round(elapsed, 2),
+            "requests": overall.count,
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(overall.count / elapsed, 1) if elapsed else 0,
+            "latency": overall.as_dict(),
+            "scenarios": {
+                scenario: {**histogram.as_dict(), "errors": self.errors[scenario]}
+                for scenario, histogram in sorted(self.latency.items())
+            },
+        }
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    data: dict = None
+    expect: tuple = (200,)
+
+
+@dataclass
+class Response:
+    status: int
+    headers: list
+    body: bytes
+
+
+@dataclass
+class Targets:
+    """Objects the scenarios pick from, collected up front."""
+
+    username: str
+    password: str
+    activities: list
+    activity_pages: int
+    # (plan id, [section ids])
+    plans: list = field(default_factory=list)
+
+
+def collect_targets(username, password, limit=500, seed=1):
+    from core import models
+
+    rng = Random(seed)
+    activity_ids = list(models.Activity.objects.values_list("pk", flat=True))
+    plan_ids = list(models.Plan.objects.values_list("pk", flat=True))
+    plan_ids = rng.sample(plan_ids, min(limit, len(plan_ids)))
+    sections = {}
+    for plan_id, section_id in models.PlanSection.objects.filter(
+        plan_id__in=plan_ids
+    ).values_list("plan_id", "pk"):
+        sections.setdefault(plan_id, []).append(section_id)
+    return Targets(
+        username=username,
+        password=password,
+        activities=rng.sample(activity_ids, min(limit, len(activity_ids))),
+        activity_pages=max(1, math.ceil(len(activity_ids) / 100)),
+        plans=[
+            (plan_id, sections[plan_id]) for plan_id in plan_ids if plan_id in sections
+        ],
+    )
+
+
+class FormParser(HTMLParser):
+    """Collect the fields a browser would submit for the form with `form_id`."""
+
+    def __init__(self, form_id):
+        super().__init__()
+        self.form_id = form_id
+        self.fields = {}
+        self._in_form = False
+        self._select = None
+        self._textarea = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form":
+            self._in_form = attrs.get("id") == self.form_id
+        if not self._in_form or "name" not in attrs and tag != "option":
+            return
+        if tag == "input":
+            kind = attrs.get("type", "text")
+            if kind in ("submit", "button", "image", "reset", "file"):
+                return
+            if kind in ("checkbox", "radio") and "checked" not in attrs:
+                return
+            self.fields[attrs["name"]] = attrs.get("value") or (
+                "on" if kind in ("checkbox", "radio") else ""
+            )
+        elif tag == "select":
+            self._select = attrs["name"]
+        elif tag == "option" and self._select:
+            # Single selects submit the first option unless one is selected
+            if self._select not in self.fields or "selected" in attrs:
+                self.fields[self._select] = attrs.get("value", "")
+        elif tag == "textarea":
+            self._textarea = attrs["name"]
+            self.fields[self._textarea] = ""
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._in_form = False
+        elif tag == "select":
+            self._select = None
+        elif tag == "textarea" and self._textarea:
+            # Browsers drop the newline that follows <textarea>
+            value = self.fields[self._textarea]
+            self.fields[self._textarea] = value.removeprefix("\n")
+            self._textarea = None
+
+    def handle_data(self, data):
+        if self._textarea:
+            self.fields[self._textarea] += data
+
+
+def parse_form(html, form_id):
+    parser = FormParser(form_id)
+    parser.feed(html.decode())
+    return parser.fields
+
+
+# Scenarios
+
+
+def browse_library(user, targets, rng):
+    page = rng.randint(1, targets.activity_pages)
+    yield Request("GET", f"/admin/core/activity/?p={page}")
+    if rng.random() < 0.3:
+        yield Request("GET", "/admin/core/activity/?q=" + rng.choice(["Drill", "Game"]))
+    yield Request(
+        "GET", f"/admin/core/activity/{rng.choice(targets.activities)}/change/"
+    )
+
+
+def open_plan(user, targets, rng):
+    plan_id, section_ids = rng.choice(targets.plans)
+    yield Request("GET", f"/admin/core/plan/{plan_id}/change/")
+    yield Request("GET", f"/admin/core/plansection/{rng.choice(section_ids)}/change/")
+
+
+def edit_item(user, targets, rng):
+    _, section_ids = rng.choice(targets.plans)
+    url = f"/admin/core/plansection/{rng.choice(section_ids)}/change/"
+    response = yield Request("GET", url)
+    data = parse_form(response.body, "plansection_form")
+    if "items-0-notes" in data:
+        data["items-0-notes"] = f"Edited under load ({rng.randrange(10**6)})"
+    yield Request("POST", url, data, expect=(302,))
+
+
+def log_in(user, targets, rng):
+    user.cookies.clear()
+    yield Request("GET", "/admin/login/?next=/admin/")
+    yield Request(
+        "POST",
+        "/admin/login/?next=/admin/",
+        {
+            "username": targets.username,
+            "password": targets.password,
+            "csrfmiddlewaretoken": user.cookies.get("csrftoken", ""),
+            "next": "/admin/",
+        },
+        expect=(302,),
+    )
+
+
+SCENARIOS = {
+    "browse": browse_library,
+    "plan": open_plan,
+    "edit": edit_item,
+    "login": log_in,
+}
+
+
+def parse_mix(value):
+    """Parse ``"browse=50,plan=30"`` into ``{"browse": 50.0, "plan": 30.0}``."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(
+                f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}"
+            )
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class VirtualUser:
+    """One simulated browser: a cookie jar, an RNG and its own stats."""
+
+    def __init__(self, targets, mix, seed, host):
+        self.targets = targets
+        self.mix = mix
+        self.rng = Random(seed)
+        self.host = host
+        self.cookies = {}
+        self.stats = LoadStats()
+
+    def pick(self):
+        name = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        return name, SCENARIOS[name](self, self.targets, self.rng)
+
+    def build(self, request):
+        path, _, query = request.path.partition("?")
+        headers = {"Host": self.host}
+        body = b""
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        if request.data is not None:
+            body = urlencode(request.data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers["X-CSRFToken"] = self.cookies.get("csrftoken", "")
+        return request.method, path, query, body, headers
+
+    def absorb(self, response):
+        for name, value in response.headers:
+            if name.lower() != "set-cookie":
+                continue
+            cookie = SimpleCookie()
+            cookie.load(value)
+            for key, morsel in cookie.items():
+                if morsel["max-age"] == "0":
+                    self.cookies.pop(key, None)
+                else:
+                    self.cookies[key] = morsel.value
+
+    def log_in(self, transport):
+        self.play(
+            transport, "login", log_in(self, self.targets, self.rng), record=False
+        )
+
+    def run(self, transport, deadline):
+        while time.monotonic() < deadline:
+            self.play(transport, *self.pick())
+
+    def play(self, transport, name, scenario, record=True):
+        response = None
+        while True:
+            try:
+                request = scenario.send(response)
+            except StopIteration:
+                return
+            started = time.perf_counter()
+            try:
+                response = transport(*self.build(request))
+            except (OSError, http.client.HTTPException):
+                self.stats.record(name, time.perf_counter() - started, ok=False)
+                return
+            ok = response.status in request.expect
+            if record:
+                self.stats.record(name, time.perf_counter() - started, ok)
+            self.absorb(response)
+            if not ok:
+                return
+
+    async def alog_in(self, transport):
+        await self.aplay(
+            transport, "login", log_in(self, self.targets, self.rng), False
+        )
+
+    async def arun(self, transport, deadline):
+        while time.monotonic() < deadline:
+            await self.aplay(transport, *self.pick())
+
+    async def aplay(self, transport, name, scenario, record=True):
+        response = None
+        while True:
+            try:
+                request = scenario.send(response)
+            except StopIteration:
+                return
+            started = time.perf_counter()
+            response = await transport(*self.build(request))
+            ok = response.status in request.expect
+            if record:
+                self.stats.record(name, time.perf_counter() - started, ok)
+            self.absorb(response)
+            if not ok:
+                return
+
+
+# Transports
+
+
+class WSGITransport:
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, method, path, query, body, headers):
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "SERVER_NAME": headers["Host"],
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "REMOTE_ADDR": "127.0.0.1",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": BytesIO(body),
+            "wsgi.errors": BytesIO(),
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers.items():
+            key = name.upper().replace("-", "_")
+            if key != "CONTENT_TYPE":
+                key = f"HTTP_{key}"
+            environ[key] = value
+
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = response_headers
+
+        result = self.app(environ, start_response)
+        try:
+            content = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return Response(started["status"], started["headers"], content)
+
+
+class ASGITransport:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, method, path, query, body, headers):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [
+                (name.lower().encode(), value.encode())
+                for name, value in headers.items()
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": (headers["Host"], 80),
+        }
+        done = asyncio.Event()
+        sent_body = False
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Django listens for a disconnect while the view runs
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        response = Response(0, [], b"")
+        chunks = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response.status = message["status"]
+                response.headers = [
+                    (name.decode(), value.decode())
+                    for name, value in message["headers"]
+                ]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            done.set()
+        response.body = b"".join(chunks)
+        return response
+
+
+class HTTPTransport:
+    """Keep-alive connections to a running server, one per thread."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.netloc = parts.netloc
+        self.local = threading.local()
+
+    @property
+    def host(self):
+        return self.netloc
+
+    def connection(self):
+        if getattr(self.local, "connection", None) is None:
+            cls = (
+                http.client.HTTPSConnection
+                if self.https
+                else http.client.HTTPConnection
+            )
+            self.local.connection = cls(self.netloc, timeout=30)
+        return self.local.connection
+
+    def __call__(self, method, path, query, body, headers):
+        connection = self.connection()
+        target = f"{path}?{query}" if query else path
+        try:
+            connection.request(method, target, body=body or None, headers=headers)
+            response = connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.local.connection = None
+            raise
+        return Response(response.status, response.getheaders(), content)
+
+
+def run_threads(transport, users, seconds):
+    """Drive a sync transport with one thread per user.
+
+    Every user logs in first; the clock starts once they all have.
+    """
+    window = {}
+
+    def start_clock():
+        window["started"] = time.perf_counter()
+        window["deadline"] = time.monotonic() + seconds
+
+    barrier = threading.Barrier(len(users), action=start_clock)
+
+    def work(user):
+        user.log_in(transport)
+        barrier.wait()
+        user.run(transport, window["deadline"])
+
+    threads = [threading.Thread(target=work, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - window["started"]
+
+
+def run_tasks(transport, users, seconds):
+    """Drive an async transport with one task per user on one event loop."""
+
+    async def main():
+        await asyncio.gather(*(user.alog_in(transport) for user in users))
+        started = time.perf_counter()
+        deadline = time.monotonic() + seconds
+        await asyncio.gather(*(user.arun(transport, deadline) for user in users))
+        return time.perf_counter() - started
+
+    return asyncio.run(main())
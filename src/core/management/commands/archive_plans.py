@@ -0,0 +1,58 @@
+"""Move plans older than a cutoff into the ArchivedPlan table.
+
+Run it periodically (e.g. nightly from cron) so the live plan tables hold
+roughly one season: by default everything more than a year old is archived.
+Archived plans stay searchable by team and date in the admin and can be
+brought back with restore_plans.
+"""
+
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import library_io, models, plan_archive
+
+
+class Command(BaseCommand):
+    help = "Archive plans whose session date is before a cutoff."
+
+    def add_arguments(self, parser):
+        cutoff = parser.add_mutually_exclusive_group()
+        cutoff.add_argument(
+            "--before", type=date.fromisoformat, help="Cutoff date (YYYY-MM-DD)."
+        )
+        cutoff.add_argument(
+            "--keep-days",
+            type=int,
+            default=365,
+            help="Archive plans older than this many days (default: 365).",
+        )
+        parser.add_argument("--team", help="Only this team (id or name).")
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only count the plans."
+        )
+
+    def handle(self, *args, **options):
+        cutoff = options["before"] or date.today() - timedelta(
+            days=options["keep_days"]
+        )
+        plans = models.Plan.objects.filter(session_date__lt=cutoff)
+        if options["team"]:
+            try:
+                plans = plans.filter(owner_team=library_io.find_team(options["team"]))
+            except models.Team.DoesNotExist:
+                raise CommandError(f"No team {options['team']!r}")
+
+        total = plans.count()
+        if options["dry_run"]:
+            self.stdout.write(f"{total} plans before {cutoff} would be archived.")
+            return
+
+        done = 0
+        for done in plan_archive.archive_plans(plans, options["batch_size"]):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {done}/{total}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Archived {done} plans from before {cutoff}.")
+        )
@@ -0,0 +1,122 @@
+"""Time a team dashboard built panel by panel and with its panels concurrent.
+
+Reports the p50 of each panel on its own, their sum, and the p50 of the
+whole dashboard built serially and through ``core.dashboard.build``. With
+the panels run concurrently the dashboard should take about as long as the
+slowest panel rather than the sum. Runs against the current database.
+
+SQLite answers the panels' queries in about a millisecond each, most of it
+Python time that threads can't overlap, so concurrency only pays once the
+database takes real time. ``--latency`` adds a delay to every query, like
+the round trip to a database server, to show that case.
+"""
+
+import asyncio
+import json
+import statistics
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import Count
+
+from core import dashboard, models
+
+
+def p50(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+async def ap50(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def add_latency(seconds):
+    """Delay every query on every connection opened from now on."""
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    connection_created.connect(install, weak=False)
+    # Reopen this thread's connection with the delay in place
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Benchmark the team dashboard with its panels run serially and concurrently."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--team", type=int, help="Team id (default: the one with most plans)."
+        )
+        parser.add_argument(
+            "--date",
+            type=date.fromisoformat,
+            help="Treat this YYYY-MM-DD as today (default: today).",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0,
+            help="Milliseconds to add to every query, e.g. 1 for a LAN database.",
+        )
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        team_id = options["team"]
+        if team_id is None:
+            team = (
+                models.Team.objects.annotate(plans=Count("core_plan_owned_objects"))
+                .order_by("-plans")
+                .first()
+            )
+            if team is None:
+                raise CommandError("No teams; run seed_flowforge first")
+            team_id = team.pk
+        today, repeat = options["date"], options["repeat"]
+        if options["latency"]:
+            add_latency(options["latency"] / 1000)
+
+        # Warm up the connections, including the pool's
+        dashboard.build_serially(team_id, today)
+        asyncio.run(dashboard.build(team_id, today))
+
+        panels = {
+            name: p50(lambda panel=panel: panel(team_id, today), repeat)
+            for name, panel in dashboard.PANELS.items()
+        }
+        results = {
+            "team": team_id,
+            "panels_ms": panels,
+            "sum_of_panels_ms": round(sum(panels.values()), 3),
+            "slowest_panel_ms": max(panels.values()),
+            "serial_ms": p50(lambda: dashboard.build_serially(team_id, today), repeat),
+            "concurrent_ms": asyncio.run(
+                ap50(lambda: dashboard.build(team_id, today), repeat)
+            ),
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, ms in panels.items():
+            self.stdout.write(f"{name:>20}: {ms:>9.3f} ms")
+        for name in ("sum_of_panels", "slowest_panel", "serial", "concurrent"):
+            self.stdout.write(f"{name:>20}: {results[f'{name}_ms']:>9.3f} ms")
@@ -0,0 +1,245 @@
+"""Benchmark the app's hot paths against seeded datasets of several sizes.
+
+For every dataset size a scratch test database is created and filled with
+``seed_flowforge``, then each benchmark is run ``--repeat`` times. The
+report (p50/p95 latency, queries per run and peak traced memory) is written
+as JSON and can be compared with a stored baseline: a benchmark regresses
+when its p50 grows by more than ``--threshold`` or it runs more queries.
+"""
+
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import date, time as dtime
+from pathlib import Path
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core import models
+from core.query_budget import QueryRecorder
+from core.query_catalog import make_request
+
+SIZES = {
+    "small": {"teams": 2, "activities": 30, "years": 1, "sessions_per_week": 2},
+    "medium": {"teams": 10, "activities": 80, "years": 2, "sessions_per_week": 3},
+    "large": {"teams": 40, "activities": 120, "years": 3, "sessions_per_week": 3},
+}
+
+
+class Benchmarks:
+    """The benchmarked operations, each a zero-argument callable."""
+
+    def __init__(self):
+        User = get_user_model()
+        self.admin_user = User.objects.create_superuser("bench-admin", "", "bench")
+        self.client = Client()
+        self.client.force_login(self.admin_user)
+
+        # A planner in the busiest team, and one of that team's plans
+        team = (
+            models.Team.objects.annotate(plans=Count("core_plan_owned_objects"))
+            .order_by("-plans", "pk")
+            .first()
+        )
+        membership = models.TeamMembership.objects.filter(
+            team=team, role=models.TeamMembership.ROLE_SESSION_PLANNER
+        ).first()
+        self.member_request = make_request(superuser=False)
+        self.member_request.user = membership.user
+        self.plan = models.Plan.objects.filter(owner_team=team).latest("session_date")
+        self.section = self.plan.sections.get(order=1)
+        self.team = team
+
+        from frontend.views import TeamOwnershipMixin
+
+        plan_admin = admin.site._registry[models.Plan]
+        self.team_admin = type(
+            "TeamScopedPlanAdmin", (TeamOwnershipMixin, type(plan_admin)), {}
+        )(models.Plan, admin.site)
+        self.checker = TeamOwnershipMixin()
+
+    def all(self):
+        return {
+            "admin_plan_changelist": lambda: self.get("/admin/core/plan/"),
+            "admin_team_changelist": lambda: self.get("/admin/core/team/"),
+            "admin_plansection_changelist": lambda: self.get(
+                "/admin/core/plansection/"
+            ),
+            "admin_plan_change": lambda: self.get(
+                f"/admin/core/plan/{self.plan.pk}/change/"
+            ),
+            "admin_plansection_change": lambda: self.get(
+                f"/admin/core/plansection/{self.section.pk}/change/"
+            ),
+            "check_team_permission": lambda: self.checker.check_team_permission(
+                self.member_request, self.plan, "write"
+            ),
+            "get_team_filtered_queryset": self.team_filtered_page,
+            "plan_create": self.create_plan,
+            "plan_tree_render": self.render_plan_tree,
+        }
+
+    def get(self, url):
+        response = self.client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} returned {response.status_code}")
+
+    def team_filtered_page(self):
+        qs = self.team_admin.get_team_filtered_queryset(self.member_request)
+        qs.count()
+        list(qs.order_by("-session_date")[:100])
+
+    def create_plan(self):
+        models.Plan.objects.create(
+            owner_team=self.team,
+            venue_id=self.plan.venue_id,
+            session_date=date(2030, 1, 1),
+            session_time=dtime(10),
+            session_length_minutes=90,
+            group_size=8,
+            age_range="10-12",
+            plan_goal="Benchmark",
+        )
+
+    def render_plan_tree(self):
+        plan = (
+            models.Plan.objects.select_related("venue")
+            .prefetch_related(
+                "sections__items__location__venue", "sections__items__activity"
+            )
+            .get(pk=self.plan.pk)
+        )
+        lines = [str(plan)]
+        for section in plan.sections.all():
+            lines.append(f"  {section.name}")
+            lines.extend(f"    {item}" for item in section.items.all())
+        return "\n".join(lines)
+
+
+def measure(func, repeat, warmup=2):
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    with QueryRecorder() as recorder:
+        func()
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    quantiles = statistics.quantiles(timings, n=20) if len(timings) > 1 else timings
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(quantiles[-1], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "queries": recorder.count,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return a list of human-readable regressions against `baseline`."""
+    regressions = []
+    for size, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            if result["p50_ms"] > base["p50_ms"] * (1 + threshold):
+                regressions.append(
+                    f"{size}/{name}: p50 {result['p50_ms']}ms "
+                    f"vs baseline {base['p50_ms']}ms"
+                )
+            if result["queries"] > base["queries"]:
+                regressions.append(
+                    f"{size}/{name}: {result['queries']} queries "
+                    f"vs baseline {base['queries']}"
+                )
+    return regressions
+
+
+class Command(BaseCommand):
+    help = "Benchmark admin changelists, permission checks and plan paths."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="small,medium",
+            help=f"Comma-separated dataset sizes from: {', '.join(SIZES)}.",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--only", help="Comma-separated benchmark names to run (default: all)."
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--baseline", help="Compare against this JSON report.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Allowed relative p50 slowdown before failing (default: 0.25).",
+        )
+
+    def handle(self, *args, **options):
+        sizes = options["sizes"].split(",")
+        unknown = set(sizes) - set(SIZES)
+        if unknown:
+            raise CommandError(f"Unknown dataset size(s): {', '.join(unknown)}")
+
+        results = {}
+        setup_test_environment(debug=False)
+        try:
+            with override_settings(QUERY_INSTRUMENTATION=False):
+                for size in sizes:
+                    results[size] = self.run_size(size, options)
+        finally:
+            teardown_test_environment()
+
+        report = json.dumps(results, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(report)
+        self.stdout.write(report)
+
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text())
+            regressions = compare(results, baseline, options["threshold"])
+            if regressions:
+                raise CommandError(
+                    "Performance regressions:\n  " + "\n  ".join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
+
+    def run_size(self, size, options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            call_command("seed_flowforge", verbosity=0, **SIZES[size])
+            benchmarks = Benchmarks().all()
+            if options["only"]:
+                names = options["only"].split(",")
+                benchmarks = {n: f for n, f in benchmarks.items() if n in names}
+            results = {}
+            for name, func in benchmarks.items():
+                results[name] = measure(func, options["repeat"])
+                if options["verbosity"] > 1:
+                    self.stderr.write(f"{size}/{name}: {results[name]}")
+            return results
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,170 @@
+"""Compare concurrent read/write throughput of stock vs tuned SQLite settings.
+
+Runs the same mixed workload twice against a scratch database file:
+
+* ``stock``: what Django's sqlite3 backend does out of the box — rollback
+  journal, a new connection per unit of work (CONN_MAX_AGE=0) and deferred
+  transactions.
+* ``tuned``: flowforge.backends.sqlite3 — the PRAGMAs from DEFAULT_PRAGMAS,
+  one persistent connection per worker and BEGIN IMMEDIATE.
+"""
+
+import json
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from flowforge.backends.sqlite3.base import DEFAULT_PRAGMAS, apply_pragmas
+
+SCHEMA = """
+CREATE TABLE plan (
+    id INTEGER PRIMARY KEY,
+    team_id INTEGER NOT NULL,
+    session_date TEXT NOT NULL,
+    plan_goal TEXT NOT NULL
+);
+CREATE INDEX plan_team_date ON plan (team_id, session_date);
+"""
+
+MODES = {
+    "stock": {"pragmas": {}, "persistent": False, "begin": "BEGIN"},
+    "tuned": {
+        "pragmas": DEFAULT_PRAGMAS,
+        "persistent": True,
+        "begin": "BEGIN IMMEDIATE",
+    },
+}
+
+
+def create_database(path, rows, teams):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO plan (team_id, session_date, plan_goal) VALUES (?, ?, ?)",
+        (
+            (i % teams, f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}", "x" * 200)
+            for i in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+class Worker(threading.Thread):
+    def __init__(self, path, mode, deadline, write_ratio, teams, seed):
+        super().__init__()
+        self.path = path
+        self.mode = mode
+        self.deadline = deadline
+        self.write_ratio = write_ratio
+        self.teams = teams
+        self.random = random.Random(seed)
+        self.reads = self.writes = self.errors = 0
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        apply_pragmas(conn, self.mode["pragmas"])
+        return conn
+
+    def run(self):
+        conn = self.connect() if self.mode["persistent"] else None
+        while time.monotonic() < self.deadline:
+            if not self.mode["persistent"]:
+                conn = self.connect()
+            try:
+                if self.random.random() < self.write_ratio:
+                    self.write(conn)
+                    self.writes += 1
+                else:
+                    self.read(conn)
+                    self.reads += 1
+            except sqlite3.OperationalError:
+                # "database is locked" / "database is busy"
+                self.errors += 1
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            finally:
+                if not self.mode["persistent"]:
+                    conn.close()
+        if conn is not None and self.mode["persistent"]:
+            conn.close()
+
+    def read(self, conn):
+        team = self.random.randrange(self.teams)
+        conn.execute(
+            "SELECT id, session_date, plan_goal FROM plan WHERE team_id = ? "
+            "ORDER BY session_date DESC LIMIT 50",
+            (team,),
+        ).fetchall()
+
+    def write(self, conn):
+        team = self.random.randrange(self.teams)
+        conn.execute(self.mode["begin"])
+        # Read-then-write, like a form save: this is the pattern that fails
+        # instantly under deferred transactions when another writer is active.
+        row = conn.execute(
+            "SELECT id FROM plan WHERE team_id = ? LIMIT 1", (team,)
+        ).fetchone()
+        conn.execute("UPDATE plan SET plan_goal = ? WHERE id = ?", ("y" * 200, row[0]))
+        conn.execute(
+            "INSERT INTO plan (team_id, session_date, plan_goal) VALUES (?, ?, ?)",
+            (team, "2025-01-01", "z" * 200),
+        )
+        conn.execute("COMMIT")
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent read/write throughput of stock vs tuned SQLite."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5.0)
+        parser.add_argument("--write-ratio", type=float, default=0.2)
+        parser.add_argument("--rows", type=int, default=20000)
+        parser.add_argument("--teams", type=int, default=50)
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, mode in MODES.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                path = str(Path(tmp) / "bench.sqlite3")
+                create_database(path, options["rows"], options["teams"])
+                results[name] = self.run_mode(path, mode, options)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:>6}: {result['ops_per_second']:>9.1f} ops/s "
+                f"({result['reads']} reads, {result['writes']} writes, "
+                f"{result['errors']} lock errors)"
+            )
+
+    def run_mode(self, path, mode, options):
+        deadline = time.monotonic() + options["seconds"]
+        workers = [
+            Worker(path, mode, deadline, options["write_ratio"], options["teams"], i)
+            for i in range(options["workers"])
+        ]
+        started = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.monotonic() - started
+        reads = sum(w.reads for w in workers)
+        writes = sum(w.writes for w in workers)
+        return {
+            "reads": reads,
+            "writes": writes,
+            "errors": sum(w.errors for w in workers),
+            "seconds": round(elapsed, 3),
+            "ops_per_second": round((reads + writes) / elapsed, 1),
+        }
@@ -0,0 +1,34 @@
+"""Export a team's equipment or activities as CSV or JSON Lines."""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import library_io, models
+
+
+class Command(BaseCommand):
+    help = "Stream a team's activity library to a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--team", required=True, help="Team id or name.")
+        parser.add_argument("--kind", required=True, choices=list(library_io.KINDS))
+        parser.add_argument("--format", default="csv", choices=library_io.FORMATS)
+        parser.add_argument("--output", help="File to write (default: stdout).")
+
+    def handle(self, *args, **options):
+        try:
+            team = library_io.find_team(options["team"])
+        except models.Team.DoesNotExist:
+            raise CommandError(f"No team {options['team']!r}")
+
+        chunks = library_io.write_records(
+            library_io.iter_records(team, options["kind"]),
+            options["kind"],
+            options["format"],
+        )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as out:
+                out.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
@@ -0,0 +1,32 @@
+"""Write a team's whole library, images included, to a zip archive."""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import library_io, models, team_archive
+
+
+class Command(BaseCommand):
+    help = "Export every row a team owns, plus its images, as a zip archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--team", required=True, help="Team id or name.")
+        parser.add_argument(
+            "--output", required=True, help="Zip file, or - for stdout."
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            team = library_io.find_team(options["team"])
+        except models.Team.DoesNotExist:
+            raise CommandError(f"No team {options['team']!r}")
+
+        chunks = team_archive.iter_archive(team, batch_size=options["batch_size"])
+        if options["output"] == "-":
+            sys.stdout.buffer.writelines(chunks)
+            return
+        with open(options["output"], "wb") as out:
+            out.writelines(chunks)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,195 @@
+"""Remove uploaded image files that no database row refers to any more.
+
+Deleting a LocationImage/ActivityImage row (directly, or by cascade from its
+Location/Activity) leaves the file behind in storage. This command walks each
+upload directory and the image tables that point into it in the same sorted
+order and merge-joins the two streams, so neither side is ever loaded into
+memory as a whole.
+"""
+
+import heapq
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.utils import timezone
+
+
+def get_upload_fields(app_label="core"):
+    """Map each upload directory to the (model, field name) pairs using it."""
+    upload_fields = {}
+    for model in apps.get_app_config(app_label).get_models():
+        for field in model._meta.fields:
+            if isinstance(field, models.FileField) and isinstance(field.upload_to, str):
+                prefix = field.upload_to.rstrip("/") + "/"
+                upload_fields.setdefault(prefix, []).append((model, field.name))
+    return upload_fields
+
+
+def iter_storage_files(storage, directory):
+    """Yield every file name below `directory` in plain string order.
+
+    Sub-directories sort with their trailing "/" so the recursive walk yields
+    the same order as an ORDER BY over the full stored names. Only one
+    directory listing is held in memory at a time.
+    """
+    dirs, files = storage.listdir(directory)
+    entries = sorted([(f"{d}/", True) for d in dirs] + [(f, False) for f in files])
+    for name, is_dir in entries:
+        if is_dir:
+            yield from iter_storage_files(storage, directory + name)
+        else:
+            yield directory + name
+
+
+def iter_referenced_files(fields, prefix, chunk_size):
+    """Yield the stored file names under `prefix` from every table, sorted."""
+    streams = [
+        model._default_manager.filter(**{f"{name}__startswith": prefix})
+        .order_by(name)
+        .values_list(name, flat=True)
+        .iterator(chunk_size=chunk_size)
+        for model, name in fields
+    ]
+    return heapq.merge(*streams)
+
+
+def ensure_sorted(names, source):
+    """Pass names through, failing loudly if they are not in ascending order.
+
+    The merge-join silently reports live files as orphans if either side is
+    out of order (e.g. a database collation that is not byte-wise), so this is
+    checked rather than assumed.
+    """
+    previous = None
+    for name in names:
+        if previous is not None and name < previous:
+            raise CommandError(
+                f"{source} returned {name!r} after {previous!r}; "
+                "refusing to continue with an unsorted stream"
+            )
+        previous = name
+        yield name
+
+
+def iter_orphans(files, references):
+    """Merge-join two sorted streams, yielding files with no reference."""
+    references = iter(references)
+    ref = next(references, None)
+    for name in files:
+        while ref is not None and ref < name:
+            ref = next(references, None)
+        if ref != name:
+            yield name
+
+
+class Command(BaseCommand):
+    help = "Report or delete uploaded image files no longer referenced by any row."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report orphaned files, do not delete them.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=60,
+            help=(
+                "Ignore files modified within this many minutes, so uploads "
+                "whose row has not been committed yet are left alone (default: 60)."
+            ),
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0,
+            help="Maximum deletions per second (default: unlimited).",
+        )
+        parser.add_argument(
+            "--prefix",
+            action="append",
+            dest="prefixes",
+            help="Only collect this upload directory (may be repeated).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Rows fetched per database round trip (default: 2000).",
+        )
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        dry_run = options["dry_run"]
+        cutoff = timezone.now() - timedelta(minutes=options["min_age"])
+        delay = 1 / options["rate"] if options["rate"] > 0 else 0
+
+        upload_fields = get_upload_fields()
+        prefixes = options["prefixes"] or sorted(upload_fields)
+        unknown = [p for p in prefixes if p not in upload_fields]
+        if unknown:
+            raise CommandError(
+                f"Unknown upload directory {unknown[0]!r}; "
+                f"expected one of {', '.join(sorted(upload_fields))}"
+            )
+
+        totals = {"scanned": 0, "orphaned": 0, "deleted": 0, "skipped": 0}
+        for prefix in prefixes:
+            if not storage.exists(prefix):
+                continue
+            fields = upload_fields[prefix]
+            counted = self._count(
+                ensure_sorted(iter_storage_files(storage, prefix), "storage"),
+                totals,
+            )
+            references = ensure_sorted(
+                iter_referenced_files(fields, prefix, options["chunk_size"]),
+                "database",
+            )
+            for name in iter_orphans(counted, references):
+                if not self._is_settled(storage, name, cutoff) or self._is_referenced(
+                    fields, name
+                ):
+                    # Either still being uploaded, or its row was committed
+                    # after our cursor moved past it.
+                    totals["skipped"] += 1
+                    continue
+                totals["orphaned"] += 1
+                if dry_run:
+                    self.stdout.write(f"orphan: {name}")
+                    continue
+                storage.delete(name)
+                totals["deleted"] += 1
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"deleted: {name}")
+                if delay:
+                    time.sleep(delay)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Scanned {scanned} files: {orphaned} orphaned, {deleted} deleted, "
+                "{skipped} skipped as recent or re-referenced.".format(**totals)
+            )
+        )
+
+    def _count(self, names, totals):
+        for name in names:
+            totals["scanned"] += 1
+            yield name
+
+    def _is_settled(self, storage, name, cutoff):
+        try:
+            return storage.get_modified_time(name) < cutoff
+        except (NotImplementedError, FileNotFoundError):
+            return False
+
+    def _is_referenced(self, fields, name):
+        return any(
+            model._default_manager.filter(**{name_field: name}).exists()
+            for model, name_field in fields
+        )
@@ -0,0 +1,59 @@
+"""Import equipment or activities into a team from CSV or JSON Lines.
+
+Rows are upserted by name within the team; invalid rows are reported and
+skipped. Import equipment before the activities that reference it.
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import library_io, models
+
+
+class Command(BaseCommand):
+    help = "Upsert a team's equipment or activities from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to read, or - for stdin.")
+        parser.add_argument("--team", required=True, help="Team id or name.")
+        parser.add_argument("--kind", required=True, choices=list(library_io.KINDS))
+        parser.add_argument(
+            "--format",
+            choices=library_io.FORMATS,
+            help="Defaults to the file extension.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            team = library_io.find_team(options["team"])
+        except models.Team.DoesNotExist:
+            raise CommandError(f"No team {options['team']!r}")
+
+        path = options["path"]
+        fmt = options["format"] or path.rsplit(".", 1)[-1].lower()
+        if fmt not in library_io.FORMATS:
+            raise CommandError("Pass --format; it can't be told from the file name")
+
+        importer = library_io.LibraryImporter(
+            team, options["kind"], batch_size=options["batch_size"]
+        )
+        if path == "-":
+            report = importer.run(sys.stdin, fmt)
+        else:
+            with open(path, encoding="utf-8-sig", newline="") as lines:
+                report = importer.run(lines, fmt)
+
+        shown = report.errors if options["verbosity"] > 1 else report.errors[:20]
+        for error in shown:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        if report.error_count > len(shown):
+            self.stderr.write(f"... and {report.error_count - len(shown)} more errors")
+        style = self.style.WARNING if report.error_count else self.style.SUCCESS
+        self.stdout.write(
+            style(
+                f"{report.rows} rows read, {report.imported} imported, "
+                f"{report.error_count} skipped."
+            )
+        )
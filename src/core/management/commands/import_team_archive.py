@@ -0,0 +1,53 @@
+"""Restore a team library from an archive made by export_team_archive."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import library_io, models, team_archive
+
+
+class Command(BaseCommand):
+    help = "Import a team archive into an empty team, or a new one named after it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--team",
+            help="Existing team (id or name) with an empty library. "
+            "By default a new team is created with the archived team's name.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers", type=int, default=8, help="Threads saving images."
+        )
+
+    def handle(self, *args, **options):
+        team = None
+        if options["team"]:
+            try:
+                team = library_io.find_team(options["team"])
+            except models.Team.DoesNotExist:
+                raise CommandError(f"No team {options['team']!r}")
+
+        try:
+            importer = team_archive.import_archive(
+                options["path"],
+                team,
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+            )
+        except team_archive.ArchiveError as exc:
+            raise CommandError(str(exc)) from exc
+
+        for name, count in importer.counts.items():
+            skipped = importer.skipped[name]
+            note = (
+                f" ({skipped} skipped: reference outside the archive)"
+                if skipped
+                else ""
+            )
+            self.stdout.write(f"  {name}: {count}{note}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported into {importer.team} with {len(importer.files)} images."
+            )
+        )
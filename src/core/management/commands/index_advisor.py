@@ -0,0 +1,80 @@
+"""Run the canonical querysets through EXPLAIN QUERY PLAN and flag bad plans.
+
+Full table scans and temporary B-trees (on-the-fly sorts/distincts) on the
+hot paths usually mean a missing or unusable index. Each canonical query
+declares the scans it is allowed, so anything new shows up as a finding and,
+with --fail, a non-zero exit for CI.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.query_catalog import get_canonical_queries
+
+
+def explain(queryset):
+    """Return the EXPLAIN QUERY PLAN detail lines for a queryset."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def find_problems(query, plan):
+    problems = []
+    for detail in plan:
+        if detail.startswith("SCAN "):
+            table = detail.split()[1]
+            # "SCAN t USING COVERING INDEX" still reads every entry
+            if table not in query.allowed_scans:
+                problems.append(f"full scan: {detail}")
+        elif detail.startswith("USE TEMP B-TREE") and not query.allow_temp_btree:
+            problems.append(f"temp b-tree: {detail}")
+    return problems
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the app's canonical querysets and flag full scans and temp B-trees."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fail",
+            action="store_true",
+            help="Exit with an error if any query has findings (for CI).",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Write the report as JSON."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The index advisor only understands SQLite plans.")
+
+        report = []
+        for query in get_canonical_queries():
+            plan = explain(query.queryset)
+            report.append(
+                {
+                    "label": query.label,
+                    "plan": plan,
+                    "problems": find_problems(query, plan),
+                }
+            )
+
+        flagged = [entry for entry in report if entry["problems"]]
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for entry in report:
+                if entry["problems"]:
+                    self.stdout.write(self.style.WARNING(entry["label"]))
+                    for problem in entry["problems"]:
+                        self.stdout.write(f"  {problem}")
+                elif options["verbosity"] > 1:
+                    self.stdout.write(f"{entry['label']}: ok")
+            self.stdout.write(f"{len(report)} queries checked, {len(flagged)} flagged.")
+
+        if flagged and options["fail"]:
+            raise CommandError(f"{len(flagged)} canonical queries have poor plans.")
@@ -0,0 +1,187 @@
+"""Drive the WSGI/ASGI applications with concurrent mixed traffic.
+
+In-process runs (``--transport wsgi``/``asgi``) use a scratch database
+seeded with ``seed_flowforge`` and a throwaway superuser, so they can be
+run anywhere. ``--transport http`` targets a running server instead and
+picks its plans and activities from the configured database, so point it at
+a local server sharing that database and pass an admin login.
+
+Run both in-process transports at once to compare them::
+
+    python manage.py loadtest --transport wsgi,asgi --concurrency 16
+"""
+
+import importlib
+import json
+import secrets
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core import loadgen
+from core.management.commands.bench_flowforge import SIZES
+
+TRANSPORTS = ("wsgi", "asgi", "http")
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a concurrent scenario mix against the app and report latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--transport",
+            default="wsgi",
+            help=f"Comma-separated transports from: {', '.join(TRANSPORTS)}.",
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=20)
+        parser.add_argument(
+            "--mix",
+            default="browse=50,plan=30,edit=15,login=5",
+            help=f"Scenario weights; scenarios: {', '.join(loadgen.SCENARIOS)}.",
+        )
+        parser.add_argument(
+            "--size",
+            default="small",
+            choices=list(SIZES),
+            help="Scratch dataset size for in-process transports.",
+        )
+        parser.add_argument("--url", help="Server URL for --transport http.")
+        parser.add_argument("--username", help="Admin login for --transport http.")
+        parser.add_argument("--password", help="Admin password for --transport http.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--json", action="store_true", help="Print a JSON report.")
+
+    def handle(self, *args, **options):
+        transports = options["transport"].split(",")
+        unknown = set(transports) - set(TRANSPORTS)
+        if unknown:
+            raise CommandError(f"Unknown transport(s): {', '.join(unknown)}")
+        try:
+            mix = loadgen.parse_mix(options["mix"])
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1")
+        self.mix = mix
+        self.options = options
+
+        results = {}
+        if "http" in transports:
+            if not (options["url"] and options["username"] and options["password"]):
+                raise CommandError(
+                    "--transport http needs --url, --username and --password"
+                )
+            targets = loadgen.collect_targets(
+                options["username"], options["password"], seed=options["seed"]
+            )
+            transport = loadgen.HTTPTransport(options["url"])
+            results["http"] = self.run(transport, transport.host, targets)
+
+        in_process = [name for name in transports if name != "http"]
+        if in_process:
+            results.update(self.run_in_process(in_process))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for name, result in results.items():
+                self.write_report(name, result)
+
+    def run_in_process(self, transports):
+        setup_test_environment(debug=False)
+        test_settings = connection.settings_dict["TEST"]
+        old_test_name = test_settings.get("NAME")
+        try:
+            with (
+                tempfile.TemporaryDirectory() as tmp,
+                override_settings(QUERY_INSTRUMENTATION=False),
+            ):
+                if connection.vendor == "sqlite":
+                    # A file, not the shared in-memory database, so concurrent
+                    # writers get WAL and the busy timeout like production
+                    test_settings["NAME"] = str(Path(tmp) / "loadtest.sqlite3")
+                old_name = connection.creation.create_test_db(
+                    verbosity=0, autoclobber=True, serialize=False
+                )
+                try:
+                    return self.run_scratch(transports)
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            test_settings["NAME"] = old_test_name
+            teardown_test_environment()
+
+    def run_scratch(self, transports):
+        call_command("seed_flowforge", verbosity=0, **SIZES[self.options["size"]])
+        password = secrets.token_urlsafe()
+        get_user_model().objects.create_superuser("loadtest", "", password)
+        targets = loadgen.collect_targets(
+            "loadtest", password, seed=self.options["seed"]
+        )
+        # Let the worker threads open their own connections
+        connection.close()
+
+        results = {}
+        for name in transports:
+            # The handlers build their middleware chain on import, so import
+            # them here, under the overridden settings
+            module = importlib.import_module(f"flowforge.{name}")
+            if name == "wsgi":
+                transport = loadgen.WSGITransport(module.application)
+            else:
+                transport = loadgen.ASGITransport(module.application)
+            results[name] = self.run(transport, "testserver", targets)
+        return results
+
+    def run(self, transport, host, targets):
+        users = [
+            loadgen.VirtualUser(targets, self.mix, self.options["seed"] + i, host)
+            for i in range(self.options["concurrency"])
+        ]
+        if isinstance(transport, loadgen.ASGITransport):
+            elapsed = loadgen.run_tasks(transport, users, self.options["seconds"])
+        else:
+            elapsed = loadgen.run_threads(transport, users, self.options["seconds"])
+        stats = loadgen.LoadStats()
+        for user in users:
+            stats.merge(user.stats)
+        return {"concurrency": len(users), **stats.as_dict(elapsed)}
+
+    def write_report(self, name, result):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                f"{name}: {result['concurrency']} users, {result['seconds']}s, "
+                f"{result['requests']} requests, {result['throughput_rps']} req/s, "
+                f"{result['errors']} errors"
+            )
+        )
+        columns = (
+            "count",
+            "errors",
+            "p50_ms",
+            "p90_ms",
+            "p99_ms",
+            "p99.9_ms",
+            "max_ms",
+        )
+        self.stdout.write(
+            f"  {'scenario':<10}" + "".join(f"{column:>10}" for column in columns)
+        )
+        rows = {
+            **result["scenarios"],
+            "all": {**result["latency"], "errors": result["errors"]},
+        }
+        for scenario, row in rows.items():
+            self.stdout.write(
+                f"  {scenario:<10}"
+                + "".join(f"{row[column]:>10}" for column in columns)
+            )
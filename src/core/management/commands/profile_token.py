@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Print a signed X-Flowforge-Profile header value that makes "
+        "ProfilingMiddleware profile a request (valid for PROFILING_TOKEN_MAX_AGE)."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token())
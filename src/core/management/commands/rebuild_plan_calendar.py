@@ -0,0 +1,34 @@
+"""Recount the PlanCalendarDay rollup from the plans.
+
+The rollup is kept current as plans change, so this is only needed after
+writing plans behind its back (raw SQL, a bulk insert that didn't call
+``plan_calendar.refresh``) or to check nothing has drifted.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import library_io, models, plan_calendar
+
+
+class Command(BaseCommand):
+    help = "Recount the per-day plan calendar rollup."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--team",
+            action="append",
+            help="Team id or exact name; repeat for several (default: all teams).",
+        )
+
+    def handle(self, *args, **options):
+        team_ids = None
+        if options["team"]:
+            team_ids = []
+            for value in options["team"]:
+                try:
+                    team_ids.append(library_io.find_team(value).pk)
+                except models.Team.DoesNotExist:
+                    raise CommandError(f"No team {value!r}")
+        plan_calendar.rebuild(team_ids)
+        if options["verbosity"] > 0:
+            self.stdout.write(self.style.SUCCESS("Rebuilt the plan calendar."))
@@ -0,0 +1,43 @@
+"""Bring archived plans back into the live tables."""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import library_io, models, plan_archive
+
+
+class Command(BaseCommand):
+    help = "Restore archived plans, selected by plan id, team and/or date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--id", type=int, nargs="+", dest="ids", help="Original plan ids."
+        )
+        parser.add_argument("--team", help="Team id or name.")
+        parser.add_argument("--from", type=date.fromisoformat, dest="start")
+        parser.add_argument("--to", type=date.fromisoformat, dest="end")
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        if not any(options[name] for name in ("ids", "team", "start", "end")):
+            raise CommandError("Select plans with --id, --team, --from or --to")
+        archived = models.ArchivedPlan.objects.all()
+        if options["ids"]:
+            archived = archived.filter(original_id__in=options["ids"])
+        if options["team"]:
+            try:
+                team = library_io.find_team(options["team"])
+            except models.Team.DoesNotExist:
+                raise CommandError(f"No team {options['team']!r}")
+            archived = archived.filter(owner_team=team)
+        if options["start"]:
+            archived = archived.filter(session_date__gte=options["start"])
+        if options["end"]:
+            archived = archived.filter(session_date__lte=options["end"])
+
+        done = 0
+        for done in plan_archive.restore_plans(archived, options["batch_size"]):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {done} restored")
+        self.stdout.write(self.style.SUCCESS(f"Restored {done} plans."))
@@ -0,0 +1,347 @@
+"""Generate a large, realistic-looking dataset for performance work.
+
+Everything is created with bulk_create in batches inside one transaction,
+and the output depends only on the options and --seed. Plans are inserted
+with bulk_create, which skips Plan.save(), so their Start/Middle/End
+sections are created here explicitly.
+"""
+
+import random
+from datetime import date, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from core import choice_cache, models, plan_calendar, team_cache
+
+SECTION_NAMES = ["Start", "Middle", "End"]
+TERRAIN = ["singletrack", "fire road", "grass", "gravel", "rock garden", "pump track"]
+SKILLS = [
+    "Cornering",
+    "Braking",
+    "Body Position",
+    "Drops",
+    "Manuals",
+    "Switchbacks",
+    "Climbing",
+    "Track Stands",
+    "Rock Rolls",
+    "Jumps",
+    "Line Choice",
+    "Pedalling",
+]
+DRILLS = ["Intro", "Drill", "Game", "Progression", "Challenge", "Review"]
+EQUIPMENT = [
+    "Cones",
+    "Marker Discs",
+    "Skinny Planks",
+    "Pool Noodles",
+    "Ramps",
+    "First Aid Kit",
+    "Spare Tubes",
+    "Track Pump",
+    "Bibs",
+    "Radios",
+    "Tool Kit",
+    "Stopwatch",
+]
+AGE_RANGES = ["6-8", "8-10", "10-12", "12-14", "14+", "Adult"]
+NOTES = [
+    "Safety briefing and bike checks",
+    "Water break",
+    "Regroup and recap the key points",
+    "Split into two groups by ability",
+    "Cool down ride back to the car park",
+]
+
+
+class Command(BaseCommand):
+    help = "Fill the database with deterministic synthetic clubs, libraries and plans."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--teams", type=int, default=20)
+        parser.add_argument("--members", type=int, default=15, help="Per team.")
+        parser.add_argument("--venues", type=int, default=4, help="Per team.")
+        parser.add_argument("--locations", type=int, default=8, help="Per venue.")
+        parser.add_argument("--activities", type=int, default=120, help="Per team.")
+        parser.add_argument("--equipment", type=int, default=12, help="Per team.")
+        parser.add_argument(
+            "--years", type=int, default=3, help="Seasons of plans per team."
+        )
+        parser.add_argument(
+            "--sessions-per-week",
+            type=float,
+            default=3,
+            help="Average across teams; larger clubs run more.",
+        )
+        parser.add_argument("--start-year", type=int, default=2022)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--prefix",
+            default="Seed",
+            help="Prefix for team, user and venue names, which must be unique.",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.options = options
+        self.counts = {}
+
+        try:
+            with transaction.atomic():
+                teams = self.create_teams()
+                self.create_members(teams)
+                venues = self.create_venues(teams)
+                locations = self.create_locations(venues)
+                equipment = self.create_equipment(teams)
+                activities = self.create_activities(teams)
+                self.create_activity_equipment(activities, equipment)
+                self.create_plans(teams, venues, locations, activities)
+                # A cache that outlived an earlier database may hold these ids
+                for team in teams:
+                    team_cache.bump(team.pk)
+                for model in choice_cache.MODELS:
+                    choice_cache.bump(model)
+                plan_calendar.rebuild([team.pk for team in teams])
+        except IntegrityError as exc:
+            raise CommandError(
+                f"{exc}. Has this --prefix already been seeded? Pick another one."
+            ) from exc
+
+        if options["verbosity"] < 1:
+            return
+        summary = ", ".join(f"{name}: {count}" for name, count in self.counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary}."))
+
+    def bulk_create(self, model, objs):
+        created = model.objects.bulk_create(objs, batch_size=self.batch_size)
+        name = model.__name__
+        self.counts[name] = self.counts.get(name, 0) + len(created)
+        return created
+
+    def create_teams(self):
+        prefix = self.options["prefix"]
+        return self.bulk_create(
+            models.Team,
+            [
+                models.Team(name=f"{prefix} Club {i:04d}", description="Synthetic club")
+                for i in range(self.options["teams"])
+            ],
+        )
+
+    def create_members(self, teams):
+        User = get_user_model()
+        prefix = self.options["prefix"].lower()
+        # Hashing is deliberately slow, so every user shares one hash
+        password = make_password("flowforge")
+        users = self.bulk_create(
+            User,
+            [
+                User(username=f"{prefix}-{t}-{m}", password=password)
+                for t in range(len(teams))
+                for m in range(self.options["members"])
+            ],
+        )
+        memberships = []
+        for i, user in enumerate(users):
+            m = i % self.options["members"]
+            if m == 0:
+                role = models.TeamMembership.ROLE_TEAM_MANAGER
+            elif m <= max(1, self.options["members"] // 5):
+                role = models.TeamMembership.ROLE_SESSION_PLANNER
+            else:
+                role = models.TeamMembership.ROLE_SESSION_LEADER
+            memberships.append(
+                models.TeamMembership(
+                    team=teams[i // self.options["members"]], user=user, role=role
+                )
+            )
+        self.bulk_create(models.TeamMembership, memberships)
+
+    def create_venues(self, teams):
+        prefix = self.options["prefix"]
+        return self.bulk_create(
+            models.Venue,
+            [
+                models.Venue(
+                    owner_team=team,
+                    name=f"{prefix} Trail Centre {t}-{v}",
+                    address=f"{self.rng.randint(1, 200)} Forest Road",
+                )
+                for t, team in enumerate(teams)
+                for v in range(self.options["venues"])
+            ],
+        )
+
+    def create_locations(self, venues):
+        locations = self.bulk_create(
+            models.Location,
+            [
+                models.Location(
+                    owner_team_id=venue.owner_team_id,
+                    venue=venue,
+                    name=f"{self.rng.choice(TERRAIN).title()} Area {n}",
+                    terrainType=self.rng.choice(TERRAIN),
+                    terrainDifficulty=self.difficulty(),
+                )
+                for venue in venues
+                for n in range(self.options["locations"])
+            ],
+        )
+        by_venue = {}
+        for location in locations:
+            by_venue.setdefault(location.venue_id, []).append(location)
+        return by_venue
+
+    def create_equipment(self, teams):
+        equipment = self.bulk_create(
+            models.Equipment,
+            [
+                models.Equipment(
+                    owner_team=team,
+                    name=EQUIPMENT[e % len(EQUIPMENT)]
+                    + (f" {e // len(EQUIPMENT) + 1}" if e >= len(EQUIPMENT) else ""),
+                    quantityAvailable=self.rng.randint(1, 30),
+                )
+                for team in teams
+                for e in range(self.options["equipment"])
+            ],
+        )
+        return self.group_by_team(equipment)
+
+    def create_activities(self, teams):
+        activities = self.bulk_create(
+            models.Activity,
+            [
+                models.Activity(
+                    owner_team=team,
+                    name=f"{self.rng.choice(SKILLS)} {self.rng.choice(DRILLS)} {a}",
+                    durationMinutes=self.rng.choice([5, 10, 10, 15, 15, 20, 30]),
+                    difficultyLevel=self.difficulty(),
+                    coachingPoints="Look ahead, heels down, soft arms.",
+                )
+                for team in teams
+                for a in range(self.options["activities"])
+            ],
+        )
+        return self.group_by_team(activities)
+
+    def create_activity_equipment(self, activities, equipment):
+        links = []
+        for team_id, team_activities in activities.items():
+            team_equipment = equipment.get(team_id, [])
+            for activity in team_activities:
+                count = min(len(team_equipment), self.rng.choice([0, 1, 1, 2, 2, 3, 4]))
+                for item in self.rng.sample(team_equipment, count):
+                    links.append(
+                        models.ActivityEquipment(
+                            owner_team_id=team_id,
+                            activity=activity,
+                            equipment=item,
+                            quantity_needed=self.rng.randint(1, 10),
+                        )
+                    )
+        self.bulk_create(models.ActivityEquipment, links)
+
+    def create_plans(self, teams, venues, locations, activities):
+        venues_by_team = self.group_by_team(venues)
+        start = date(self.options["start_year"], 1, 1)
+        days = 365 * self.options["years"]
+        # Club sizes are skewed: a few big clubs run most of the sessions
+        weights = [self.rng.paretovariate(1.5) for _ in teams]
+        scale = len(teams) / sum(weights)
+
+        pending = []
+        for team, weight in zip(teams, weights):
+            per_week = self.options["sessions_per_week"] * weight * scale
+            sessions = max(1, round(per_week * days / 7))
+            for _ in range(sessions):
+                session_date = start + timedelta(days=self.rng.randrange(days))
+                # Weekends are busier
+                if session_date.weekday() < 5 and self.rng.random() < 0.5:
+                    session_date += timedelta(days=5 - session_date.weekday())
+                pending.append(
+                    (team, self.new_plan(team, venues_by_team, session_date))
+                )
+                if len(pending) >= self.batch_size:
+                    self.flush_plans(pending, locations, activities)
+                    pending = []
+        if pending:
+            self.flush_plans(pending, locations, activities)
+
+    def new_plan(self, team, venues_by_team, session_date):
+        ability = self.rng.choices(
+            [choice for choice, _ in models.Plan.ABILITY_CHOICES],
+            weights=[3, 3, 1, 4],
+        )[0]
+        qualification = None
+        if self.rng.random() < 0.4:
+            qualification = self.rng.choice(models.Plan.COACH_QUALIFICATION_CHOICES)[0]
+        group_size = self.rng.randint(4, 16)
+        return models.Plan(
+            owner_team=team,
+            venue=self.rng.choice(venues_by_team[team.pk]),
+            session_date=session_date,
+            session_time=time(self.rng.randint(9, 18), self.rng.choice([0, 30])),
+            session_length_minutes=self.rng.choice([60, 90, 90, 120]),
+            group_size=group_size,
+            age_range=self.rng.choice(AGE_RANGES),
+            ability_level=ability,
+            coaches_required=max(1, group_size // 6),
+            coach_qualification_required=qualification,
+            plan_goal="Build confidence on technical terrain",
+        )
+
+    def flush_plans(self, pending, locations, activities):
+        plans = self.bulk_create(models.Plan, [plan for _, plan in pending])
+        sections = self.bulk_create(
+            models.PlanSection,
+            [
+                models.PlanSection(plan=plan, name=name, order=order)
+                for plan in plans
+                for order, name in enumerate(SECTION_NAMES)
+            ],
+        )
+        items = []
+        for (team, plan), plan_sections in zip(
+            pending, zip(*[iter(sections)] * len(SECTION_NAMES))
+        ):
+            venue_locations = locations.get(plan.venue_id, [])
+            team_activities = activities.get(team.pk, [])
+            for section in plan_sections:
+                items.extend(self.new_items(section, venue_locations, team_activities))
+        self.bulk_create(models.PlanSectionItem, items)
+
+    def new_items(self, section, venue_locations, team_activities):
+        if section.name == "Start":
+            kinds = ["note", "location"]
+        elif section.name == "End":
+            kinds = ["activity", "note"][: self.rng.randint(1, 2)]
+        else:
+            kinds = ["location"] + ["activity"] * self.rng.randint(2, 5)
+        items = []
+        for order, kind in enumerate(kinds):
+            item = models.PlanSectionItem(section=section, order=order, item_type=kind)
+            if kind == "location" and venue_locations:
+                item.location = self.rng.choice(venue_locations)
+            elif kind == "activity" and team_activities:
+                item.activity = self.rng.choice(team_activities)
+                item.duration_minutes = item.activity.durationMinutes
+            else:
+                item.item_type = models.PlanSectionItem.ITEM_TYPE_NOTE
+                item.notes = self.rng.choice(NOTES)
+            items.append(item)
+        return items
+
+    def difficulty(self):
+        return round(self.rng.triangular(1, 5, 2))
+
+    def group_by_team(self, objs):
+        grouped = {}
+        for obj in objs:
+            grouped.setdefault(obj.owner_team_id, []).append(obj)
+        return grouped
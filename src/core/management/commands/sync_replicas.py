@@ -0,0 +1,61 @@
+"""Copy the primary SQLite database onto each configured replica file.
+
+This is a local stand-in for real replication: SQLite's online backup API
+copies the primary page by page while it stays available for writes, so
+running this on an interval keeps the replicas a bounded time behind.
+"""
+
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.routing import PRIMARY, get_replica_aliases
+
+
+def sync_replica(alias, pages=1024):
+    primary = connections[PRIMARY]
+    replica = connections[alias]
+    if primary.vendor != "sqlite" or replica.vendor != "sqlite":
+        raise CommandError("Backup-based replicas need SQLite on both sides.")
+    primary.ensure_connection()
+    # Own connection rather than Django's, which may be mid-read on the file
+    target = sqlite3.connect(replica.settings_dict["NAME"])
+    try:
+        primary.connection.backup(target, pages=pages)
+    finally:
+        target.close()
+
+
+class Command(BaseCommand):
+    help = "Refresh the SQLite read replicas from the primary database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep syncing every N seconds instead of running once.",
+        )
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=1024,
+            help="Pages copied per backup step, so writers are not starved.",
+        )
+
+    def handle(self, *args, **options):
+        aliases = get_replica_aliases()
+        if not aliases:
+            raise CommandError("No REPLICA_DATABASES configured.")
+        while True:
+            for alias in aliases:
+                started = time.monotonic()
+                sync_replica(alias, options["pages"])
+                if options["verbosity"] > 1:
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f"{alias}: synced in {elapsed:.2f}s")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
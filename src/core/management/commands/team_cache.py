@@ -0,0 +1,41 @@
+"""Show (or reset) the hit/miss counts of the per-team response cache."""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import team_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Print team cache hit/miss stats, summed over all worker processes. "
+        "The counts are approximate: workers flushing at once can lose some."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Print JSON.")
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters afterwards."
+        )
+
+    def handle(self, *args, **options):
+        stats = team_cache.stats()
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, indent=2))
+        elif not stats:
+            self.stdout.write("No lookups recorded yet.")
+        else:
+            width = max(len(name) for name in stats)
+            self.stdout.write(f"{'name':<{width}}  {'hits':>8}  {'misses':>8}  rate")
+            for name, row in stats.items():
+                rate = "-" if row["hit_rate"] is None else f"{row['hit_rate']:.1%}"
+                self.stdout.write(
+                    f"{name:<{width}}  {row['hits']:>8}  {row['misses']:>8}  {rate}"
+                )
+            self.stdout.write(
+                "Counts are approximate: on caches without an atomic incr "
+                "(e.g. file-based), concurrent workers can lose some."
+            )
+        if options["reset"]:
+            team_cache.reset_stats()
@@ -0,0 +1,189 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from core import profiling
+from core.query_budget import QueryRecorder
+from core.routing import get_replica_aliases, use_replica
+
+query_logger = logging.getLogger("core.queries")
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaRoutingMiddleware:
+    """Serve safe-method requests from a read replica.
+
+    After a client makes a write request it is pinned to the primary for
+    ``REPLICA_PIN_SECONDS`` (via a cookie, so it works across workers) so it
+    always reads its own writes, however far behind the replicas are.
+    """
+
+    cookie_name = "ff_primary_until"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, "REPLICA_PIN_SECONDS", 10)
+
+    def __call__(self, request):
+        if not get_replica_aliases():
+            return self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            self.pin_to_primary(response)
+            return response
+
+        with use_replica(not self.is_pinned(request)):
+            return self.get_response(request)
+
+    def is_pinned(self, request):
+        try:
+            return float(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def pin_to_primary(self, response):
+        response.set_cookie(
+            self.cookie_name,
+            str(time.time() + self.pin_seconds),
+            max_age=self.pin_seconds,
+            httponly=True,
+            samesite="Lax",
+        )
+
+
+class QueryBudgetMiddleware:
+    """Record query count, SQL time and repeated statements for each request.
+
+    The numbers are returned in a ``Server-Timing`` header (visible in the
+    browser's network panel) and logged as one JSON line on the
+    ``core.queries`` logger; requests that repeat a statement more than
+    ``QUERY_REPEAT_THRESHOLD`` times are logged as warnings. Enabled with
+    ``QUERY_INSTRUMENTATION``.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.repeat_threshold = getattr(settings, "QUERY_REPEAT_THRESHOLD", 5)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        stats = recorder.as_dict(self.repeat_threshold)
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={stats["sql_ms"]};desc="{stats["queries"]} queries"',
+                f'dup;desc="{len(stats["repeated"])} repeated statements"',
+                f"total;dur={total_ms:.2f}",
+            ]
+        )
+        line = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 2),
+            **stats,
+        }
+        level = logging.WARNING if stats["repeated"] else logging.INFO
+        query_logger.log(level, json.dumps(line), extra={"query_stats": line})
+        return response
+
+
+class ProfilingMiddleware:
+    """Profile individual requests on demand and store the result.
+
+    A request is profiled when it carries a valid ``X-Flowforge-Profile``
+    header (see ``manage.py profile_token``) or when a staff user adds
+    ``?_profile=1`` to the URL. ``?_profile=sample`` (or an
+    ``X-Flowforge-Profiler: sample`` header) uses the sampling profiler
+    instead of cProfile, as does any request arriving while another is under
+    cProfile. Results are listed under "Request profiles" in the admin. Off
+    unless the PROFILING_ENABLED setting is on.
+
+    Must come after AuthenticationMiddleware.
+    """
+
+    header = "HTTP_X_FLOWFORGE_PROFILE"
+    profiler_header = "HTTP_X_FLOWFORGE_PROFILER"
+    param = "_profile"
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.token_max_age = getattr(settings, "PROFILING_TOKEN_MAX_AGE", 3600)
+        self.keep = getattr(settings, "PROFILING_KEEP", 200)
+
+    def __call__(self, request):
+        profiler_name = self.requested_profiler(request)
+        if profiler_name is None:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with QueryRecorder() as recorder, ExitStack() as stack:
+            profiler = self.start_profiler(profiler_name, stack)
+            response = self.get_response(request)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        self.store(request, response, profiler, recorder, duration_ms)
+        return response
+
+    def start_profiler(self, name, stack):
+        if name == "cprofile":
+            try:
+                return stack.enter_context(profiling.CProfiler())
+            except profiling.ProfilerBusy:
+                # Only one request at a time can use cProfile; sample this one
+                pass
+        return stack.enter_context(profiling.StackSampler())
+
+    def requested_profiler(self, request):
+        token = request.META.get(self.header)
+        if token:
+            if not profiling.check_token(token, self.token_max_age):
+                return None
+            name = request.META.get(self.profiler_header)
+        else:
+            user = getattr(request, "user", None)
+            if user is None or not user.is_staff:
+                return None
+            name = request.GET.get(self.param)
+            if not name:
+                return None
+        return "sample" if name == "sample" else "cprofile"
+
+    def store(self, request, response, profiler, recorder, duration_ms):
+        from core.models import RequestProfile
+
+        is_sampled = isinstance(profiler, profiling.StackSampler)
+        user = getattr(request, "user", None)
+        RequestProfile.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            user=user if user is not None and user.is_authenticated else None,
+            status_code=response.status_code,
+            profiler=(
+                RequestProfile.PROFILER_SAMPLE
+                if is_sampled
+                else RequestProfile.PROFILER_CPROFILE
+            ),
+            duration_ms=round(duration_ms, 2),
+            query_count=recorder.count,
+            sql_ms=round(recorder.duration * 1000, 2),
+            summary=profiler.summary(),
+            pstats=None if is_sampled else profiler.pstats_bytes(),
+            collapsed_stacks=profiler.collapsed() if is_sampled else "",
+        )
+        # Keep only the most recent profiles
+        stale = RequestProfile.objects.values_list("pk", flat=True)[self.keep :]
+        RequestProfile.objects.filter(pk__in=list(stale)).delete()
@@ -4,9 +4,19 @@ This migration changes stored values like "I2C BMX Freestyle" to keys like
 "i2c_bmx_freestyle" so the code can use stable machine-friendly choice values.
 
 The reverse migration maps keys back to the original labels.
+
+Rows are rewritten in committed batches with one UPDATE ... CASE statement
+each, so the migration is not atomic. remap_values below is a frozen copy of
+core.data_migrations.remap_values, so later changes to that module can't
+change what this migration does.
 """
-from django.db import migrations
 
+import logging
+
+from django.db import migrations, transaction
+from django.db.models import Case, F, Max, Value, When
+
+logger = logging.getLogger("core.data_migrations")
 
 OLD_TO_NEW = {
     "I2C BMX Freestyle": "i2c_bmx_freestyle",
@@ -28,37 +38,52 @@ OLD_TO_NEW = {
 NEW_TO_OLD = {v: k for k, v in OLD_TO_NEW.items()}
 
 
+def remap_values(queryset, field, mapping, batch_size=1000):
+    """Rewrite `field` through `mapping`, in committed keyset batches."""
+    queryset = queryset.filter(**{f"{field}__in": list(mapping)}).order_by("pk")
+    update = Case(
+        *[When(**{field: old}, then=Value(new)) for old, new in mapping.items()],
+        default=F(field),
+    )
+    total = queryset.count()
+    done = 0
+    after = None
+    while True:
+        # Rows already rewritten no longer match, so this is what is left
+        remaining = queryset if after is None else queryset.filter(pk__gt=after)
+        upto = remaining.values_list("pk", flat=True)[batch_size - 1 : batch_size]
+        upto = next(iter(upto), None)
+        if upto is None:
+            upto = remaining.aggregate(last=Max("pk"))["last"]
+            if upto is None:
+                return done
+        with transaction.atomic(using=queryset.db):
+            done += remaining.filter(pk__lte=upto).update(**{field: update})
+        logger.info("%s: %d/%d rows updated, up to pk %s", field, done, total, upto)
+        after = upto
+
+
 def forwards(apps, schema_editor):
     Plan = apps.get_model("core", "Plan")
     db_alias = schema_editor.connection.alias
-    for plan in Plan.objects.using(db_alias).all():
-        val = plan.coach_qualification_required
-        if not val:
-            continue
-        # if value already a key (we're running migration twice), skip
-        if val in NEW_TO_OLD:
-            continue
-        new = OLD_TO_NEW.get(val)
-        if new:
-            plan.coach_qualification_required = new
-            plan.save(update_fields=["coach_qualification_required"])
+    # Values that are already keys (running the migration twice) don't match
+    remap_values(
+        Plan.objects.using(db_alias), "coach_qualification_required", OLD_TO_NEW
+    )
 
 
 def backwards(apps, schema_editor):
     Plan = apps.get_model("core", "Plan")
     db_alias = schema_editor.connection.alias
-    for plan in Plan.objects.using(db_alias).all():
-        val = plan.coach_qualification_required
-        if not val:
-            continue
-        old = NEW_TO_OLD.get(val)
-        if old:
-            plan.coach_qualification_required = old
-            plan.save(update_fields=["coach_qualification_required"])
+    remap_values(
+        Plan.objects.using(db_alias), "coach_qualification_required", NEW_TO_OLD
+    )
 
 
 class Migration(migrations.Migration):
 
+    atomic = False
+
     dependencies = [
         ("core", "0006_plan_coach_qualification_required"),
     ]
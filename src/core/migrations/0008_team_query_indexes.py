@@ -0,0 +1,77 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_convert_coach_qualification_to_keys"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="plan",
+            name="coach_qualification_required",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("i2c_bmx_freestyle", "I2C BMX Freestyle"),
+                    ("i2c_bmx_race", "I2C BMX Race"),
+                    ("i2c_cycle_speedway", "I2C Cycle Speedway"),
+                    ("i2c_cycling", "I2C Cycling"),
+                    ("i2c_off_road", "I2C Off-Road"),
+                    ("i2c_road", "I2C Road"),
+                    ("i2c_track", "I2C Track"),
+                    ("cic_bmx_freestyle", "CIC BMX Freestyle"),
+                    ("cic_bmx_race", "CIC BMX Race"),
+                    ("cic_cx", "CIC CX"),
+                    ("cic_mtb_xc", "CIC MTB XC"),
+                    ("cic_mtb_gravity", "CIC MTB Gravity"),
+                    ("cic_road", "CIC Road"),
+                    ("cic_track", "CIC Track"),
+                ],
+                help_text="Required coach qualification for this session (optional)",
+                max_length=50,
+                null=True,
+                verbose_name="Coach Qualification Level Required",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="activity",
+            index=models.Index(
+                fields=["owner_team", "name"], name="core_activity_team_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="equipment",
+            index=models.Index(
+                fields=["owner_team", "name"], name="core_equipment_team_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(
+                fields=["owner_team", "name"], name="core_location_team_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="plan",
+            index=models.Index(
+                fields=["owner_team", "session_date"], name="core_plan_team_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="plan",
+            index=models.Index(
+                fields=["venue", "session_date", "session_time"],
+                name="core_plan_venue_slot_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="venue",
+            index=models.Index(
+                fields=["owner_team", "name"], name="core_venue_team_name_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_team_query_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="Captured At"
+                    ),
+                ),
+                ("method", models.CharField(max_length=10, verbose_name="Method")),
+                ("path", models.CharField(max_length=2000, verbose_name="URL")),
+                ("status_code", models.PositiveIntegerField(verbose_name="Status")),
+                (
+                    "profiler",
+                    models.CharField(
+                        choices=[("cprofile", "cProfile"), ("sample", "Sampling")],
+                        max_length=10,
+                        verbose_name="Profiler",
+                    ),
+                ),
+                ("duration_ms", models.FloatField(verbose_name="Duration (ms)")),
+                ("query_count", models.PositiveIntegerField(verbose_name="Queries")),
+                ("sql_ms", models.FloatField(verbose_name="SQL Time (ms)")),
+                ("summary", models.JSONField(default=dict, verbose_name="Summary")),
+                (
+                    "pstats",
+                    models.BinaryField(
+                        blank=True, null=True, verbose_name="pstats Data"
+                    ),
+                ),
+                (
+                    "collapsed_stacks",
+                    models.TextField(blank=True, verbose_name="Collapsed Stacks"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="User",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
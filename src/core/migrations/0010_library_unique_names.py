@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:13
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicates(apps, schema_editor):
+    """Suffix repeated names within a team so the unique constraints apply."""
+    db_alias = schema_editor.connection.alias
+    for model_name in ("Activity", "Equipment"):
+        model = apps.get_model("core", model_name)
+        duplicates = (
+            model.objects.using(db_alias)
+            .values("owner_team", "name")
+            .annotate(n=Count("pk"))
+            .filter(n__gt=1, owner_team__isnull=False)
+        )
+        for group in duplicates:
+            team_rows = model.objects.using(db_alias).filter(
+                owner_team=group["owner_team"]
+            )
+            rows = team_rows.filter(name=group["name"]).order_by("pk")
+            n = 1
+            for obj in rows[1:]:
+                # Skip suffixes already taken, e.g. by a real "Cones (2)"
+                while True:
+                    n += 1
+                    suffix = f" ({n})"
+                    name = group["name"][: 100 - len(suffix)] + suffix
+                    if not team_rows.filter(name=name).exists():
+                        break
+                obj.name = name
+                obj.save(update_fields=["name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_requestprofile"),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="activity",
+            name="core_activity_team_name_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="equipment",
+            name="core_equipment_team_name_idx",
+        ),
+        migrations.AddConstraint(
+            model_name="activity",
+            constraint=models.UniqueConstraint(
+                fields=("owner_team", "name"), name="core_activity_team_name_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="equipment",
+            constraint=models.UniqueConstraint(
+                fields=("owner_team", "name"), name="core_equipment_team_name_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_library_unique_names"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedPlan",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "original_id",
+                    models.PositiveIntegerField(unique=True, verbose_name="Plan ID"),
+                ),
+                ("session_date", models.DateField(verbose_name="Session Date")),
+                ("session_time", models.TimeField(verbose_name="Session Time")),
+                (
+                    "archived_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Archived At"),
+                ),
+                ("data", models.BinaryField(verbose_name="Compressed Plan")),
+                (
+                    "owner_team",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Team that owns this object",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="%(app_label)s_%(class)s_owned_objects",
+                        to="core.team",
+                        verbose_name="Owner Team",
+                    ),
+                ),
+                (
+                    "venue",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="core.venue",
+                        verbose_name="Venue",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-session_date", "-session_time"],
+                "indexes": [
+                    models.Index(
+                        fields=["owner_team", "session_date", "session_time"],
+                        name="core_archplan_team_date_idx",
+                    ),
+                    models.Index(
+                        fields=["session_date", "session_time"],
+                        name="core_archplan_date_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
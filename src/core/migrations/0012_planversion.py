@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_archivedplan"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlanVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("number", models.PositiveIntegerField(verbose_name="Version")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created At"),
+                ),
+                (
+                    "keyframe",
+                    models.BooleanField(default=False, verbose_name="Full Snapshot"),
+                ),
+                ("data", models.BinaryField(verbose_name="Compressed Changes")),
+                (
+                    "plan",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="versions",
+                        to="core.plan",
+                        verbose_name="Plan",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["plan", "number"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("plan", "number"),
+                        name="core_planversion_plan_number_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_plans(apps, schema_editor):
+    """Fill the rollup from the existing plans, one row per team, venue and day.
+
+    Plans whose team has been deleted belong to no team and aren't counted.
+    """
+    db_alias = schema_editor.connection.alias
+    Plan = apps.get_model("core", "Plan")
+    PlanCalendarDay = apps.get_model("core", "PlanCalendarDay")
+    counts = (
+        Plan.objects.using(db_alias)
+        .filter(owner_team__isnull=False)
+        .values("owner_team_id", "venue_id", "session_date")
+        .annotate(plans=Count("pk"))
+        .order_by()
+    )
+    PlanCalendarDay.objects.using(db_alias).bulk_create(
+        (PlanCalendarDay(**row) for row in counts.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_modification_stamps"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlanCalendarDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("session_date", models.DateField(verbose_name="Session Date")),
+                ("plans", models.IntegerField(default=0, verbose_name="Plans")),
+                (
+                    "owner_team",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="core.team",
+                        verbose_name="Team",
+                    ),
+                ),
+                (
+                    "venue",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="core.venue",
+                        verbose_name="Venue",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["session_date"],
+                "indexes": [
+                    models.Index(
+                        fields=["session_date", "plans"], name="core_plancal_date_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("owner_team", "session_date", "venue"),
+                        name="core_plancalendarday_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(count_plans, migrations.RunPython.noop),
+    ]
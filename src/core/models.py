@@ -1,10 +1,15 @@
-from django.db import models
+from datetime import date
+
+from django.db import models, transaction
+from django.db.models.query import BaseIterable, ValuesListIterable
 from django.core import validators
 
 # Create your models here.
 
 from django.conf import settings
 
+from core.sealing import SealableManager
+
 
 # Team + membership models
 class Team(models.Model):
@@ -14,6 +19,9 @@ class Team(models.Model):
     description = models.TextField(
         blank=True, help_text="Description of the team", verbose_name="Team Description"
     )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+
+    objects = SealableManager()
 
     def __str__(self):
         return self.name
@@ -46,6 +54,8 @@ class TeamMembership(models.Model):
         verbose_name="Role",
     )
 
+    objects = SealableManager()
+
     class Meta:
         unique_together = ("team", "user")
 
@@ -72,6 +82,9 @@ class TeamOwnedMixin(models.Model):
         null=True,
         blank=True,
     )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+
+    objects = SealableManager()
 
     class Meta:
         abstract = True
@@ -121,6 +134,13 @@ class Venue(TeamOwnedMixin, models.Model):
         verbose_name="Risk Assessment URL",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner_team", "name"], name="core_venue_team_name_idx"
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -164,6 +184,13 @@ class Location(TeamOwnedMixin, models.Model):
         verbose_name="Terrain Difficulty",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner_team", "name"], name="core_location_team_name_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.name} at {self.venue.name}"
 
@@ -221,6 +248,14 @@ class Activity(TeamOwnedMixin, models.Model):
         verbose_name="Safety Considerations",
     )
 
+    class Meta:
+        # Names identify library entries within a team, e.g. for imports
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner_team", "name"], name="core_activity_team_name_uniq"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.name}"
 
@@ -273,6 +308,14 @@ class Equipment(TeamOwnedMixin, models.Model):
         verbose_name="Activities",
     )
 
+    class Meta:
+        # Names identify library entries within a team, e.g. for imports
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner_team", "name"], name="core_equipment_team_name_uniq"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.name}"
 
@@ -376,6 +419,24 @@ class Plan(TeamOwnedMixin, models.Model):
     plan_goal = models.TextField(
         verbose_name="Session Goal", help_text="Main objective or goal for this session"
     )
+    # Last change to the plan, its sections and items, or the venue, locations
+    # and activities it shows (see core/tree_stamps.py). Used for ETags.
+    tree_modified_at = models.DateTimeField(
+        auto_now=True, verbose_name="Tree Modified At"
+    )
+
+    class Meta:
+        indexes = [
+            # Team plan lists and date drill-downs
+            models.Index(
+                fields=["owner_team", "session_date"], name="core_plan_team_date_idx"
+            ),
+            # Per-venue schedule / clash lookups
+            models.Index(
+                fields=["venue", "session_date", "session_time"],
+                name="core_plan_venue_slot_idx",
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -383,9 +444,12 @@ class Plan(TeamOwnedMixin, models.Model):
         )
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
-        if is_new:
+        if self.pk is not None:
+            return super().save(*args, **kwargs)
+        # One transaction, so the plan never exists without its sections
+        # (and its first version records them too)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
             # Create default sections if this is a new plan
             sections = ["Start", "Middle", "End"]
             for i, name in enumerate(sections):
@@ -406,6 +470,9 @@ class PlanSection(models.Model):
         verbose_name="Order",
         help_text="Order in which this section appears in the plan",
     )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+
+    objects = SealableManager()
 
     class Meta:
         ordering = ["order"]
@@ -465,6 +532,9 @@ class PlanSectionItem(models.Model):
         verbose_name="Duration",
         help_text="Optional duration for this item in minutes",
     )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
+
+    objects = SealableManager()
 
     class Meta:
         ordering = ["order"]
@@ -492,3 +562,222 @@ class PlanSectionItem(models.Model):
             return f"Activity: {self.activity}"
         else:
             return f"Note: {self.notes[:50]}..."
+
+
+# Versions
+class PlanVersion(models.Model):
+    """One revision of a plan, recorded when a transaction that changed it commits.
+
+    ``data`` is zlib-compressed JSON: a full snapshot of the plan tree when
+    ``keyframe`` is set, otherwise only what changed since the previous
+    version (see core/plan_versions.py).
+    """
+
+    plan = models.ForeignKey(
+        Plan, on_delete=models.CASCADE, related_name="versions", verbose_name="Plan"
+    )
+    number = models.PositiveIntegerField(verbose_name="Version")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
+    keyframe = models.BooleanField(default=False, verbose_name="Full Snapshot")
+    data = models.BinaryField(verbose_name="Compressed Changes")
+
+    objects = SealableManager()
+
+    class Meta:
+        ordering = ["plan", "number"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["plan", "number"], name="core_planversion_plan_number_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Version {self.number} of plan {self.plan_id}"
+
+
+# Archive
+class ArchivedPlan(TeamOwnedMixin, models.Model):
+    """A past plan with its sections and items, moved out of the live tables.
+
+    The whole tree and the plan's version history are stored as one
+    zlib-compressed JSON document (see core/plan_archive.py); the columns
+    beside it are just enough to find it. Restoring recreates the rows with
+    their original ids.
+    """
+
+    original_id = models.PositiveIntegerField(unique=True, verbose_name="Plan ID")
+    # PROTECT, like Plan.venue: a restored plan needs its venue back
+    venue = models.ForeignKey(
+        Venue, on_delete=models.PROTECT, related_name="+", verbose_name="Venue"
+    )
+    session_date = models.DateField(verbose_name="Session Date")
+    session_time = models.TimeField(verbose_name="Session Time")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="Archived At")
+    data = models.BinaryField(verbose_name="Compressed Plan")
+
+    class Meta:
+        ordering = ["-session_date", "-session_time"]
+        indexes = [
+            # Both match the default ordering: per team, and across teams
+            # for the admin's date drill-down
+            models.Index(
+                fields=["owner_team", "session_date", "session_time"],
+                name="core_archplan_team_date_idx",
+            ),
+            models.Index(
+                fields=["session_date", "session_time"],
+                name="core_archplan_date_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Archived plan for {self.venue.name} on {self.session_date}"
+
+
+# Calendar
+class PeriodStartIterable(BaseIterable):
+    """Yield the period starts whose probe, a column named ``d<ordinal>``, is true."""
+
+    def __iter__(self):
+        names = self.queryset._fields
+        rows = ValuesListIterable(self.queryset, self.chunked_fetch, self.chunk_size)
+        for row in rows:
+            for name, found in zip(names, row):
+                if found:
+                    yield date.fromordinal(int(name[1:]))
+
+
+class CalendarDayQuerySet(models.QuerySet):
+    def dates(self, field_name, kind, order="ASC"):
+        """QuerySet.dates(), from one index probe per year, month or day.
+
+        The standard version truncates the date of every matching row and
+        takes the distinct values, which reads them all. This finds the
+        first and last date, then returns a queryset asking in one query
+        whether each year (or month, or day) between them has a row, so the
+        cost follows the number of periods rather than rows. Like the
+        standard one it is lazy and has a ``query``, so it can be EXPLAINed.
+        """
+        if field_name != "session_date" or kind not in ("year", "month", "day"):
+            return super().dates(field_name, kind, order)
+        dates = self.order_by().values_list("session_date", flat=True)
+        first = dates.order_by("session_date").first()
+        if first is None:
+            return super().dates(field_name, kind, order)
+        last = dates.order_by("-session_date").first()
+
+        starts = [_period_start(first, kind)]
+        while starts[-1] <= last:
+            starts.append(_next_period(starts[-1], kind))
+        probes = {
+            f"d{start.toordinal()}": models.Exists(
+                self.filter(session_date__gte=start, session_date__lt=end)
+            )
+            for start, end in zip(starts, starts[1:])
+        }
+        names = list(probes)[::-1] if order == "DESC" else list(probes)
+        queryset = self.order_by().annotate(**probes).values_list(*names)[:1]
+        queryset._iterable_class = PeriodStartIterable
+        return queryset
+
+
+def _period_start(day, kind):
+    if kind == "year":
+        return date(day.year, 1, 1)
+    if kind == "month":
+        return date(day.year, day.month, 1)
+    return day
+
+
+def _next_period(start, kind):
+    if kind == "year":
+        return date(start.year + 1, 1, 1)
+    if kind == "month":
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return date.fromordinal(start.toordinal() + 1)
+
+
+class PlanCalendarDay(models.Model):
+    """How many plans a team has at a venue on one day.
+
+    A rollup of Plan kept current as plans are saved and deleted (see
+    core/plan_calendar.py), so calendars and the admin's date drill-down
+    read one row per day instead of scanning plans. Rows can drop to zero
+    plans; readers skip those.
+    """
+
+    owner_team = models.ForeignKey(
+        Team, on_delete=models.CASCADE, related_name="+", verbose_name="Team"
+    )
+    venue = models.ForeignKey(
+        Venue, on_delete=models.CASCADE, related_name="+", verbose_name="Venue"
+    )
+    session_date = models.DateField(verbose_name="Session Date")
+    plans = models.IntegerField(default=0, verbose_name="Plans")
+
+    objects = CalendarDayQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["session_date"]
+        constraints = [
+            # Also the index for a team's month
+            models.UniqueConstraint(
+                fields=["owner_team", "session_date", "venue"],
+                name="core_plancalendarday_uniq",
+            ),
+        ]
+        indexes = [
+            # The admin's drill-down across teams
+            models.Index(
+                fields=["session_date", "plans"], name="core_plancal_date_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.plans} plans on {self.session_date}"
+
+
+# Diagnostics
+class RequestProfile(models.Model):
+    """Profile of a single request, captured by ProfilingMiddleware."""
+
+    PROFILER_CPROFILE = "cprofile"
+    PROFILER_SAMPLE = "sample"
+
+    PROFILER_CHOICES = [
+        (PROFILER_CPROFILE, "cProfile"),
+        (PROFILER_SAMPLE, "Sampling"),
+    ]
+
+    created_at = models.DateTimeField(
+        auto_now_add=True, db_index=True, verbose_name="Captured At"
+    )
+    method = models.CharField(max_length=10, verbose_name="Method")
+    path = models.CharField(max_length=2000, verbose_name="URL")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="User",
+    )
+    status_code = models.PositiveIntegerField(verbose_name="Status")
+    profiler = models.CharField(
+        max_length=10, choices=PROFILER_CHOICES, verbose_name="Profiler"
+    )
+    duration_ms = models.FloatField(verbose_name="Duration (ms)")
+    query_count = models.PositiveIntegerField(verbose_name="Queries")
+    sql_ms = models.FloatField(verbose_name="SQL Time (ms)")
+    # {"unit": ..., "areas": {area: time}, "functions": [top functions]}
+    summary = models.JSONField(default=dict, verbose_name="Summary")
+    pstats = models.BinaryField(blank=True, null=True, verbose_name="pstats Data")
+    collapsed_stacks = models.TextField(blank=True, verbose_name="Collapsed Stacks")
+
+    objects = SealableManager()
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} at {self.created_at:%Y-%m-%d %H:%M:%S}"
@@ -0,0 +1,209 @@
+"""Move old plans out of the live tables into ArchivedPlan, and back.
+
+Each plan, with its sections and items, becomes one ArchivedPlan row whose
+``data`` is the zlib-compressed JSON of every column::
+
+    {"plan": {...}, "sections": [{..., "items": [{...}, ...]}, ...],
+     "versions": [{..., "data": "<base64>"}, ...]}
+
+``versions`` is the plan's version history (see core/plan_versions.py),
+which would otherwise go with the live row; restoring the plan restores it.
+Documents archived before it was kept have none.
+
+Archiving and restoring work a batch of plans per transaction, so the live
+tables are never locked for long and an interrupted run keeps what it did.
+Restored rows get their original ids back, so links to a plan keep working.
+"""
+
+import base64
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from core import models, plan_calendar, team_cache
+
+
+def _rows(model, **filters):
+    attnames = [field.attname for field in model._meta.concrete_fields]
+    return model.objects.filter(**filters).order_by("pk").values(*attnames)
+
+
+def build_instance(model, row, **overrides):
+    """Unsaved `model` instance from JSON-decoded column values."""
+    values = {}
+    for field in model._meta.concrete_fields:
+        value = row.get(field.attname)
+        if value is not None and not field.is_relation:
+            value = field.to_python(value)
+        values[field.attname] = value
+    values.update(overrides)
+    return model(**values)
+
+
+def compress(document):
+    text = json.dumps(document, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return zlib.compress(text.encode())
+
+
+def load_documents(ids):
+    """Plan documents for the plans with `ids`, from one query per table."""
+    # Column values rather than instances: building ~15 model instances per
+    # plan only to read their fields back would dominate the run time
+    documents = {
+        plan["id"]: {"plan": plan, "sections": []}
+        for plan in _rows(models.Plan, pk__in=ids)
+    }
+    sections = {}
+    for section in _rows(models.PlanSection, plan_id__in=ids):
+        section["items"] = []
+        sections[section["id"]] = section
+        documents[section["plan_id"]]["sections"].append(section)
+    for item in _rows(models.PlanSectionItem, section__plan_id__in=ids):
+        sections[item["section_id"]]["items"].append(item)
+    return documents.values()
+
+
+def load_versions(ids):
+    """``{plan id: [version column values]}``, with ``data`` in base64 for JSON."""
+    versions = {}
+    for row in _rows(models.PlanVersion, plan_id__in=ids):
+        row["data"] = base64.b64encode(row["data"]).decode("ascii")
+        # DjangoJSONEncoder would cut the time to milliseconds
+        row["created_at"] = row["created_at"].isoformat()
+        versions.setdefault(row["plan_id"], []).append(row)
+    return versions
+
+
+def decompress(archived):
+    return json.loads(zlib.decompress(archived.data))
+
+
+def _batches(queryset, batch_size):
+    """Yield lists of primary keys from `queryset`, a batch at a time."""
+    queryset = queryset.order_by("pk")
+    last = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last).values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        last = ids[-1]
+        yield ids
+
+
+def archive_plans(queryset, batch_size=200):
+    """Archive the plans in `queryset`. Yields the running total after each batch."""
+    done = 0
+    for ids in _batches(queryset, batch_size):
+        with transaction.atomic():
+            versions = load_versions(ids)
+            models.ArchivedPlan.objects.bulk_create(
+                [
+                    models.ArchivedPlan(
+                        original_id=document["plan"]["id"],
+                        owner_team_id=document["plan"]["owner_team_id"],
+                        venue_id=document["plan"]["venue_id"],
+                        session_date=document["plan"]["session_date"],
+                        session_time=document["plan"]["session_time"],
+                        data=compress(
+                            {
+                                **document,
+                                "versions": versions.get(document["plan"]["id"], []),
+                            }
+                        ),
+                    )
+                    for document in load_documents(ids)
+                ]
+            )
+            # Cascades to the sections, items and versions
+            models.Plan.objects.filter(pk__in=ids).delete()
+        done += len(ids)
+        yield done
+
+
+def create_sections(sections, items):
+    """Recreate sections and items from column values, with their ids.
+
+    Items whose location or activity has been deleted since come back with
+    it unset, as they would have if the plan had stayed live.
+    """
+    locations = set(
+        models.Location.objects.filter(
+            pk__in={item["location_id"] for item in items}
+        ).values_list("pk", flat=True)
+    )
+    activities = set(
+        models.Activity.objects.filter(
+            pk__in={item["activity_id"] for item in items}
+        ).values_list("pk", flat=True)
+    )
+    models.PlanSection.objects.bulk_create(
+        [build_instance(models.PlanSection, section) for section in sections]
+    )
+    models.PlanSectionItem.objects.bulk_create(
+        [
+            build_instance(
+                models.PlanSectionItem,
+                item,
+                location_id=item["location_id"]
+                if item["location_id"] in locations
+                else None,
+                activity_id=item["activity_id"]
+                if item["activity_id"] in activities
+                else None,
+            )
+            for item in items
+        ]
+    )
+
+
+def restore_versions(rows):
+    """Recreate plan versions from column values, with their ids."""
+    versions = [build_instance(models.PlanVersion, row) for row in rows]
+    # bulk_create stamps created_at (auto_now_add) with the current time, so
+    # the original times are put back afterwards
+    created_at = [version.created_at for version in versions]
+    models.PlanVersion.objects.bulk_create(versions)
+    for version, value in zip(versions, created_at):
+        version.created_at = value
+    models.PlanVersion.objects.bulk_update(versions, ["created_at"])
+
+
+def restore_plans(queryset, batch_size=200):
+    """Recreate the archived plans in `queryset`. Yields the running total."""
+    done = 0
+    for ids in _batches(queryset, batch_size):
+        with transaction.atomic():
+            archived = list(models.ArchivedPlan.objects.filter(pk__in=ids))
+            documents = [(entry, decompress(entry)) for entry in archived]
+            plans = models.Plan.objects.bulk_create(
+                [
+                    # The team may have been deleted while the plan was archived
+                    build_instance(
+                        models.Plan, document["plan"], owner_team_id=entry.owner_team_id
+                    )
+                    for entry, document in documents
+                ]
+            )
+            sections = [
+                section for _, document in documents for section in document["sections"]
+            ]
+            create_sections(
+                sections, [item for section in sections for item in section["items"]]
+            )
+            restore_versions(
+                [
+                    version
+                    for _, document in documents
+                    for version in document.get("versions", [])
+                ]
+            )
+            plan_calendar.refresh(plan_calendar.key_of(plan) for plan in plans)
+            for team_id in {entry.owner_team_id for entry, _ in documents}:
+                team_cache.bump(team_id)
+            models.ArchivedPlan.objects.filter(pk__in=ids).delete()
+        done += len(ids)
+        yield done
@@ -0,0 +1,141 @@
+"""Keep the PlanCalendarDay rollup current, and read calendars from it.
+
+Each PlanCalendarDay row counts one team's plans at one venue on one day.
+Saving a plan moves one count from its old ``(team, venue, day)`` to its
+new one if any of them changed; deleting it takes one off. Each is an
+``UPDATE ... SET plans = plans ± 1`` in the same transaction as the change,
+so concurrent saves can't lose a count.
+
+Plans with no team (their team was deleted) aren't counted: there is no
+team calendar to show them in.
+
+Bulk operations send no signals; code using them calls ``refresh`` with
+the keys it touched, or ``rebuild`` for whole teams.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from core import models
+
+KEY_FIELDS = ("owner_team_id", "venue_id", "session_date")
+_KEY_NAMES = {"owner_team", "owner_team_id", "venue", "venue_id", "session_date"}
+
+
+def key_of(plan):
+    return tuple(getattr(plan, name) for name in KEY_FIELDS)
+
+
+def _rows(key):
+    return models.PlanCalendarDay.objects.filter(**dict(zip(KEY_FIELDS, key)))
+
+
+def add(key, delta):
+    """Add `delta` plans to the count for `key`."""
+    if key[0] is None:
+        return
+    if delta > 0:
+        models.PlanCalendarDay.objects.bulk_create(
+            [models.PlanCalendarDay(**dict(zip(KEY_FIELDS, key)))],
+            ignore_conflicts=True,
+        )
+    _rows(key).update(plans=F("plans") + delta)
+
+
+def refresh(keys):
+    """Recount the plans for each ``(team id, venue id, day)`` in `keys`."""
+    keys = {key for key in keys if key[0] is not None}
+    if not keys:
+        return
+    counts = Counter()
+    plans = models.Plan.objects.filter(
+        owner_team__in={key[0] for key in keys},
+        session_date__in={key[2] for key in keys},
+    ).values_list(*KEY_FIELDS)
+    for key in plans:
+        counts[key] += 1
+    models.PlanCalendarDay.objects.bulk_create(
+        [
+            models.PlanCalendarDay(**dict(zip(KEY_FIELDS, key)), plans=counts[key])
+            for key in keys
+        ],
+        update_conflicts=True,
+        unique_fields=["owner_team", "session_date", "venue"],
+        update_fields=["plans"],
+    )
+
+
+def rebuild(team_ids=None):
+    """Recount every day of the given teams (of all teams if None)."""
+    plans = models.Plan.objects.filter(owner_team__isnull=False)
+    days = models.PlanCalendarDay.objects.all()
+    if team_ids is not None:
+        plans = plans.filter(owner_team__in=team_ids)
+        days = days.filter(owner_team__in=team_ids)
+    counts = plans.values(*KEY_FIELDS).annotate(plans=Count("pk")).order_by(*KEY_FIELDS)
+    with transaction.atomic():
+        days.delete()
+        models.PlanCalendarDay.objects.bulk_create(
+            (models.PlanCalendarDay(**row) for row in counts.iterator()),
+            batch_size=1000,
+        )
+
+
+# Reading
+
+
+def days(filters=None):
+    """PlanCalendarDay rows that have plans, narrowed by `filters` (a dict)."""
+    return models.PlanCalendarDay.objects.filter(plans__gt=0, **(filters or {}))
+
+
+def month(team_id, first, last, venue_id=None):
+    """``[(day, {venue id: plans})]`` for the team's days with plans."""
+    rows = days({"owner_team": team_id, "session_date__range": (first, last)})
+    if venue_id is not None:
+        rows = rows.filter(venue=venue_id)
+    result = {}
+    for day, venue, plans in rows.values_list("session_date", "venue_id", "plans"):
+        result.setdefault(day, {})[venue] = plans
+    return sorted(result.items())
+
+
+# Signals
+
+
+def _plan_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not _KEY_NAMES & set(update_fields):
+        return
+    instance._calendar_key = (
+        models.Plan.objects.filter(pk=instance.pk).values_list(*KEY_FIELDS).first()
+    )
+
+
+def _plan_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not _KEY_NAMES & set(update_fields):
+        return
+    old, new = instance.__dict__.pop("_calendar_key", None), key_of(instance)
+    if old != new:
+        if old is not None:
+            add(old, -1)
+        add(new, 1)
+
+
+def _plan_deleted(sender, instance, **kwargs):
+    # When the whole team is being deleted its rows may be gone already,
+    # which leaves nothing to update
+    add(key_of(instance), -1)
+
+
+def connect():
+    """Start keeping the rollup current (done in CoreConfig.ready)."""
+    pre_save.connect(_plan_saving, sender=models.Plan, dispatch_uid="plan_calendar")
+    post_save.connect(_plan_saved, sender=models.Plan, dispatch_uid="plan_calendar")
+    post_delete.connect(_plan_deleted, sender=models.Plan, dispatch_uid="plan_calendar")
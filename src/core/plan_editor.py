@@ -0,0 +1,311 @@
+"""Save an edited plan tree as only the changes it needs.
+
+The editor sends the plan's whole tree, in the shape PlanDetailView
+returns it: the plan's own fields (``PLAN_FIELDS``, such as ``plan_goal``
+or ``session_date``; any left out keep their value) and
+``"sections": [{"id", "name", "items": [{...}]}]``. Order is the position
+in those lists. A section or item with an ``id`` is an existing row of the
+plan (an item may move to another section); one without is new; existing
+rows left out are deleted. Other keys, such as the names PlanDetailView
+adds, are ignored, so its output can be sent back.
+
+``save_tree`` validates every row before writing anything, running each
+item's ``clean`` with its location and activity loaded in one query per
+model, and reports every problem at once. It then compares the tree with
+the stored rows and writes the difference in one transaction. Each of
+these steps is one statement per model, whatever the size of the tree:
+delete, bulk_create and bulk_update.
+
+The plan itself is saved with ``save(update_fields=...)``, and only if one
+of its fields changed, so its signals (the calendar rollup among them)
+still run. Bulk operations send no signals, so the plan's tree stamp, its
+team's cache and its version history are updated here.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core import models, plan_versions, team_cache, tree_stamps
+from core.library_io import format_errors
+
+PLAN_FIELDS = (
+    "venue_id",
+    "session_date",
+    "session_time",
+    "session_length_minutes",
+    "group_size",
+    "age_range",
+    "ability_level",
+    "coaches_required",
+    "coach_qualification_required",
+    "plan_goal",
+)
+SECTION_FIELDS = ("name",)
+ITEM_FIELDS = ("item_type", "location_id", "activity_id", "notes", "duration_minutes")
+
+
+class TreeError(Exception):
+    """The tree can't be saved; ``errors`` says where and why."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} problem(s) in the plan tree")
+        self.errors = errors
+
+
+class StaleTree(Exception):
+    """The plan's tree has changed since the editor loaded it."""
+
+
+def _rows(value, path, errors):
+    if not isinstance(value, list) or not all(isinstance(row, dict) for row in value):
+        errors.append({"path": path, "error": "Expected a list of objects"})
+        return []
+    return value
+
+
+def _row_id(row, path, stored, seen, errors):
+    """The existing row `row` edits, or None for a new one."""
+    if row.get("id") is None:
+        return None
+    pk = row["id"]
+    if not isinstance(pk, int) or pk not in stored:
+        errors.append({"path": path, "error": f"No such row {pk!r} in this plan"})
+    elif pk in seen:
+        errors.append({"path": path, "error": f"Row {pk} appears more than once"})
+    else:
+        seen.add(pk)
+        return pk
+    return None
+
+
+def _validate(obj, row, fields, exclude, path, errors):
+    for name in fields:
+        if name in row:
+            setattr(obj, name, row[name])
+    try:
+        obj.full_clean(
+            exclude=exclude, validate_unique=False, validate_constraints=False
+        )
+    except ValidationError as exc:
+        errors.extend({"path": path, "error": error} for error in format_errors(exc))
+
+
+def _link(items, model, attname, team_id, errors):
+    """Attach the `model` rows the items point at, checking they are the team's."""
+    ids = {item.obj.__dict__[attname] for item in items}
+    ids = {pk for pk in ids if isinstance(pk, int)}
+    found = model.objects.filter(owner_team=team_id).in_bulk(ids)
+    field = models.PlanSectionItem._meta.get_field(attname.removesuffix("_id"))
+    for item in items:
+        pk = item.obj.__dict__[attname]
+        if pk is None:
+            continue
+        if not isinstance(pk, int) or pk not in found:
+            errors.append(
+                {
+                    "path": item.path,
+                    "error": f"{field.name}: no {field.verbose_name.lower()} {pk!r} "
+                    "in this team",
+                }
+            )
+        else:
+            # So clean() and __str__ don't fetch it again
+            field.set_cached_value(item.obj, found[pk])
+
+
+class _Row:
+    """One section or item of the edited tree."""
+
+    def __init__(self, obj, path, pk, parent=None):
+        self.obj = obj
+        self.path = path
+        self.pk = pk
+        self.parent = parent
+
+
+def parse_tree(plan, tree, sections, items):
+    """The edited tree as _Rows, validated against the stored `sections`
+    and `items` (column values keyed by id). The tree's plan fields are set
+    on `plan`. Raises TreeError.
+    """
+    errors = []
+    if not isinstance(tree, dict):
+        raise TreeError([{"path": "", "error": "Expected an object"}])
+    venue_id = plan.venue_id
+    _validate(plan, tree, PLAN_FIELDS, ["owner_team", "venue"], "", errors)
+    if plan.venue_id != venue_id and not (
+        isinstance(plan.venue_id, int)
+        and models.Venue.objects.filter(
+            owner_team=plan.owner_team_id, pk=plan.venue_id
+        ).exists()
+    ):
+        errors.append(
+            {"path": "", "error": f"venue: no venue {plan.venue_id!r} in this team"}
+        )
+    seen_sections, seen_items = set(), set()
+    new_sections, new_items = [], []
+    for index, row in enumerate(_rows(tree.get("sections"), "sections", errors)):
+        path = f"sections[{index}]"
+        pk = _row_id(row, path, sections, seen_sections, errors)
+        obj = models.PlanSection(pk=pk, plan=plan, **sections.get(pk, {}))
+        obj.order = index
+        _validate(obj, row, SECTION_FIELDS, ["plan"], path, errors)
+        section = _Row(obj, path, pk)
+        new_sections.append(section)
+
+        for position, item_row in enumerate(
+            _rows(row.get("items", []), f"{path}.items", errors)
+        ):
+            item_path = f"{path}.items[{position}]"
+            item_pk = _row_id(item_row, item_path, items, seen_items, errors)
+            obj = models.PlanSectionItem(pk=item_pk, **items.get(item_pk, {}))
+            obj.order = position
+            for name in ITEM_FIELDS:
+                if name in item_row:
+                    setattr(obj, name, item_row[name])
+            new_items.append(_Row(obj, item_path, item_pk, section))
+
+    _link(new_items, models.Location, "location_id", plan.owner_team_id, errors)
+    _link(new_items, models.Activity, "activity_id", plan.owner_team_id, errors)
+    # The links were checked above, with one query for all of them, and
+    # an item pointing at the wrong row has nothing more worth reporting
+    exclude = ["section", "order", "location", "activity"]
+    failed = {error["path"] for error in errors}
+    for item in new_items:
+        if item.path not in failed:
+            _validate(item.obj, {}, (), exclude, item.path, errors)
+    if errors:
+        raise TreeError(errors)
+    return new_sections, new_items
+
+
+def _stored(queryset, fields):
+    return {row.pop("id"): row for row in queryset.values("id", *fields).order_by()}
+
+
+def _changed(row, stored, fields):
+    return any(getattr(row.obj, name) != stored[name] for name in fields)
+
+
+def save_tree(plan_id, tree, etag=None):
+    """Make plan `plan_id`'s fields, sections and items match `tree`.
+
+    With `etag`, raises StaleTree unless it still matches the plan's (see
+    tree_stamps.etag). Returns counts of the rows created, updated and
+    deleted, and whether anything was written.
+    """
+    with transaction.atomic():
+        plan = models.Plan.objects.select_for_update().get(pk=plan_id)
+        if etag is not None and etag != tree_stamps.etag(
+            plan.pk, plan.tree_modified_at
+        ):
+            raise StaleTree("The plan has changed since it was loaded")
+        stored_plan = {name: getattr(plan, name) for name in PLAN_FIELDS}
+        sections = _stored(
+            models.PlanSection.objects.filter(plan=plan), ("order", *SECTION_FIELDS)
+        )
+        items = _stored(
+            models.PlanSectionItem.objects.filter(section__plan=plan),
+            ("section_id", "order", *ITEM_FIELDS),
+        )
+        new_sections, new_items = parse_tree(plan, tree, sections, items)
+
+        changed_plan = [
+            name for name in PLAN_FIELDS if getattr(plan, name) != stored_plan[name]
+        ]
+        dropped_sections = set(sections) - {row.pk for row in new_sections}
+        dropped_items = set(items) - {row.pk for row in new_items}
+        changed_sections = [
+            row
+            for row in new_sections
+            if row.pk is not None
+            and _changed(row, sections[row.pk], ("order", *SECTION_FIELDS))
+        ]
+        changed_items = [
+            row
+            for row in new_items
+            if row.pk is not None
+            and (
+                row.parent.pk != row.obj.section_id
+                or _changed(row, items[row.pk], ("order", *ITEM_FIELDS))
+            )
+        ]
+        counts = {
+            "created": {
+                "sections": sum(row.pk is None for row in new_sections),
+                "items": sum(row.pk is None for row in new_items),
+            },
+            "updated": {
+                "plan": int(bool(changed_plan)),
+                "sections": len(changed_sections),
+                "items": len(changed_items),
+            },
+            "deleted": {"sections": len(dropped_sections), "items": len(dropped_items)},
+        }
+        changed = any(n for group in counts.values() for n in group.values())
+        if not changed:
+            return {**counts, "changed": False}
+
+        if changed_plan:
+            plan.save(update_fields=changed_plan)
+
+        # (plan, order) and (section, order) are unique, and checked row by
+        # row as a statement runs, so swapping two rows in one UPDATE fails.
+        # Rows that move are first parked above every order in use; then
+        # each one's new place is free when it gets there.
+        if dropped_items:
+            models.PlanSectionItem.objects.filter(pk__in=dropped_items).delete()
+        park = 1 + max(
+            [len(new_sections), len(new_items)]
+            + [row["order"] for row in (*sections.values(), *items.values())]
+        )
+        moving = [
+            row.pk
+            for row in changed_sections
+            if row.obj.order != sections[row.pk]["order"]
+        ]
+        if moving or dropped_sections:
+            models.PlanSection.objects.filter(
+                pk__in=[*moving, *dropped_sections]
+            ).update(order=F("order") + park)
+        moving = [
+            row.pk
+            for row in changed_items
+            if (row.parent.pk, row.obj.order)
+            != (items[row.pk]["section_id"], items[row.pk]["order"])
+        ]
+        if moving:
+            models.PlanSectionItem.objects.filter(pk__in=moving).update(
+                order=F("order") + park
+            )
+
+        # bulk_update, unlike bulk_create, leaves auto_now fields alone
+        now = timezone.now()
+        models.PlanSection.objects.bulk_create(
+            [row.obj for row in new_sections if row.pk is None]
+        )
+        for row in changed_sections:
+            row.obj.updated_at = now
+        models.PlanSection.objects.bulk_update(
+            [row.obj for row in changed_sections],
+            ["order", *SECTION_FIELDS, "updated_at"],
+        )
+        for row in new_items:
+            row.obj.section = row.parent.obj
+            row.obj.updated_at = now
+        models.PlanSectionItem.objects.bulk_update(
+            [row.obj for row in changed_items],
+            ["section", "order", *ITEM_FIELDS, "updated_at"],
+        )
+        models.PlanSectionItem.objects.bulk_create(
+            [row.obj for row in new_items if row.pk is None]
+        )
+        if dropped_sections:
+            models.PlanSection.objects.filter(pk__in=dropped_sections).delete()
+
+        tree_stamps.touch_plans(models.Plan.objects.filter(pk=plan.pk))
+        team_cache.bump(plan.owner_team_id)
+        plan_versions.mark_changed(plan.pk)
+    return {**counts, "changed": True}
@@ -0,0 +1,319 @@
+"""Plan version history, stored as structural deltas.
+
+The state of a plan is a *snapshot*: its own column values plus its sections
+and items keyed by id, all as JSON values::
+
+    {"plan": {...}, "sections": {"12": {...}}, "items": {"40": {...}}}
+
+Each PlanVersion holds either a full snapshot (a keyframe) or a *delta*
+against the version before it. A delta has the same shape but only carries
+what changed: the changed columns of existing rows, every column of new
+rows, and ``null`` for deleted rows. A keyframe is written at least every
+``PLAN_KEYFRAME_INTERVAL`` versions, so rebuilding any version applies a
+bounded number of deltas.
+
+Saving or deleting a plan, section or item only notes which plan changed.
+The versions are written together once the transaction commits, one per
+plan however many rows it touched, and only if something actually changed.
+Bulk operations send no signals, so code using them calls ``mark_changed``.
+"""
+
+import bisect
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.signals import post_delete, post_save
+
+from core import commit_batch, models, plan_archive, team_cache
+from core.routing import use_replica
+
+TABLES = ("sections", "items")
+
+# Bookkeeping columns that change on every save; not part of a version
+STAMPS = ("updated_at", "tree_modified_at")
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(data))
+
+
+# Snapshots and deltas
+
+
+def snapshot(document):
+    """Snapshot of a plan from its plan_archive document."""
+    document = json.loads(json.dumps(document, cls=DjangoJSONEncoder))
+    plan = document["plan"]
+    del plan["id"]
+    sections, items = {}, {}
+    for section in document["sections"]:
+        for item in section.pop("items"):
+            items[str(item.pop("id"))] = item
+        sections[str(section.pop("id"))] = section
+    for row in [plan, *sections.values(), *items.values()]:
+        for name in STAMPS:
+            row.pop(name, None)
+    return {"plan": plan, "sections": sections, "items": items}
+
+
+def _changed(old, new):
+    return {name: value for name, value in new.items() if old.get(name) != value}
+
+
+def diff(old, new):
+    """Delta turning snapshot `old` into `new`; empty if they are the same."""
+    delta = {}
+    changed = _changed(old["plan"], new["plan"])
+    if changed:
+        delta["plan"] = changed
+    for table in TABLES:
+        before, after = old[table], new[table]
+        rows = {key: None for key in before.keys() - after.keys()}
+        for key, row in after.items():
+            if key not in before:
+                rows[key] = row
+            else:
+                changed = _changed(before[key], row)
+                if changed:
+                    rows[key] = changed
+        if rows:
+            delta[table] = rows
+    return delta
+
+
+def apply(state, delta):
+    """New snapshot: `state` with `delta` applied. `state` is left as it was."""
+    result = {"plan": {**state["plan"], **delta.get("plan", {})}}
+    for table in TABLES:
+        rows = dict(state[table])
+        for key, row in delta.get(table, {}).items():
+            if row is None:
+                rows.pop(key, None)
+            else:
+                rows[key] = {**rows.get(key, {}), **row}
+        result[table] = rows
+    return result
+
+
+def describe(old, new):
+    """What changed from snapshot `old` to `new`, with before and after values."""
+    changes = {
+        "plan": {
+            name: [old["plan"].get(name), value]
+            for name, value in _changed(old["plan"], new["plan"]).items()
+        }
+    }
+    for table in TABLES:
+        before, after = old[table], new[table]
+        changes[table] = {
+            "added": {key: after[key] for key in after.keys() - before.keys()},
+            "removed": {key: before[key] for key in before.keys() - after.keys()},
+            "changed": {
+                key: {
+                    name: [before[key].get(name), value]
+                    for name, value in _changed(before[key], row).items()
+                }
+                for key, row in after.items()
+                if key in before and _changed(before[key], row)
+            },
+        }
+    return changes
+
+
+# Reading versions
+
+
+def _replay(rows):
+    """Walk ``(number, keyframe, data)`` rows in order, yielding each snapshot.
+
+    Every run of rows has to start at a keyframe.
+    """
+    state = None
+    for number, keyframe, data in rows:
+        state = unpack(data) if keyframe else apply(state, unpack(data))
+        yield number, state
+
+
+def rebuild(plan_id, numbers):
+    """Snapshots of the plan at the given version numbers, as ``{number: snapshot}``.
+
+    Only the versions from the nearest keyframe before each number are read.
+    Raises PlanVersion.DoesNotExist for a version that isn't there.
+    """
+    numbers = set(numbers)
+    versions = models.PlanVersion.objects.filter(plan_id=plan_id)
+    keyframes = list(
+        versions.filter(keyframe=True, number__lte=max(numbers))
+        .order_by("number")
+        .values_list("number", flat=True)
+    )
+    ranges = Q()
+    for number in numbers:
+        start = bisect.bisect_right(keyframes, number)
+        if not start:
+            raise models.PlanVersion.DoesNotExist(f"No version {number}")
+        ranges |= Q(number__range=(keyframes[start - 1], number))
+    rows = (
+        versions.filter(ranges)
+        .order_by("number")
+        .values_list("number", "keyframe", "data")
+    )
+    snapshots = {number: state for number, state in _replay(rows) if number in numbers}
+    missing = numbers - snapshots.keys()
+    if missing:
+        raise models.PlanVersion.DoesNotExist(f"No version {min(missing)}")
+    return snapshots
+
+
+def latest(plan_ids):
+    """Newest version of each plan: ``{plan_id: (number, keyframe, snapshot)}``.
+
+    ``keyframe`` is the number of the last keyframe at or before it.
+    """
+    last_keyframe = (
+        models.PlanVersion.objects.filter(plan=OuterRef("plan"), keyframe=True)
+        .order_by("-number")
+        .values("number")[:1]
+    )
+    rows = (
+        models.PlanVersion.objects.filter(plan_id__in=plan_ids)
+        .alias(start=Subquery(last_keyframe))
+        .filter(number__gte=F("start"))
+        .order_by("plan_id", "number")
+        .values_list("plan_id", "number", "keyframe", "data")
+    )
+    result = {}
+    for plan_id, number, keyframe, data in rows:
+        if keyframe:
+            result[plan_id] = (number, number, unpack(data))
+        else:
+            _, start, state = result[plan_id]
+            result[plan_id] = (number, start, apply(state, unpack(data)))
+    return result
+
+
+def diff_versions(plan, old, new):
+    """What changed in `plan` between versions `old` and `new`."""
+    snapshots = rebuild(plan.pk, [old, new])
+    return {"from": old, "to": new, **describe(snapshots[old], snapshots[new])}
+
+
+# Recording versions
+
+
+def record_versions(plan_ids, using=DEFAULT_DB_ALIAS, batch_size=500):
+    """Write a version for each plan whose tree changed since its last one."""
+    interval = settings.PLAN_KEYFRAME_INTERVAL
+    plan_ids = sorted(plan_ids)
+    created = []
+    for start in range(0, len(plan_ids), batch_size):
+        batch = plan_ids[start : start + batch_size]
+        current = {
+            document["plan"]["id"]: snapshot(document)
+            for document in plan_archive.load_documents(batch)
+        }
+        previous = latest(current)
+        versions = []
+        for plan_id, state in current.items():
+            number, keyframe_number, last = previous.get(plan_id, (0, None, None))
+            if last is not None:
+                delta = diff(last, state)
+                if not delta:
+                    continue
+            number += 1
+            keyframe = keyframe_number is None or number - keyframe_number >= interval
+            versions.append(
+                models.PlanVersion(
+                    plan_id=plan_id,
+                    number=number,
+                    keyframe=keyframe,
+                    data=plan_archive.compress(state if keyframe else delta),
+                )
+            )
+        created += models.PlanVersion.objects.using(using).bulk_create(versions)
+        for version in versions:
+            team_cache.bump(current[version.plan_id]["plan"]["owner_team_id"], using)
+    return created
+
+
+def flush(using, plans=(), sections=()):
+    """Record versions for the plans noted as changed on `using`."""
+    plan_ids = set(plans)
+    with use_replica(False):
+        plan_ids.update(
+            models.PlanSection.objects.filter(pk__in=sections).values_list(
+                "plan_id", flat=True
+            )
+        )
+        for attempt in range(3):
+            try:
+                with transaction.atomic(using=using):
+                    return record_versions(plan_ids, using)
+            except IntegrityError:
+                # Another transaction numbered a version of the same plan
+                # first; read its version and go again
+                if attempt == 2:
+                    raise
+
+
+def mark_changed(plan_id, using=DEFAULT_DB_ALIAS):
+    """Record a version of the plan when the current transaction commits."""
+    _note(using, plan_id=plan_id)
+
+
+def _note(using, plan_id=None, section_id=None):
+    # Plans noted and then rolled back to a savepoint that didn't drop the
+    # batch are harmless, as an unchanged plan gets no new version
+    if plan_id is not None:
+        commit_batch.add(flush, using, plans=[plan_id])
+    if section_id is not None:
+        commit_batch.add(flush, using, sections=[section_id])
+
+
+def _row_changed(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    if sender is models.PlanSectionItem:
+        _note(using, section_id=instance.section_id)
+    elif sender is models.PlanSection:
+        _note(using, plan_id=instance.plan_id)
+    else:
+        _note(using, plan_id=instance.pk)
+
+
+def connect():
+    """Start noting plan changes (done in CoreConfig.ready)."""
+    post_save.connect(_row_changed, sender=models.Plan, dispatch_uid="plan_versions")
+    # A deleted plan takes its versions with it, so only its rows are watched
+    for model in (models.PlanSection, models.PlanSectionItem):
+        post_save.connect(_row_changed, sender=model, dispatch_uid="plan_versions")
+        post_delete.connect(_row_changed, sender=model, dispatch_uid="plan_versions")
+
+
+# Reverting
+
+
+def revert(plan, number):
+    """Put `plan` back the way it was at version `number`.
+
+    The plan keeps its current team. Sections and items come back with their
+    old ids; links to locations or activities deleted since are unset. The
+    revert itself is recorded as a new version.
+    """
+    state = rebuild(plan.pk, [number])[number]
+    with transaction.atomic():
+        reverted = plan_archive.build_instance(
+            models.Plan, state["plan"], id=plan.pk, owner_team_id=plan.owner_team_id
+        )
+        reverted.save(force_update=True)
+        models.PlanSection.objects.filter(plan=plan).delete()
+        plan_archive.create_sections(
+            [{**row, "id": int(key)} for key, row in state["sections"].items()],
+            [{**row, "id": int(key)} for key, row in state["items"].items()],
+        )
+        mark_changed(plan.pk)
+    return reverted
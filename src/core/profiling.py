@@ -0,0 +1,167 @@
+"""On-demand request profiling.
+
+Two profilers are available:
+
+``cprofile``
+    Deterministic; exact call counts and timings, exported as pstats (load
+    with ``python -m pstats`` or snakeviz). Adds noticeable overhead. It
+    hooks the whole process (through ``sys.monitoring`` on Python 3.12+), so
+    only one request can use it at a time, and calls made meanwhile on
+    other threads show up in its profile too.
+``sample``
+    A background thread snapshots the request thread's stack every few
+    milliseconds. Cheap enough for production and produces collapsed stacks
+    (``frame;frame;frame count`` lines) that flamegraph.pl / speedscope read
+    directly.
+"""
+
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+from collections import Counter
+
+from django.core import signing
+
+TOKEN_SALT = "core.profiling"
+
+# Held while a CProfiler runs; see the module docstring
+_cprofile_lock = threading.Lock()
+
+# Which part of the stack a function belongs to, by file path fragment
+AREAS = (
+    ("django/db/", "orm"),
+    ("django/template/", "template"),
+    ("core/models.py", "core.models"),
+    ("django/", "django"),
+)
+
+
+def make_token():
+    """Signed value for the ``X-Flowforge-Profile`` header."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign("profile")
+
+
+def check_token(token, max_age):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def classify(filename):
+    filename = filename.replace("\\", "/")
+    for fragment, area in AREAS:
+        if fragment in filename:
+            return area
+    return "other"
+
+
+class StackSampler:
+    """Sample one thread's stack on an interval until stopped."""
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_filename}:{code.co_qualname}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.items())
+
+    def summary(self, limit=30):
+        # Self time is the number of samples in which a function is the leaf
+        self_samples = Counter()
+        for stack, count in self.stacks.items():
+            self_samples[stack.rsplit(";", 1)[-1]] += count
+        total = sum(self_samples.values()) or 1
+        areas = Counter()
+        for frame, count in self_samples.items():
+            areas[classify(frame)] += round(100 * count / total, 1)
+        return {
+            "unit": "% of samples",
+            "areas": {area: round(total, 3) for area, total in areas.items()},
+            "functions": [
+                {
+                    "function": frame,
+                    "area": classify(frame),
+                    "samples": count,
+                    "percent": round(100 * count / total, 1),
+                }
+                for frame, count in self_samples.most_common(limit)
+            ],
+        }
+
+
+class ProfilerBusy(Exception):
+    """Another CProfiler is running."""
+
+
+class CProfiler:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        if not _cprofile_lock.acquire(blocking=False):
+            raise ProfilerBusy("Another request is being profiled with cProfile")
+        try:
+            self.profile.enable()
+        except BaseException:
+            _cprofile_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.profile.disable()
+        finally:
+            _cprofile_lock.release()
+        self.stats = pstats.Stats(self.profile, stream=io.StringIO())
+
+    def pstats_bytes(self):
+        return marshal.dumps(self.stats.stats)
+
+    def summary(self, limit=30):
+        areas = Counter()
+        for (filename, _, _), (_, _, tottime, _, _) in self.stats.stats.items():
+            areas[classify(filename)] += round(tottime * 1000, 3)
+        top = sorted(
+            self.stats.stats.items(), key=lambda item: item[1][2], reverse=True
+        )[:limit]
+        return {
+            "unit": "ms self time",
+            "areas": {area: round(total, 3) for area, total in areas.items()},
+            "functions": [
+                {
+                    "function": f"{filename}:{line}({name})",
+                    "area": classify(filename),
+                    "ncalls": ncalls,
+                    "tottime_ms": round(tottime * 1000, 3),
+                    "cumtime_ms": round(cumtime * 1000, 3),
+                }
+                for (filename, line, name), (_, ncalls, tottime, cumtime, _) in top
+            ],
+        }
@@ -0,0 +1,68 @@
+"""Record the SQL a block of code runs: count, time and repeated statements.
+
+``QueryRecorder`` hooks every database connection with an execute wrapper.
+Each statement is reduced to a fingerprint (its SQL with placeholders and
+``IN (...)`` lists collapsed), so the same query run once per row — the
+classic N+1, e.g. ``Location.__str__`` fetching its venue for every location
+in a list — shows up as one fingerprint with a high count.
+"""
+
+import hashlib
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+def fingerprint(sql):
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+def short_hash(text):
+    return hashlib.sha1(text.encode(), usedforsecurity=False).hexdigest()[:10]
+
+
+class QueryRecorder:
+    """Context manager collecting statistics for queries run inside it."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def repeated(self, threshold=1):
+        """Fingerprints executed more than `threshold` times, most first."""
+        return [(sql, n) for sql, n in self.fingerprints.most_common() if n > threshold]
+
+    def as_dict(self, threshold=1):
+        return {
+            "queries": self.count,
+            "sql_ms": round(self.duration * 1000, 2),
+            "repeated": {
+                short_hash(sql): {"count": n, "sql": sql[:200]}
+                for sql, n in self.repeated(threshold)
+            },
+        }
@@ -0,0 +1,130 @@
+"""Canonical querysets for the app's hot paths.
+
+These are the queries the admin changelists, the team-scoped views and plan
+tree loads actually run. Tooling such as the index advisor builds them from
+here so they stay in step with the real code paths instead of drifting into
+hand-written copies.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, time
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.test import RequestFactory
+
+import core.models as models
+
+
+@dataclass
+class CanonicalQuery:
+    label: str
+    queryset: QuerySet
+    # Tables this query is expected to scan in full (e.g. an unfiltered
+    # changelist page), and whether a temporary sort is acceptable.
+    allowed_scans: set = field(default_factory=set)
+    allow_temp_btree: bool = False
+
+
+def make_request(path="/", superuser=True):
+    """Build a GET request for an unsaved user.
+
+    The user has a placeholder primary key so relation lookups such as
+    ``user.team_memberships`` produce real SQL without touching the users
+    table.
+    """
+    request = RequestFactory().get(path)
+    request.user = get_user_model()(
+        pk=0, is_active=True, is_staff=True, is_superuser=superuser
+    )
+    return request
+
+
+def changelist_queries(site=admin.site):
+    """Yield the page and date-hierarchy queries of every core changelist."""
+    for model, model_admin in site._registry.items():
+        if model._meta.app_label != "core":
+            continue
+        request = make_request(f"/admin/core/{model._meta.model_name}/")
+        changelist = model_admin.get_changelist_instance(request)
+        table = model._meta.db_table
+        label = f"admin:{type(model_admin).__name__}"
+        yield CanonicalQuery(label, changelist.result_list, allowed_scans={table})
+        if model_admin.date_hierarchy:
+            yield CanonicalQuery(
+                f"{label}:date_hierarchy",
+                changelist.queryset.dates(model_admin.date_hierarchy, "year"),
+                allowed_scans={table},
+                allow_temp_btree=True,
+            )
+
+
+def team_filtered_queries(site=admin.site):
+    """Yield get_team_filtered_queryset() for each team-owned admin."""
+    from frontend.views import TeamOwnershipMixin
+
+    request = make_request(superuser=False)
+    for model, model_admin in site._registry.items():
+        if not issubclass(model, models.TeamOwnedMixin):
+            continue
+        scoped_admin = type(
+            f"TeamScoped{type(model_admin).__name__}",
+            (TeamOwnershipMixin, type(model_admin)),
+            {},
+        )(model, site)
+        yield CanonicalQuery(
+            f"team_filtered:{model.__name__}",
+            scoped_admin.get_team_filtered_queryset(request),
+        )
+
+
+def library_queries(team_id=1):
+    """Yield the team library listings, ordered the way they are browsed."""
+    for model in (models.Venue, models.Location, models.Activity, models.Equipment):
+        yield CanonicalQuery(
+            f"library:{model.__name__}",
+            model.objects.filter(owner_team_id=team_id).order_by("name"),
+        )
+
+
+def plan_queries(team_id=1, venue_id=1, plan_ids=(1,), section_ids=(1,)):
+    """Yield team plan listings, venue schedules and plan tree loads."""
+    yield CanonicalQuery(
+        "plans:team_by_date",
+        models.Plan.objects.filter(owner_team_id=team_id).order_by("-session_date"),
+    )
+    yield CanonicalQuery(
+        "plans:venue_schedule",
+        models.Plan.objects.filter(
+            venue_id=venue_id, session_date=date(2025, 1, 1)
+        ).order_by("session_time"),
+    )
+    yield CanonicalQuery(
+        "plans:venue_slot",
+        models.Plan.objects.filter(
+            venue_id=venue_id, session_date=date(2025, 1, 1), session_time=time(10)
+        ),
+    )
+    # The three levels issued by prefetch_related("sections__items")
+    yield CanonicalQuery(
+        "plan_tree:plan",
+        models.Plan.objects.filter(pk__in=plan_ids).select_related("venue"),
+    )
+    yield CanonicalQuery(
+        "plan_tree:sections",
+        models.PlanSection.objects.filter(plan_id__in=plan_ids),
+    )
+    yield CanonicalQuery(
+        "plan_tree:items",
+        models.PlanSectionItem.objects.filter(section_id__in=section_ids)
+        .select_related("location__venue", "activity")
+        .order_by("section_id", "order"),
+    )
+
+
+def get_canonical_queries():
+    yield from changelist_queries()
+    yield from team_filtered_queries()
+    yield from library_queries()
+    yield from plan_queries()
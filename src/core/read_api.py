@@ -0,0 +1,303 @@
+"""Read API over plans and the team library, with keyset pagination.
+
+Each resource lists one model in a fixed order that ends in the primary key,
+``(session_date, id)`` for plans and ``(name, id)`` for the rest. A page ends
+with an opaque cursor holding the last row's sort key, and the next page
+starts strictly after it. So fetching page N is one index range scan, the
+same as page 1, where an OFFSET would have to walk all the rows before it.
+
+Rows are scoped to the teams the user belongs to. With up to
+``MERGE_TEAMS`` teams, each team's page is read separately through its
+``(owner_team, ...)`` index and the pages are merged, so every query stays
+an ordered index scan that stops after one page. With more teams (e.g. a
+superuser), it falls back to one ``owner_team IN (...)`` query.
+
+``?fields=`` picks which columns come back; only those (plus the sort key)
+are loaded, with ``only()``. ``?expand=`` nests related rows: a plan's
+sections with their items, locations, activities and equipment, or an
+activity's equipment. Those are loaded through a core.dataloader, one query
+per relation for the whole page.
+"""
+
+import base64
+import binascii
+import heapq
+import json
+from datetime import date
+from itertools import islice
+
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from core import models
+from core.dataloader import DataLoader
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MERGE_TEAMS = 20
+
+
+class ApiError(Exception):
+    """The request's parameters are invalid; answered with a 400."""
+
+
+class Resource:
+    def __init__(self, model, order, date_field=None, expansions=None):
+        self.model = model
+        self.order = order
+        self.date_field = date_field
+        self.expansions = expansions or {}
+        self.fields = [field.attname for field in model._meta.concrete_fields]
+
+    def sort_key(self, obj):
+        return tuple(getattr(obj, name) for name in self.order)
+
+
+# Expansions: each takes a page of rows and a DataLoader and returns the
+# nested data as ``{row pk: value}``
+
+
+def expand_equipment(activities, loader):
+    """Each activity's equipment, with the quantity it needs."""
+    links = loader.children(activities, models.ActivityEquipment, "activity")
+    loader.related([link for group in links.values() for link in group], "equipment")
+    fields = RESOURCES["equipment"].fields
+    return {
+        pk: [
+            {
+                **serialize(link.equipment, fields),
+                "quantity_needed": link.quantity_needed,
+            }
+            for link in group
+        ]
+        for pk, group in links.items()
+    }
+
+
+def expand_sections(plans, loader):
+    """Each plan's sections and items, with their locations and activities."""
+    sections = loader.children(plans, models.PlanSection, "plan")
+    items = loader.children(
+        [section for group in sections.values() for section in group],
+        models.PlanSectionItem,
+        "section",
+    )
+    flat_items = [item for group in items.values() for item in group]
+    loader.related(flat_items, "location")
+    activities = loader.related(flat_items, "activity")
+    equipment = expand_equipment(list(activities.values()), loader)
+
+    def item_data(item):
+        data = serialize(item, SECTION_ITEM_FIELDS)
+        data["location"] = item.location and serialize(
+            item.location, RESOURCES["locations"].fields
+        )
+        data["activity"] = item.activity and {
+            **serialize(item.activity, RESOURCES["activities"].fields),
+            "equipment": equipment[item.activity_id],
+        }
+        return data
+
+    return {
+        pk: [
+            {
+                **serialize(section, SECTION_FIELDS),
+                "items": [item_data(item) for item in items[section.pk]],
+            }
+            for section in group
+        ]
+        for pk, group in sections.items()
+    }
+
+
+SECTION_FIELDS = ("id", "name", "order")
+SECTION_ITEM_FIELDS = ("id", "order", "item_type", "notes", "duration_minutes")
+
+RESOURCES = {
+    "plans": Resource(
+        models.Plan,
+        ("session_date", "id"),
+        date_field="session_date",
+        expansions={"sections": expand_sections},
+    ),
+    "activities": Resource(
+        models.Activity, ("name", "id"), expansions={"equipment": expand_equipment}
+    ),
+    "locations": Resource(models.Location, ("name", "id")),
+    "venues": Resource(models.Venue, ("name", "id")),
+    "equipment": Resource(models.Equipment, ("name", "id")),
+}
+
+
+def visible_teams(user):
+    """Ids of the teams whose rows `user` may read."""
+    if user.is_superuser:
+        return list(models.Team.objects.values_list("pk", flat=True))
+    return list(
+        models.TeamMembership.objects.filter(user=user).values_list(
+            "team_id", flat=True
+        )
+    )
+
+
+def select_teams(user, value):
+    """`user`'s visible teams, or just team `value` if one was asked for."""
+    team_ids = visible_teams(user)
+    if not value:
+        return team_ids
+    try:
+        team_id = int(value)
+    except ValueError:
+        raise ApiError("team must be a team id")
+    if team_id not in team_ids:
+        raise PermissionDenied("You are not a member of that team")
+    return [team_id]
+
+
+def parse_fields(resource, value):
+    if not value:
+        return resource.fields
+    fields = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in resource.fields]
+    if unknown:
+        raise ApiError(
+            f"Unknown fields {', '.join(unknown)}; "
+            f"choose from {', '.join(resource.fields)}"
+        )
+    return ["id", *(name for name in fields if name != "id")]
+
+
+def parse_expand(resource, value):
+    names = [name.strip() for name in (value or "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in resource.expansions]
+    if unknown and not resource.expansions:
+        raise ApiError("Nothing can be expanded here")
+    if unknown:
+        raise ApiError(
+            f"Cannot expand {', '.join(unknown)}; "
+            f"choose from {', '.join(resource.expansions)}"
+        )
+    return names
+
+
+def parse_limit(value):
+    if not value:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ApiError("limit must be a number")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ApiError(f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(f"{name} must be a date (YYYY-MM-DD)")
+
+
+def parse_filters(resource, params):
+    """Filters from the query string: ``from``/``to`` dates for plans."""
+    filters = Q()
+    if resource.date_field:
+        for param, lookup in (("from", "gte"), ("to", "lte")):
+            if params.get(param):
+                value = parse_date(params[param], param)
+                filters &= Q(**{f"{resource.date_field}__{lookup}": value})
+    return filters
+
+
+def encode_cursor(resource, obj):
+    text = json.dumps(
+        list(resource.sort_key(obj)), cls=DjangoJSONEncoder, separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+def decode_cursor(resource, value):
+    """The sort key in `value` as model values; raises ApiError if it's bad."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)))
+        if not isinstance(key, list) or len(key) != len(resource.order):
+            raise ValueError
+        return [
+            resource.model._meta.get_field(name).to_python(part)
+            for name, part in zip(resource.order, key)
+        ]
+    except (ValueError, TypeError, binascii.Error, ValidationError):
+        raise ApiError("Invalid cursor")
+
+
+def after(order, key):
+    """Rows strictly after `key` in `order`.
+
+    Written as ``a >= x AND (a > x OR id > y)`` rather than a plain OR, so
+    the first condition bounds the index range scan.
+    """
+    (first, *rest), (value, *rest_values) = order, key
+    if not rest:
+        return Q(**{f"{first}__gt": value})
+    return Q(**{f"{first}__gte": value}) & (
+        Q(**{f"{first}__gt": value}) | after(rest, rest_values)
+    )
+
+
+def fetch_page(
+    resource, team_ids, fields, cursor=None, limit=DEFAULT_LIMIT, filters=Q()
+):
+    """``(rows, next cursor or None)`` for one page of `resource`."""
+    queryset = (
+        resource.model.objects.filter(filters)
+        .only(*{*fields, *resource.order})
+        .order_by(*resource.order)
+    )
+    if cursor is not None:
+        queryset = queryset.filter(
+            after(resource.order, decode_cursor(resource, cursor))
+        )
+
+    if len(team_ids) <= MERGE_TEAMS:
+        pages = [
+            list(queryset.filter(owner_team_id=team_id)[: limit + 1])
+            for team_id in team_ids
+        ]
+        rows = list(islice(heapq.merge(*pages, key=resource.sort_key), limit + 1))
+    else:
+        rows = list(queryset.filter(owner_team_id__in=team_ids)[: limit + 1])
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(resource, rows[-1])
+    return rows, None
+
+
+def export_queryset(resource, team_ids, filters=Q()):
+    """Every row of `resource` in the teams, by team and then primary key.
+
+    That is the order of the ``owner_team`` index, so rows stream out as the
+    index is read; the resource's own order would need them all sorted
+    before the first one could be sent.
+    """
+    return (
+        resource.model.objects.filter(owner_team_id__in=team_ids)
+        .filter(filters)
+        .order_by("owner_team_id", "pk")
+    )
+
+
+def serialize(obj, fields):
+    return {name: getattr(obj, name) for name in fields}
+
+
+def serialize_page(resource, rows, fields, expand=(), loader=None):
+    """JSON-ready dicts for `rows`, with the expansions named in `expand`."""
+    results = [serialize(obj, fields) for obj in rows]
+    for name in expand:
+        nested = resource.expansions[name](rows, loader or DataLoader())
+        for obj, result in zip(rows, results):
+            result[name] = nested[obj.pk]
+    return results
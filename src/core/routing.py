@@ -0,0 +1,68 @@
+"""Read/write splitting across the primary database and its read replicas.
+
+Writes always go to ``default``. Reads go to a replica only when it has been
+asked for explicitly: for the duration of a safe-method request (see
+core.middleware.ReplicaRoutingMiddleware), inside ``use_replica()``, or for
+a queryset passed through ``read_only()``. Everything else keeps reading
+from the primary, so code that does not opt in behaves exactly as before.
+
+Replicas are the aliases listed in ``settings.REPLICA_DATABASES``. With none
+configured every helper here falls back to ``default``.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = "default"
+
+_reads_from_replica = ContextVar("reads_from_replica", default=False)
+
+
+def get_replica_aliases():
+    return list(getattr(settings, "REPLICA_DATABASES", []))
+
+
+def choose_replica():
+    """Pick a replica alias for a read, or the primary if there are none."""
+    replicas = get_replica_aliases()
+    return random.choice(replicas) if replicas else PRIMARY
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """Route ORM reads made inside the block to a replica (or not)."""
+    token = _reads_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _reads_from_replica.reset(token)
+
+
+def read_only(queryset):
+    """Return `queryset` bound to a replica, for reads that tolerate lag."""
+    return queryset.using(choose_replica())
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _reads_from_replica.get():
+            return choose_replica()
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so objects loaded from any of
+        # them may be related to each other.
+        databases = {PRIMARY, *get_replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema along with the data from the primary.
+        return db == PRIMARY
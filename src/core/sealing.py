@@ -0,0 +1,166 @@
+"""Sealed querysets: make unprefetched relation access loud.
+
+A queryset marked with ``.seal()`` tags every instance it loads (including
+the ones pulled in by ``select_related``/``prefetch_related``). Touching a
+relation on a tagged instance that was not loaded up front — ``plan.venue``
+without ``select_related("venue")``, ``activity.equipment_items.all()``
+without ``prefetch_related`` — then warns or raises instead of silently
+issuing one query per row.
+
+Controlled by two settings:
+
+``QUERYSET_SEALING``
+    ``"off"`` (default), ``"warn"`` or ``"raise"``. When off, ``.seal()`` is
+    a no-op and the relation descriptors are left untouched, so there is no
+    cost at all.
+``SEAL_ALL_QUERYSETS``
+    Also seal every multi-row queryset of the core models, not just the ones
+    that ask. Single-row results (``.get()``, ``.first()``) are left alone:
+    following a relation from one object is one query, not N+1.
+
+Only querysets that are fully evaluated are sealed; ``.iterator()`` is not.
+"""
+
+import warnings
+
+from django.conf import settings
+from django.db import models
+from django.db.models.fields.related_descriptors import (
+    ForwardManyToOneDescriptor,
+    ReverseManyToOneDescriptor,
+)
+from django.utils.functional import cached_property
+
+
+class UnsealedAccessError(Exception):
+    """A sealed instance lazily loaded a relation."""
+
+
+class UnsealedAccessWarning(RuntimeWarning):
+    pass
+
+
+def sealing_mode():
+    return getattr(settings, "QUERYSET_SEALING", "off")
+
+
+def is_sealed(instance):
+    return getattr(instance._state, "sealed", False)
+
+
+def report_lazy_load(instance, name):
+    message = (
+        f"{type(instance).__name__}.{name} was accessed on a sealed instance "
+        f"but not loaded with select_related()/prefetch_related()"
+    )
+    if sealing_mode() == "raise":
+        raise UnsealedAccessError(message)
+    warnings.warn(message, UnsealedAccessWarning, stacklevel=4)
+
+
+def seal_instances(objs, seen=None):
+    """Mark instances, and everything already loaded onto them, as sealed."""
+    seen = set() if seen is None else seen
+    for obj in objs:
+        if not isinstance(obj, models.Model) or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        obj._state.sealed = True
+        seal_instances(obj._state.fields_cache.values(), seen)
+        for prefetched in getattr(obj, "_prefetched_objects_cache", {}).values():
+            seal_instances(prefetched, seen)
+
+
+class SealableQuerySet(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sealed = False
+
+    def seal(self):
+        clone = self._chain()
+        clone._sealed = sealing_mode() != "off"
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._sealed = self._sealed
+        return clone
+
+    def _fetch_all(self):
+        already_fetched = self._result_cache is not None
+        super()._fetch_all()
+        if already_fetched:
+            return
+        if self._sealed or (len(self._result_cache) > 1 and _seal_all()):
+            seal_instances(self._result_cache)
+
+
+def _seal_all():
+    return getattr(settings, "SEAL_ALL_QUERYSETS", False) and sealing_mode() != "off"
+
+
+SealableManager = models.Manager.from_queryset(SealableQuerySet)
+
+
+# Descriptor variants that check the seal before issuing a query.
+
+
+class SealedForwardDescriptorMixin:
+    def get_object(self, instance):
+        # Only reached on a cache miss, i.e. the related row was not loaded
+        if is_sealed(instance):
+            report_lazy_load(instance, self.field.name)
+        return super().get_object(instance)
+
+
+class SealedRelatedManagerDescriptorMixin:
+    sealed_name = None
+
+    @cached_property
+    def related_manager_cls(self):
+        name = self.sealed_name
+
+        class SealedRelatedManager(super().related_manager_cls):
+            def get_queryset(self):
+                queryset = super().get_queryset()
+                prefetched = getattr(self.instance, "_prefetched_objects_cache", {})
+                if is_sealed(self.instance) and not any(
+                    queryset is cached for cached in prefetched.values()
+                ):
+                    report_lazy_load(self.instance, name)
+                return queryset
+
+        return SealedRelatedManager
+
+
+_sealed_classes = {}
+
+
+def _sealed_class(descriptor):
+    cls = type(descriptor)
+    if cls not in _sealed_classes:
+        if isinstance(descriptor, ForwardManyToOneDescriptor):
+            mixin = SealedForwardDescriptorMixin
+        else:
+            mixin = SealedRelatedManagerDescriptorMixin
+        _sealed_classes[cls] = type(f"Sealed{cls.__name__}", (mixin, cls), {})
+    return _sealed_classes[cls]
+
+
+def install(app_label="core"):
+    """Swap the relation descriptors of an app's models for sealed ones."""
+    from django.apps import apps
+
+    for model in apps.get_app_config(app_label).get_models():
+        for name, attr in list(vars(model).items()):
+            if not isinstance(
+                attr, (ForwardManyToOneDescriptor, ReverseManyToOneDescriptor)
+            ) or isinstance(
+                attr,
+                (SealedForwardDescriptorMixin, SealedRelatedManagerDescriptorMixin),
+            ):
+                continue
+            # Drop a manager class built before the swap
+            attr.__dict__.pop("related_manager_cls", None)
+            attr.__class__ = _sealed_class(attr)
+            attr.sealed_name = name
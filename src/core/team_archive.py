@@ -0,0 +1,335 @@
+"""Zip archives of a whole team library, for moving it between instances.
+
+An archive holds::
+
+    manifest.json            format version, team, row and image counts
+    data/<model>.jsonl       one JSON object per row, with its original ids
+    media/<stored name>      every LocationImage/ActivityImage file
+
+``iter_archive`` produces the zip as a stream of byte chunks while reading
+the database a batch at a time, so a response can send it without building
+it in memory or in a temporary file. ``import_archive`` reads entries one at
+a time, saves the images from a thread pool while the rows are inserted with
+``bulk_create``, and remaps every foreign key from the archive's ids to the
+new ones. Rows whose required foreign key points outside the archive (e.g.
+another team's activity) are skipped and counted. Only media entries that an
+image row names, under its field's ``upload_to`` directory, are accepted;
+any other file makes the archive invalid.
+"""
+
+import json
+import posixpath
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models as db_models
+from django.db import transaction
+
+from core import choice_cache, models, plan_calendar, team_cache
+
+FORMAT_VERSION = 1
+
+# Parents before children, so foreign keys can be remapped as rows go in
+ARCHIVE_MODELS = [
+    models.Venue,
+    models.Location,
+    models.LocationImage,
+    models.Equipment,
+    models.Activity,
+    models.ActivityImage,
+    models.ActivityEquipment,
+    models.Plan,
+    models.PlanSection,
+    models.PlanSectionItem,
+]
+
+# How each model reaches its team, for the ones that don't own it directly
+TEAM_LOOKUPS = {
+    models.PlanSection: "plan__owner_team",
+    models.PlanSectionItem: "section__plan__owner_team",
+}
+
+
+class ArchiveError(Exception):
+    """The archive can't be imported; nothing has been written."""
+
+
+def entry_name(model):
+    return f"data/{model._meta.model_name}.jsonl"
+
+
+def file_fields(model):
+    return [
+        f for f in model._meta.concrete_fields if isinstance(f, db_models.FileField)
+    ]
+
+
+def iter_rows(model, team, batch_size):
+    """Yield batches of the team's rows as dicts of column values."""
+    queryset = model.objects.filter(
+        **{TEAM_LOOKUPS.get(model, "owner_team"): team}
+    ).order_by("pk")
+    attnames = [field.attname for field in model._meta.concrete_fields]
+    last = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last).values(*attnames)[:batch_size])
+        if not batch:
+            return
+        last = batch[-1]["id"]
+        yield batch
+
+
+class _ZipStream:
+    """Write-only, unseekable file object collecting what zipfile writes.
+
+    zipfile falls back to data descriptors for unseekable output, so each
+    entry can be written once, front to back, and handed on straight away.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_archive(team, batch_size=1000, storage=default_storage):
+    """Yield the team's archive as a stream of zip byte chunks."""
+    stream = _ZipStream()
+    counts = {}
+    images = set()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for model in ARCHIVE_MODELS:
+            uploads = [field.attname for field in file_fields(model)]
+            count = 0
+            with archive.open(entry_name(model), "w", force_zip64=True) as entry:
+                for batch in iter_rows(model, team, batch_size):
+                    for row in batch:
+                        entry.write(json.dumps(row, cls=DjangoJSONEncoder).encode())
+                        entry.write(b"\n")
+                        images.update(row[name] for name in uploads if row[name])
+                    count += len(batch)
+                    yield stream.take()
+            counts[model._meta.model_name] = count
+
+        missing = []
+        for name in sorted(images):
+            try:
+                source = storage.open(name, "rb")
+            except FileNotFoundError:
+                missing.append(name)
+                continue
+            # Images are already compressed; deflating them again wastes time
+            info = zipfile.ZipInfo(f"media/{name}", time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = storage.size(name)
+            with source, archive.open(info, "w") as entry:
+                for chunk in source.chunks():
+                    entry.write(chunk)
+                    yield stream.take()
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "team": {"name": team.name, "description": team.description},
+            "counts": counts,
+            "images": len(images) - len(missing),
+            "missing_images": missing,
+        }
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    yield stream.take()
+
+
+def iter_archive_rows(archive, model, batch_size):
+    with archive.open(entry_name(model)) as entry:
+        batch = []
+        for line in entry:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _store_image(archive, member, storage):
+    info = archive.getinfo(member)
+    name = member.removeprefix("media/")
+    with archive.open(info) as source:
+        content = File(source, name=name)
+        content.size = info.file_size
+        return name, storage.save(name, content)
+
+
+class ArchiveImporter:
+    def __init__(self, archive, batch_size=1000, workers=8, storage=default_storage):
+        self.archive = archive
+        self.batch_size = batch_size
+        self.workers = workers
+        self.storage = storage
+        self.ids = {model: {} for model in ARCHIVE_MODELS}
+        self.files = {}
+        self.counts = {}
+        self.skipped = {}
+
+        try:
+            self.manifest = json.loads(archive.read("manifest.json"))
+        except (KeyError, ValueError) as exc:
+            raise ArchiveError("Not a team archive: no readable manifest") from exc
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ArchiveError(
+                f"Unsupported archive format {self.manifest.get('format')!r}"
+            )
+
+    def check(self, team):
+        if team is None:
+            name = self.manifest["team"]["name"]
+            if models.Team.objects.filter(name=name).exists():
+                raise ArchiveError(f"A team called {name!r} already exists")
+        elif any(
+            model.objects.filter(owner_team=team).exists()
+            for model in ARCHIVE_MODELS
+            if model not in TEAM_LOOKUPS
+        ):
+            raise ArchiveError(
+                f"{team} already has a library; import into an empty team"
+            )
+
+        # Venue names are unique across all teams
+        names = [
+            row["name"]
+            for batch in iter_archive_rows(self.archive, models.Venue, self.batch_size)
+            for row in batch
+        ]
+        clashes = list(
+            models.Venue.objects.filter(name__in=names).values_list("name", flat=True)
+        )
+        if clashes:
+            raise ArchiveError(f"Venue names already in use: {', '.join(clashes)}")
+
+    def media_members(self):
+        """The archive's media entries, each checked against the image rows."""
+        referenced = {}
+        for model in ARCHIVE_MODELS:
+            fields = file_fields(model)
+            if not fields:
+                continue
+            for batch in iter_archive_rows(self.archive, model, self.batch_size):
+                for row in batch:
+                    for field in fields:
+                        if row.get(field.attname):
+                            referenced[row[field.attname]] = field
+        members = []
+        for member in self.archive.namelist():
+            if not member.startswith("media/") or member.endswith("/"):
+                continue
+            name = member.removeprefix("media/")
+            field = referenced.get(name)
+            # Stored as-is, so it must be a plain relative path in the
+            # field's own directory
+            if (
+                field is None
+                or posixpath.normpath(name) != name
+                or not name.startswith(field.upload_to)
+            ):
+                raise ArchiveError(f"Unexpected file in the archive: {member}")
+            members.append(member)
+        return members
+
+    def run(self, team=None):
+        """Import into `team`, or a new team named in the manifest. Returns it."""
+        self.check(team)
+        members = self.media_members()
+        saved = []
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = [
+                pool.submit(_store_image, self.archive, member, self.storage)
+                for member in members
+            ]
+            try:
+                with transaction.atomic():
+                    if team is None:
+                        team = models.Team.objects.create(**self.manifest["team"])
+                    for model in ARCHIVE_MODELS:
+                        if file_fields(model) and len(self.files) < len(futures):
+                            # Rows pointing at images wait for the pool
+                            for future in futures:
+                                old, new = future.result()
+                                saved.append(new)
+                                self.files[old] = new
+                        self.insert(model, team)
+                    plan_calendar.rebuild([team.pk])
+                    team_cache.bump(team.pk)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                for future in futures:
+                    if not future.cancelled() and future.exception() is None:
+                        saved.append(future.result()[1])
+                for name in set(saved):
+                    self.storage.delete(name)
+                raise
+        return team
+
+    def insert(self, model, team):
+        fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+        name = model._meta.model_name
+        self.counts[name] = self.skipped[name] = 0
+        for batch in iter_archive_rows(self.archive, model, self.batch_size):
+            objs, old_ids = [], []
+            for row in batch:
+                values = self.remap(fields, row, team)
+                if values is None:
+                    self.skipped[name] += 1
+                    continue
+                objs.append(model(**values))
+                old_ids.append(row["id"])
+            created = model.objects.bulk_create(objs)
+            if created and created[0].pk is None:
+                raise ArchiveError("The database must return ids from bulk_create")
+            self.ids[model].update(zip(old_ids, (obj.pk for obj in created)))
+            self.counts[name] += len(created)
+        if model in choice_cache.MODELS:
+            choice_cache.bump(model)
+
+    def remap(self, fields, row, team):
+        values = {}
+        for field in fields:
+            value = row.get(field.attname)
+            if field.name == "owner_team":
+                value = team.pk
+            elif field.is_relation:
+                if value is not None:
+                    value = self.ids[field.related_model].get(value)
+                    if value is None and not field.null:
+                        return None
+            elif isinstance(field, db_models.FileField):
+                value = self.files.get(value, value)
+            elif value is not None:
+                value = field.to_python(value)
+            values[field.attname] = value
+        return values
+
+
+def import_archive(file, team=None, **kwargs):
+    """Import the archive in `file` (a path or seekable binary file)."""
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile as exc:
+        raise ArchiveError("Not a zip file") from exc
+    with archive:
+        importer = ArchiveImporter(archive, **kwargs)
+        importer.team = importer.run(team)
+    return importer
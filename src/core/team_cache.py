@@ -0,0 +1,259 @@
+"""Per-team versioned cache for read views and fragments.
+
+Each team has a version token in the cache. Once a transaction commits, the
+token of every team whose data it touched is replaced. That covers any
+TeamOwnedMixin model, the team and its memberships, and plan sections and
+items. Cached values are stored under keys that include the token, so one
+write to the cache invalidates everything the team had cached: no stale key
+ever has to be found or deleted, and the unreachable entries just expire.
+
+The token is a fresh ``time.time_ns()`` rather than an incremented counter,
+because backends such as the file-based cache don't increment atomically
+and two workers bumping a counter together could both land on one number.
+
+Values are built with reads on the primary, so a lagging replica can't put
+old data under a new version. Bulk writes send no signals; code using them
+calls ``bump``.
+
+Hits and misses are counted per name in each process and added to shared
+counters in the cache every ``STATS_FLUSH_EVERY`` lookups, so ``stats()``
+(and ``manage.py team_cache``) see every worker. The numbers are approximate
+for the reason above: on a backend without an atomic ``incr``, such as the
+file-based cache, two workers flushing together can lose counts. They are
+good for a hit rate, not for exact totals.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse
+
+from core import commit_batch, models
+from core.routing import use_replica
+
+STATS_FLUSH_EVERY = 100
+STATS_NAMES_KEY = "team_cache:stats"
+
+_MISSING = object()
+_stats_lock = threading.Lock()
+_local_stats = {}
+
+
+def get_cache():
+    return caches[settings.TEAM_CACHE]
+
+
+def version_key(team_id):
+    return f"team:{team_id}:version"
+
+
+def get_version(team_id):
+    cache = get_cache()
+    version = cache.get(version_key(team_id))
+    if version is None:
+        # First use, or evicted: any new token will do
+        cache.add(version_key(team_id), time.time_ns(), None)
+        version = cache.get(version_key(team_id))
+    return version
+
+
+def make_key(team_id, name, *parts):
+    digest = hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest()
+    return f"team:{team_id}:{get_version(team_id)}:{name}:{digest}"
+
+
+def get_or_set(team_id, name, parts, build, timeout=None):
+    """The cached value of ``build()`` for the team's current version.
+
+    `name` groups the entries for the stats; `parts` are whatever else the
+    value depends on (e.g. the query string).
+    """
+    key = make_key(team_id, name, *parts)
+    cache = get_cache()
+    value = cache.get(key, _MISSING)
+    count(name, hit=value is not _MISSING)
+    if value is _MISSING:
+        with use_replica(False):
+            value = build()
+        cache.set(key, value, timeout or settings.TEAM_CACHE_TIMEOUT)
+    return value
+
+
+def cached_response(request, team_id, name, build, *parts, timeout=None):
+    """The response from ``build()``, cached per team version and full path.
+
+    Only complete 200 responses are cached, and only their content type and
+    body, so the caller has to have checked permissions already and the
+    response must not depend on who asked. Anything else it depends on goes
+    in `parts`. ``X-Cache`` says whether it was a hit.
+    """
+    if team_id is None:
+        return build()
+    key = make_key(team_id, name, request.get_full_path(), *parts)
+    cache = get_cache()
+    cached = cache.get(key)
+    count(name, hit=cached is not None)
+    if cached is not None:
+        content_type, content = cached
+        response = HttpResponse(content, content_type=content_type)
+        response["X-Cache"] = "HIT"
+        return response
+
+    with use_replica(False):
+        response = build()
+    if response.status_code == 200 and not response.streaming:
+        cache.set(
+            key,
+            (response["Content-Type"], response.content),
+            timeout or settings.TEAM_CACHE_TIMEOUT,
+        )
+    response["X-Cache"] = "MISS"
+    return response
+
+
+# Invalidation
+
+
+def bump_now(team_ids):
+    """Replace the teams' version tokens, invalidating all they have cached."""
+    token = time.time_ns()
+    get_cache().set_many({version_key(team_id): token for team_id in team_ids}, None)
+
+
+def flush(using, teams=(), plans=(), sections=()):
+    teams, plans = set(teams), set(plans)
+    with use_replica(False):
+        if sections:
+            plans.update(
+                models.PlanSection.objects.filter(pk__in=sections).values_list(
+                    "plan_id", flat=True
+                )
+            )
+        if plans:
+            teams.update(
+                models.Plan.objects.filter(pk__in=plans).values_list(
+                    "owner_team_id", flat=True
+                )
+            )
+    teams.discard(None)
+    bump_now(teams)
+
+
+def bump(team_id, using=DEFAULT_DB_ALIAS):
+    """Invalidate the team's cache when the current transaction commits."""
+    _note(using, teams=[team_id])
+
+
+def _note(using, **changed):
+    # After the commit, or a reader could cache the old data under the new
+    # token
+    commit_batch.add(flush, using, **changed)
+
+
+def _row_changed(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    if sender is models.Team:
+        _note(using, teams=[instance.pk])
+    elif sender is models.TeamMembership:
+        _note(using, teams=[instance.team_id])
+    elif sender is models.PlanSection:
+        _note(using, plans=[instance.plan_id])
+    elif sender is models.PlanSectionItem:
+        _note(using, sections=[instance.section_id])
+    else:
+        _note(using, teams=[instance.owner_team_id])
+
+
+def watched_models():
+    owned = [
+        model
+        for model in models.TeamOwnedMixin.__subclasses__()
+        if not model._meta.abstract
+    ]
+    return [
+        models.Team,
+        models.TeamMembership,
+        *owned,
+        models.PlanSection,
+        models.PlanSectionItem,
+    ]
+
+
+def connect():
+    """Start invalidating on saves and deletes (done in CoreConfig.ready)."""
+    for model in watched_models():
+        post_save.connect(_row_changed, sender=model, dispatch_uid="team_cache")
+        post_delete.connect(_row_changed, sender=model, dispatch_uid="team_cache")
+
+
+# Stats
+
+
+def count(name, hit):
+    with _stats_lock:
+        counts = _local_stats.setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+        due = sum(sum(pair) for pair in _local_stats.values()) >= STATS_FLUSH_EVERY
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """Add this process's counts to the shared ones in the cache."""
+    with _stats_lock:
+        local = dict(_local_stats)
+        _local_stats.clear()
+    if not local:
+        return
+    cache = get_cache()
+    names = cache.get(STATS_NAMES_KEY, set())
+    if not names >= local.keys():
+        cache.set(STATS_NAMES_KEY, names | local.keys(), None)
+    for name, (hits, misses) in local.items():
+        for kind, value in (("hits", hits), ("misses", misses)):
+            if value:
+                key = f"{STATS_NAMES_KEY}:{name}:{kind}"
+                cache.add(key, 0, None)
+                cache.incr(key, value)
+
+
+def stats():
+    """``{name: {"hits", "misses", "hit_rate"}}`` across all processes.
+
+    Approximate: concurrent flushes can lose counts (see the module docstring).
+    """
+    flush_stats()
+    cache = get_cache()
+    result = {}
+    for name in sorted(cache.get(STATS_NAMES_KEY, set())):
+        hits = cache.get(f"{STATS_NAMES_KEY}:{name}:hits", 0)
+        misses = cache.get(f"{STATS_NAMES_KEY}:{name}:misses", 0)
+        total = hits + misses
+        result[name] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else None,
+        }
+    return result
+
+
+def reset_stats():
+    with _stats_lock:
+        _local_stats.clear()
+    cache = get_cache()
+    names = cache.get(STATS_NAMES_KEY, set())
+    cache.delete_many(
+        [STATS_NAMES_KEY]
+        + [
+            f"{STATS_NAMES_KEY}:{name}:{kind}"
+            for name in names
+            for kind in ("hits", "misses")
+        ]
+    )
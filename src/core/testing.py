@@ -0,0 +1,49 @@
+"""Test helpers for keeping views inside their query budget."""
+
+from contextlib import ContextDecorator
+
+from core.query_budget import QueryRecorder, short_hash
+
+
+class query_budget(ContextDecorator):
+    """Fail if the wrapped code runs too many queries or repeats one.
+
+    Use as a decorator on a test method or as a context manager around a
+    client call::
+
+        @query_budget(6, max_repeats=1)
+        def test_plan_list(self):
+            self.client.get("/plans/")
+
+    ``max_queries`` caps the total; ``max_repeats`` caps how many times any
+    single statement fingerprint may run, which catches N+1 patterns even
+    when the total still happens to fit.
+    """
+
+    def __init__(self, max_queries=None, max_repeats=None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+    def __enter__(self):
+        self.recorder = QueryRecorder().__enter__()
+        return self.recorder
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.__exit__(exc_type, exc, tb)
+        if exc_type is not None:
+            return False
+
+        problems = []
+        if self.max_queries is not None and self.recorder.count > self.max_queries:
+            problems.append(
+                f"{self.recorder.count} queries run, budget is {self.max_queries}"
+            )
+        if self.max_repeats is not None:
+            for sql, count in self.recorder.repeated(self.max_repeats):
+                problems.append(
+                    f"statement {short_hash(sql)} ran {count} times "
+                    f"(limit {self.max_repeats}): {sql}"
+                )
+        if problems:
+            raise AssertionError("Query budget exceeded:\n  " + "\n  ".join(problems))
+        return False
@@ -1,3 +1,1158 @@
-# from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+from contextlib import ExitStack
+from datetime import date, time, timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import (
+    choice_cache,
+    data_migrations,
+    library_io,
+    loadgen,
+    models,
+    plan_archive,
+    plan_calendar,
+    plan_editor,
+    plan_versions,
+    profiling,
+    query_catalog,
+    sealing,
+    team_archive,
+    team_cache,
+    tree_stamps,
+)
+from core.management.commands import bench_flowforge, gc_media, index_advisor
+from core.middleware import (
+    ProfilingMiddleware,
+    QueryBudgetMiddleware,
+    ReplicaRoutingMiddleware,
+)
+from core.routing import ReplicaRouter
+from core.testing import query_budget
+from flowforge.backends.sqlite3 import base as sqlite_base
+
+
+def make_plan(team, venue=None, **values):
+    if venue is None:
+        venue = models.Venue.objects.create(
+            owner_team=team,
+            name=f"Venue {models.Venue.objects.count() + 1}",
+            address="1 Lane",
+        )
+    values = {
+        "session_date": date(2026, 5, 2),
+        "session_time": time(10),
+        "session_length_minutes": 60,
+        "group_size": 8,
+        "age_range": "8-10",
+        "plan_goal": "Cornering",
+        **values,
+    }
+    return models.Plan.objects.create(owner_team=team, venue=venue, **values)
+
+
+LOCAL_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "core-tests",
+    }
+}
+
+
+class GcMediaTests(TestCase):
+    def setUp(self):
+        self.media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+        team = models.Team.objects.create(name="Riders")
+        venue = models.Venue.objects.create(
+            owner_team=team, name="Track", address="1 Lane"
+        )
+        location = models.Location.objects.create(
+            owner_team=team, venue=venue, name="Pump track"
+        )
+        self.image = models.LocationImage.objects.create(
+            owner_team=team,
+            location=location,
+            imageUrl=SimpleUploadedFile("kept.png", b"png"),
+        )
+        self.upload("location_images/old.png", timedelta(hours=2))
+        self.upload("location_images/new.png", timedelta(minutes=5))
+
+    def upload(self, name, age):
+        default_storage.save(name, io.BytesIO(b"png"))
+        modified = (timezone.now() - age).timestamp()
+        os.utime(default_storage.path(name), (modified, modified))
+
+    def gc(self, *args):
+        out = io.StringIO()
+        call_command("gc_media", *args, stdout=out)
+        return out.getvalue()
+
+    def files(self):
+        return sorted(os.listdir(os.path.join(self.media, "location_images")))
+
+    def test_deletes_old_files_no_row_refers_to(self):
+        output = self.gc("--dry-run")
+        self.assertIn("orphan: location_images/old.png", output)
+        self.assertEqual(self.files(), ["kept.png", "new.png", "old.png"])
+        output = self.gc()
+        self.assertIn("Scanned 3 files: 1 orphaned, 1 deleted, 1 skipped", output)
+        self.assertEqual(self.files(), ["kept.png", "new.png"])
+
+    def test_min_age_leaves_recent_uploads(self):
+        self.gc("--min-age", "1")
+        self.assertEqual(self.files(), ["kept.png"])
+
+    def test_rechecks_a_file_before_deleting_it(self):
+        # As if the row was committed after the merge-join read past its name
+        with mock.patch.object(
+            gc_media, "iter_referenced_files", return_value=iter([])
+        ):
+            output = self.gc("--min-age", "0")
+        self.assertIn("Scanned 3 files: 2 orphaned, 2 deleted, 1 skipped", output)
+        self.assertEqual(self.files(), ["kept.png"])
+        self.assertTrue(os.path.exists(self.image.imageUrl.path))
+
+
+class IndexAdvisorTests(TestCase):
+    def test_hot_paths_have_no_findings(self):
+        queries = [
+            *query_catalog.library_queries(),
+            *query_catalog.plan_queries(),
+        ]
+        for query in queries:
+            with self.subTest(query.label):
+                plan = index_advisor.explain(query.queryset)
+                self.assertEqual(index_advisor.find_problems(query, plan), [])
+
+    def test_flags_full_scans_and_temp_btrees(self):
+        query = query_catalog.CanonicalQuery(
+            "unindexed",
+            models.Plan.objects.filter(plan_goal="Jumps").order_by("age_range"),
+        )
+        problems = index_advisor.find_problems(
+            query, index_advisor.explain(query.queryset)
+        )
+        self.assertEqual(len(problems), 2)
+        self.assertTrue(problems[0].startswith("full scan: SCAN core_plan"))
+        self.assertTrue(problems[1].startswith("temp b-tree: USE TEMP B-TREE"))
+
+        query.allowed_scans, query.allow_temp_btree = {"core_plan"}, True
+        self.assertEqual(
+            index_advisor.find_problems(query, index_advisor.explain(query.queryset)),
+            [],
+        )
+
+
+class SqliteBackendTests(SimpleTestCase):
+    def connect(self, **pragmas):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        wrapper = sqlite_base.DatabaseWrapper(
+            {
+                **connection.settings_dict,
+                "NAME": os.path.join(directory, "db.sqlite3"),
+                "OPTIONS": {"pragmas": pragmas},
+            },
+            alias="tuned",
+        )
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_new_connections_get_the_pragmas(self):
+        wrapper = self.connect(busy_timeout=250)
+        self.assertEqual(self.pragma(wrapper, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(wrapper, "synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma(wrapper, "busy_timeout"), 250)
+        self.assertEqual(self.pragma(wrapper, "temp_store"), 2)  # MEMORY
+
+    def test_closed_connection_is_not_usable(self):
+        wrapper = self.connect()
+        wrapper.ensure_connection()
+        self.assertTrue(wrapper.is_usable())
+        wrapper.connection.close()
+        self.assertFalse(wrapper.is_usable())
+
+
+@override_settings(REPLICA_DATABASES=["replica1"], REPLICA_PIN_SECONDS=10)
+class ReplicaRoutingTests(SimpleTestCase):
+    cookie = ReplicaRoutingMiddleware.cookie_name
+
+    def route(self, request):
+        """The database the view's reads went to, and the response."""
+        routed = []
+
+        def view(request):
+            routed.append(ReplicaRouter().db_for_read(models.Plan))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return routed[0], response
+
+    def test_safe_requests_read_from_a_replica(self):
+        self.assertEqual(self.route(RequestFactory().get("/"))[0], "replica1")
+        self.assertEqual(ReplicaRouter().db_for_read(models.Plan), "default")
+        self.assertEqual(ReplicaRouter().db_for_write(models.Plan), "default")
+
+    def test_a_write_pins_the_client_to_the_primary(self):
+        database, response = self.route(RequestFactory().post("/"))
+        self.assertEqual(database, "default")
+        request = RequestFactory().get("/")
+        request.COOKIES[self.cookie] = response.cookies[self.cookie].value
+        self.assertEqual(self.route(request)[0], "default")
+
+        for value in ["0", "soon"]:
+            with self.subTest(cookie=value):
+                request.COOKIES[self.cookie] = value
+                self.assertEqual(self.route(request)[0], "replica1")
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas_everything_reads_the_primary(self):
+        database, response = self.route(RequestFactory().get("/"))
+        self.assertEqual(database, "default")
+        self.assertNotIn(self.cookie, response.cookies)
+
+
+class QueryBudgetTests(TestCase):
+    def repeat(self, times):
+        for pk in range(times):
+            models.Team.objects.filter(pk=pk).exists()
+        return HttpResponse()
+
+    def test_budget_fails_on_too_many_or_repeated_queries(self):
+        with query_budget(3, max_repeats=3):
+            self.repeat(3)
+        with self.assertRaisesMessage(AssertionError, "3 queries run, budget is 2"):
+            with query_budget(2):
+                self.repeat(3)
+        with self.assertRaisesMessage(AssertionError, "ran 3 times (limit 1)"):
+            with query_budget(max_repeats=1):
+                self.repeat(3)
+
+    @override_settings(QUERY_INSTRUMENTATION=True, QUERY_REPEAT_THRESHOLD=2)
+    def test_middleware_reports_each_request(self):
+        middleware = QueryBudgetMiddleware(lambda request: self.repeat(3))
+        with self.assertLogs("core.queries", "WARNING") as logs:
+            response = middleware(RequestFactory().get("/teams"))
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+        self.assertIn('desc="1 repeated statements"', response["Server-Timing"])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["path"], line["queries"]), ("/teams", 3))
+
+    @override_settings(QUERY_INSTRUMENTATION=False)
+    def test_middleware_is_off_unless_enabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryBudgetMiddleware(self.repeat)
+
+
+@override_settings(QUERYSET_SEALING="raise")
+class SealingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Done at startup only when sealing is on
+        sealing.install()
+        team = models.Team.objects.create(name="Riders")
+        make_plan(team)
+        models.Location.objects.create(
+            owner_team=team, venue=models.Venue.objects.get(), name="Pump track"
+        )
+
+    def test_lazy_loads_on_sealed_rows_raise(self):
+        location = list(models.Location.objects.seal())[0]
+        with self.assertRaises(sealing.UnsealedAccessError):
+            location.venue
+        plan = list(models.Plan.objects.seal())[0]
+        with self.assertRaises(sealing.UnsealedAccessError):
+            list(plan.sections.all())
+
+    def test_loaded_relations_can_be_read(self):
+        location = list(models.Location.objects.select_related("venue").seal())[0]
+        plan = list(models.Plan.objects.prefetch_related("sections").seal())[0]
+        with query_budget(0):
+            self.assertEqual(location.venue.name, "Venue 1")
+            self.assertEqual(len(plan.sections.all()), 3)
+
+    def test_unsealed_rows_load_lazily(self):
+        location = list(models.Location.objects.all())[0]
+        self.assertEqual(location.venue.name, "Venue 1")
+
+    @override_settings(QUERYSET_SEALING="off")
+    def test_seal_does_nothing_when_off(self):
+        location = list(models.Location.objects.seal())[0]
+        self.assertEqual(location.venue.name, "Venue 1")
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilingTests(TestCase):
+    def test_staff_request_is_profiled(self):
+        staff = get_user_model().objects.create_user("coach", is_staff=True)
+        self.client.force_login(staff)
+        self.client.get("/admin/")
+        self.assertFalse(models.RequestProfile.objects.exists())
+        self.client.get("/admin/?_profile=1")
+        profile = models.RequestProfile.objects.get()
+        self.assertEqual(profile.path, "/admin/?_profile=1")
+        self.assertEqual(profile.profiler, models.RequestProfile.PROFILER_CPROFILE)
+        self.assertEqual(profile.user, staff)
+        self.assertGreater(profile.query_count, 0)
+        self.assertTrue(profile.pstats)
+
+    def test_concurrent_cprofile_request_is_sampled_instead(self):
+        middleware = ProfilingMiddleware(lambda request: None)
+        with profiling.CProfiler(), ExitStack() as stack:
+            profiler = middleware.start_profiler("cprofile", stack)
+            self.assertIsInstance(profiler, profiling.StackSampler)
+        with ExitStack() as stack:
+            profiler = middleware.start_profiler("cprofile", stack)
+            self.assertIsInstance(profiler, profiling.CProfiler)
+
+
+class SeedFlowforgeTests(TestCase):
+    def seed(self, prefix):
+        call_command(
+            "seed_flowforge",
+            prefix=prefix,
+            teams=2,
+            members=2,
+            venues=1,
+            locations=2,
+            activities=6,
+            equipment=3,
+            years=1,
+            sessions_per_week=1,
+            verbosity=0,
+        )
+        return list(
+            models.Plan.objects.filter(owner_team__name__startswith=prefix)
+            .order_by("pk")
+            .values_list("session_date", "group_size", "plan_goal")
+        )
+
+    def test_same_seed_gives_the_same_data(self):
+        plans = self.seed("First")
+        self.assertTrue(plans)
+        self.assertEqual(self.seed("Second"), plans)
+        self.assertEqual(models.Team.objects.count(), 4)
+        self.assertFalse(
+            models.Plan.objects.annotate(section_count=Count("sections"))
+            .exclude(section_count=3)
+            .exists()
+        )
+
+    def test_reusing_a_prefix_is_refused(self):
+        self.seed("First")
+        with self.assertRaisesMessage(CommandError, "Pick another one"):
+            self.seed("First")
+
+
+class BenchmarkCompareTests(SimpleTestCase):
+    def test_flags_slower_runs_and_extra_queries(self):
+        baseline = {
+            "small": {
+                "same": {"p50_ms": 10, "queries": 5},
+                "slower": {"p50_ms": 10, "queries": 5},
+            }
+        }
+        results = {
+            "small": {
+                "same": {"p50_ms": 12, "queries": 5},
+                "slower": {"p50_ms": 13, "queries": 6},
+                "new": {"p50_ms": 50, "queries": 50},
+            },
+            "large": {"same": {"p50_ms": 50, "queries": 50}},
+        }
+        self.assertEqual(
+            bench_flowforge.compare(results, baseline, threshold=0.25),
+            [
+                "small/slower: p50 13ms vs baseline 10ms",
+                "small/slower: 6 queries vs baseline 5",
+            ],
+        )
+
+
+class BenchmarkSetupTests(TestCase):
+    def test_benchmarks_use_the_team_with_most_plans(self):
+        latest, busiest = (
+            models.Team.objects.create(name=name) for name in ["Latest", "Busiest"]
+        )
+        make_plan(latest, session_date=date(2030, 1, 1))
+        venue = make_plan(busiest).venue
+        make_plan(busiest, venue, session_date=date(2026, 6, 1))
+        models.TeamMembership.objects.create(
+            team=busiest,
+            user=get_user_model().objects.create_user("planner"),
+            role=models.TeamMembership.ROLE_SESSION_PLANNER,
+        )
+        benchmarks = bench_flowforge.Benchmarks()
+        self.assertEqual(benchmarks.team, busiest)
+        self.assertEqual(benchmarks.plan.session_date, date(2026, 6, 1))
+
+
+class LoadgenTests(SimpleTestCase):
+    def test_percentiles_are_within_the_histogram_precision(self):
+        histogram = loadgen.LatencyHistogram()
+        for ms in range(1, 1001):
+            histogram.record(ms / 1000)
+        for percent in (50, 90, 99):
+            exact = percent * 10_000
+            self.assertLessEqual(
+                abs(histogram.percentile(percent) - exact) / exact, 0.016
+            )
+        self.assertEqual(histogram.percentile(100), 1_000_000)
+        self.assertEqual(histogram.as_dict()["max_ms"], 1000)
+
+    def test_merged_histograms_match_one_that_saw_everything(self):
+        whole, odd, even = (loadgen.LatencyHistogram() for _ in range(3))
+        for us in range(1, 5000, 7):
+            whole.record(us / 1_000_000)
+            (odd if us % 2 else even).record(us / 1_000_000)
+        odd.merge(even)
+        self.assertEqual(odd.as_dict(), whole.as_dict())
+
+    def test_parse_mix(self):
+        self.assertEqual(
+            loadgen.parse_mix("browse=3,plan"), {"browse": 3.0, "plan": 1.0}
+        )
+        with self.assertRaisesMessage(ValueError, "Unknown scenario 'shop'"):
+            loadgen.parse_mix("browse,shop=2")
+
+
+class DataMigrationTests(TestCase):
+    def setUp(self):
+        team = models.Team.objects.create(name="Riders")
+        venue = models.Venue.objects.create(
+            owner_team=team, name="Track", address="1 Lane"
+        )
+        for value in ["A", "B", "C", "A", "B", "A", "A", "x"]:
+            make_plan(team, venue, coach_qualification_required=value)
+        self.plans = models.Plan.objects.order_by("pk")
+
+    def values(self):
+        return "".join(
+            self.plans.values_list("coach_qualification_required", flat=True)
+        )
+
+    def test_keyset_batches_cover_every_row_once(self):
+        pks = list(self.plans.values_list("pk", flat=True))
+        batches = list(data_migrations.keyset_batches(self.plans, batch_size=3))
+        self.assertEqual(batches, [(None, pks[2]), (pks[2], pks[5]), (pks[5], pks[7])])
+        self.assertEqual(
+            list(
+                data_migrations.keyset_batches(
+                    self.plans, batch_size=3, start_after=pks[5]
+                )
+            ),
+            [(pks[5], pks[7])],
+        )
+
+    def test_remap_values_rewrites_old_values_in_batches(self):
+        with self.assertLogs("core.data_migrations") as logs:
+            updated = data_migrations.remap_values(
+                self.plans, "coach_qualification_required", {"A": "a", "B": "b"}, 2
+            )
+        self.assertEqual(updated, 6)
+        self.assertEqual(self.values(), "abCabaax")
+        self.assertEqual(len(logs.records), 3)
+        self.assertIn("6/6 rows updated (100%)", logs.records[-1].getMessage())
+        self.assertEqual(
+            data_migrations.remap_values(
+                self.plans, "coach_qualification_required", {"A": "a"}
+            ),
+            0,
+        )
+
+    def test_qualification_key_migration_runs_both_ways(self):
+        migration = importlib.import_module(
+            "core.migrations.0007_convert_coach_qualification_to_keys"
+        )
+        editor = SimpleNamespace(connection=connection)
+        self.plans.filter(coach_qualification_required="A").update(
+            coach_qualification_required="CIC Road"
+        )
+        labels = list(self.plans.values_list("coach_qualification_required", flat=True))
+        migration.forwards(apps, editor)
+        self.assertEqual(
+            self.plans.filter(coach_qualification_required="cic_road").count(), 4
+        )
+        self.assertEqual(self.values().replace("cic_road", "A"), "ABCABAAx")
+        migration.backwards(apps, editor)
+        self.assertEqual(
+            list(self.plans.values_list("coach_qualification_required", flat=True)),
+            labels,
+        )
+
+
+class LibraryImportTests(TestCase):
+    def setUp(self):
+        self.team = models.Team.objects.create(name="Riders")
+
+    def import_jsonl(self, *records, kind="equipment"):
+        importer = library_io.LibraryImporter(self.team, kind)
+        lines = [json.dumps(record) + "\n" for record in records]
+        return importer.run(lines, "jsonl")
+
+    def test_upsert_keeps_columns_a_record_leaves_out(self):
+        models.Equipment.objects.create(
+            owner_team=self.team, name="Cones", quantityAvailable=16
+        )
+        report = self.import_jsonl(
+            {"name": "Cones", "safetyInstructions": "Stack after use"},
+            {"name": "Bibs", "quantityAvailable": 20},
+        )
+        self.assertEqual(report.as_dict()["error_count"], 0)
+        cones = models.Equipment.objects.get(owner_team=self.team, name="Cones")
+        self.assertEqual(cones.quantityAvailable, 16)
+        self.assertEqual(cones.safetyInstructions, "Stack after use")
+        bibs = models.Equipment.objects.get(owner_team=self.team, name="Bibs")
+        self.assertEqual(bibs.quantityAvailable, 20)
+
+    def test_export_then_import_copies_the_library(self):
+        cones = models.Equipment.objects.create(
+            owner_team=self.team, name="Cones", quantityAvailable=16
+        )
+        bibs = models.Equipment.objects.create(
+            owner_team=self.team, name="Bibs", safetyInstructions="Wash, 40°C"
+        )
+        for n in range(6):
+            activity = models.Activity.objects.create(
+                owner_team=self.team,
+                name=f"Drill {n}",
+                durationMinutes=10 + n,
+                coachingPoints='Eyes up,\n"look" ahead',
+            )
+            models.ActivityEquipment.objects.create(
+                owner_team=self.team, activity=activity, equipment=cones
+            )
+            if n % 2:
+                models.ActivityEquipment.objects.create(
+                    owner_team=self.team,
+                    activity=activity,
+                    equipment=bibs,
+                    quantity_needed=n,
+                )
+
+        for fmt in library_io.FORMATS:
+            copy = models.Team.objects.create(name=f"Copy {fmt}")
+            for kind in ("equipment", "activities"):
+                with self.subTest(fmt=fmt, kind=kind):
+                    text = "".join(
+                        library_io.write_records(
+                            library_io.iter_records(self.team, kind), kind, fmt
+                        )
+                    )
+                    # One batch: the same statements however many rows
+                    with query_budget(8, max_repeats=1):
+                        report = library_io.LibraryImporter(copy, kind).run(
+                            io.StringIO(text, newline=""), fmt
+                        )
+                    self.assertEqual(report.as_dict()["error_count"], 0)
+                    self.assertEqual(
+                        list(library_io.iter_records(copy, kind)),
+                        list(library_io.iter_records(self.team, kind)),
+                    )
+
+    def test_equipment_names_match_as_the_constraint_does(self):
+        # Names are unique per team case-sensitively, so both can exist
+        for name in ["Cones", "cones"]:
+            models.Equipment.objects.create(owner_team=self.team, name=name)
+        report = self.import_jsonl(
+            {"name": "Slalom", "durationMinutes": 10, "equipment": ["cones:4"]},
+            {"name": "Weave", "durationMinutes": 10, "equipment": ["CONES"]},
+            kind="activities",
+        )
+        self.assertEqual(
+            report.as_dict()["errors"],
+            [{"line": 2, "error": "Unknown equipment: CONES"}],
+        )
+        link = models.ActivityEquipment.objects.get()
+        self.assertEqual((link.equipment.name, link.quantity_needed), ("cones", 4))
+
+
+class LibraryNameMigrationTests(TransactionTestCase):
+    before, after = (
+        ("core", "0009_requestprofile"),
+        ("core", "0010_library_unique_names"),
+    )
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_repeated_names_get_a_suffix_nobody_has(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([self.before])
+        old_apps = executor.loader.project_state([self.before]).apps
+        team = old_apps.get_model("core", "Team").objects.create(name="Riders")
+        Equipment = old_apps.get_model("core", "Equipment")
+        for name in ["Cones", "Cones", "Cones (2)", "Cones", "cones"]:
+            Equipment.objects.create(owner_team=team, name=name)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([self.after])
+        self.assertEqual(
+            list(Equipment.objects.order_by("pk").values_list("name", flat=True)),
+            ["Cones", "Cones (3)", "Cones (2)", "Cones (4)", "cones"],
+        )
+
+
+class TeamArchiveTests(TestCase):
+    def setUp(self):
+        self.media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+        self.team = models.Team.objects.create(name="Riders")
+        venue = models.Venue.objects.create(
+            owner_team=self.team, name="Track", address="1 Lane"
+        )
+        location = models.Location.objects.create(
+            owner_team=self.team, venue=venue, name="Pump track"
+        )
+        models.LocationImage.objects.create(
+            owner_team=self.team,
+            location=location,
+            imageUrl=SimpleUploadedFile("map.png", b"png"),
+        )
+
+    def archive(self, *extra):
+        data = io.BytesIO(b"".join(team_archive.iter_archive(self.team)))
+        with zipfile.ZipFile(data, "a") as archive:
+            for name in extra:
+                archive.writestr(name, b"payload")
+        data.seek(0)
+        return data
+
+    def test_import_restores_rows_and_images(self):
+        data = self.archive()
+        # Venue names are unique across teams, so make room for the copy
+        models.Venue.objects.all().delete()
+        team = models.Team.objects.create(name="Copy")
+        importer = team_archive.import_archive(data, team)
+        self.assertEqual(importer.counts["locationimage"], 1)
+        image = models.LocationImage.objects.get(owner_team=team)
+        self.assertTrue(image.imageUrl.name.startswith("location_images/"))
+        self.assertTrue(os.path.exists(image.imageUrl.path))
+
+    def test_rejects_media_no_row_names(self):
+        names = [
+            "media/location_images/other.png",
+            "media/activity_images/../x.html",
+            "media/index.html",
+        ]
+        archives = [self.archive(name) for name in names]
+        models.Venue.objects.all().delete()
+        team = models.Team.objects.create(name="Copy")
+        before = sorted(os.listdir(self.media))
+        for name, data in zip(names, archives):
+            with self.subTest(name=name):
+                with self.assertRaises(team_archive.ArchiveError):
+                    team_archive.import_archive(data, team)
+                self.assertEqual(sorted(os.listdir(self.media)), before)
+
+
+class PlanArchiveTests(TestCase):
+    def test_restore_brings_back_the_archived_tree(self):
+        team = models.Team.objects.create(name="Riders")
+        plan = make_plan(team)
+        models.PlanSectionItem.objects.create(
+            section=plan.sections.get(order=1), item_type="note", notes="Water"
+        )
+
+        def tree():
+            return list(
+                models.PlanSection.objects.filter(plan=plan.pk)
+                .order_by("order")
+                .values_list("pk", "name", "items__notes")
+            )
+
+        before = tree()
+        self.assertEqual(sum(plan_archive.archive_plans(models.Plan.objects.all())), 1)
+        self.assertFalse(models.Plan.objects.exists())
+        self.assertEqual(models.ArchivedPlan.objects.get().pk, plan.pk)
+        self.assertEqual(
+            sum(plan_archive.restore_plans(models.ArchivedPlan.objects.all())), 1
+        )
+        self.assertEqual(models.Plan.objects.get().plan_goal, "Cornering")
+        self.assertEqual(tree(), before)
+        self.assertFalse(models.ArchivedPlan.objects.exists())
+
+
+class PlanVersionTests(TransactionTestCase):
+    # Versions are written once a transaction commits, so these tests commit
+    def setUp(self):
+        self.team = models.Team.objects.create(name="Riders")
+        self.plan = make_plan(self.team)
+
+    def edit(self):
+        """Version 2: a new goal, a renamed section and one item."""
+        with transaction.atomic():
+            self.plan.plan_goal = "Braking"
+            self.plan.save()
+            section = self.plan.sections.get(order=0)
+            section.name = "Warm up"
+            section.save()
+            models.PlanSectionItem.objects.create(
+                section=section, item_type="note", notes="Check tyres"
+            )
+
+    def numbers(self):
+        return list(self.plan.versions.values_list("number", flat=True))
+
+    def test_one_version_per_committed_transaction(self):
+        self.assertEqual(self.numbers(), [1])
+        self.edit()
+        self.assertEqual(self.numbers(), [1, 2])
+        old, new = plan_versions.rebuild(self.plan.pk, [1, 2]).values()
+        self.assertEqual(old["plan"]["plan_goal"], "Cornering")
+        self.assertEqual(new["plan"]["plan_goal"], "Braking")
+        self.assertEqual(len(old["items"]), 0)
+        self.assertEqual(len(new["items"]), 1)
+
+    def test_diff_and_apply_step_between_versions(self):
+        self.edit()
+        # Replaying every version from the keyframe is one query
+        with query_budget(2):
+            old, new = plan_versions.rebuild(self.plan.pk, [1, 2]).values()
+        before = json.dumps(old, sort_keys=True)
+        delta = plan_versions.diff(old, new)
+        self.assertEqual(set(delta), {"plan", "sections", "items"})
+        self.assertEqual(delta["plan"], {"plan_goal": "Braking"})
+        self.assertEqual(plan_versions.apply(old, delta), new)
+        self.assertEqual(plan_versions.apply(new, plan_versions.diff(new, old)), old)
+        self.assertEqual(plan_versions.diff(new, new), {})
+        self.assertEqual(json.dumps(old, sort_keys=True), before)
+
+    def test_unchanged_save_records_nothing(self):
+        self.plan.save()
+        self.assertEqual(self.numbers(), [1])
+
+    def test_rolled_back_changes_record_nothing(self):
+        with transaction.atomic():
+            self.plan.plan_goal = "Braking"
+            self.plan.save()
+            transaction.set_rollback(True)
+        self.assertEqual(self.numbers(), [1])
+
+    def test_revert_restores_the_tree_as_a_new_version(self):
+        self.edit()
+        plan_versions.revert(self.plan, 1)
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.plan_goal, "Cornering")
+        self.assertEqual(
+            list(self.plan.sections.values_list("name", flat=True)),
+            ["Start", "Middle", "End"],
+        )
+        self.assertFalse(
+            models.PlanSectionItem.objects.filter(section__plan=self.plan).exists()
+        )
+        self.assertEqual(self.numbers(), [1, 2, 3])
+        states = plan_versions.rebuild(self.plan.pk, [1, 3])
+        self.assertEqual(states[1], states[3])
+
+    def test_archiving_keeps_the_history(self):
+        self.edit()
+        before = list(self.plan.versions.values_list("number", "created_at", "data"))
+        list(plan_archive.archive_plans(models.Plan.objects.filter(pk=self.plan.pk)))
+        self.assertFalse(models.PlanVersion.objects.exists())
+        list(plan_archive.restore_plans(models.ArchivedPlan.objects.all()))
+        after = list(self.plan.versions.values_list("number", "created_at", "data"))
+        self.assertEqual(
+            [(n, c, bytes(d)) for n, c, d in after],
+            [(n, c, bytes(d)) for n, c, d in before],
+        )
+        state = plan_versions.rebuild(self.plan.pk, [2])[2]
+        self.assertEqual(state["plan"]["plan_goal"], "Braking")
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TeamCacheTests(TransactionTestCase):
+    # The version token is replaced once a transaction commits
+    def setUp(self):
+        team_cache.get_cache().clear()
+        self.team = models.Team.objects.create(name="Riders")
+
+    def venues(self):
+        return team_cache.get_or_set(
+            self.team.pk,
+            "venues",
+            [],
+            lambda: list(
+                models.Venue.objects.filter(owner_team=self.team).values_list(
+                    "name", flat=True
+                )
+            ),
+        )
+
+    def test_write_invalidates_once_it_commits(self):
+        self.assertEqual(self.venues(), [])
+        with transaction.atomic():
+            models.Venue.objects.create(
+                owner_team=self.team, name="Track", address="1 Lane"
+            )
+            self.assertEqual(self.venues(), [])
+        with query_budget(1):
+            self.assertEqual(self.venues(), ["Track"])
+        with query_budget(0):
+            self.assertEqual(self.venues(), ["Track"])
+
+    def test_rolled_back_write_keeps_the_version(self):
+        version = team_cache.get_version(self.team.pk)
+        with transaction.atomic():
+            models.Venue.objects.create(
+                owner_team=self.team, name="Track", address="1 Lane"
+            )
+            transaction.set_rollback(True)
+        self.assertEqual(team_cache.get_version(self.team.pk), version)
+
+    def test_bump_waits_for_the_commit(self):
+        other = models.Team.objects.create(name="Other")
+        versions = [team_cache.get_version(pk) for pk in (self.team.pk, other.pk)]
+        with transaction.atomic():
+            team_cache.bump(self.team.pk)
+            team_cache.bump(self.team.pk)
+            self.assertEqual(team_cache.get_version(self.team.pk), versions[0])
+        self.assertNotEqual(team_cache.get_version(self.team.pk), versions[0])
+        self.assertEqual(team_cache.get_version(other.pk), versions[1])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ChoiceCacheTests(TransactionTestCase):
+    # Versions are replaced once a transaction commits
+    def setUp(self):
+        choice_cache.get_cache().clear()
+
+    def names(self):
+        return choice_cache.get_choices(
+            models.Team,
+            ["name"],
+            lambda: models.Team.objects.order_by("name").values_list("name", flat=True),
+        )
+
+    def test_saving_a_row_refreshes_its_model_choices(self):
+        models.Team.objects.create(name="Riders")
+        self.assertEqual(self.names(), ["Riders"])
+        with query_budget(0):
+            self.assertEqual(self.names(), ["Riders"])
+        with transaction.atomic():
+            models.Team.objects.create(name="Anchors")
+            self.assertEqual(self.names(), ["Riders"])
+        self.assertEqual(self.names(), ["Anchors", "Riders"])
+
+    def test_a_rolled_back_transaction_leaves_the_version(self):
+        version = choice_cache.get_version(models.Team)
+        with self.assertRaises(ValueError), transaction.atomic():
+            models.Team.objects.create(name="Riders")
+            raise ValueError
+        self.assertEqual(choice_cache.get_version(models.Team), version)
+
+        # Nor is the rolled back change left over for the next commit
+        with transaction.atomic():
+            choice_cache.bump(models.Venue)
+        self.assertEqual(choice_cache.get_version(models.Team), version)
+
+
+class PlanCalendarTests(TestCase):
+    def setUp(self):
+        self.team = models.Team.objects.create(name="Riders")
+        self.plan = make_plan(self.team)
+
+    def assertRollupMatchesPlans(self):
+        expected = {
+            tuple(key): plans
+            for *key, plans in models.Plan.objects.filter(owner_team__isnull=False)
+            .values_list(*plan_calendar.KEY_FIELDS)
+            .annotate(plans=Count("pk"))
+            .order_by()
+        }
+        actual = {
+            (day.owner_team_id, day.venue_id, day.session_date): day.plans
+            for day in plan_calendar.days()
+        }
+        self.assertEqual(actual, expected)
+
+    def test_counts_follow_saves_moves_and_deletes(self):
+        second = make_plan(self.team, venue=self.plan.venue)
+        self.assertRollupMatchesPlans()
+        self.assertEqual(plan_calendar.days().get().plans, 2)
+
+        second.session_date += timedelta(days=1)
+        second.save()
+        self.assertRollupMatchesPlans()
+        second.venue = models.Venue.objects.create(
+            owner_team=self.team, name="Park", address="2 Lane"
+        )
+        second.save()
+        self.assertRollupMatchesPlans()
+        second.plan_goal = "Jumps"
+        second.save(update_fields=["plan_goal"])
+        self.assertRollupMatchesPlans()
+
+        second.delete()
+        self.assertRollupMatchesPlans()
+        plan_calendar.rebuild()
+        self.assertRollupMatchesPlans()
+
+    def test_month_groups_days_by_venue(self):
+        make_plan(self.team, venue=self.plan.venue)
+        day = self.plan.session_date
+        with query_budget(1):
+            days = plan_calendar.month(self.team.pk, day.replace(day=1), day)
+        self.assertEqual(days, [(day, {self.plan.venue_id: 2})])
+
+    def test_rollup_dates_match_the_plans(self):
+        make_plan(self.team, venue=self.plan.venue, session_date=date(2028, 3, 1))
+        for kind, order in [("year", "ASC"), ("month", "DESC"), ("day", "ASC")]:
+            with self.subTest(kind=kind, order=order):
+                expected = list(models.Plan.objects.dates("session_date", kind, order))
+                dates = plan_calendar.days().dates("session_date", kind, order)
+                with query_budget(1):
+                    self.assertEqual(list(dates), expected)
+
+    def test_index_advisor_explains_the_rollup_drill_down(self):
+        (query,) = [
+            query
+            for query in query_catalog.changelist_queries()
+            if query.label == "admin:PlanAdmin:date_hierarchy"
+        ]
+        self.assertEqual(query.queryset.model, models.PlanCalendarDay)
+        self.assertTrue(index_advisor.explain(query.queryset))
+        out = io.StringIO()
+        call_command("index_advisor", "--json", stdout=out)
+        labels = [entry["label"] for entry in json.loads(out.getvalue())]
+        self.assertIn("admin:PlanAdmin:date_hierarchy", labels)
+
+    def test_plans_without_a_team_are_left_out(self):
+        make_plan(None)
+        other = models.Team.objects.create(name="Gone")
+        make_plan(other)
+        other.delete()
+        self.assertEqual(models.Plan.objects.filter(owner_team=None).count(), 2)
+        self.assertRollupMatchesPlans()
+        plan_calendar.rebuild()
+        self.assertRollupMatchesPlans()
+
+        models.PlanCalendarDay.objects.all().delete()
+        migration = importlib.import_module("core.migrations.0014_plancalendarday")
+        migration.count_plans(apps, SimpleNamespace(connection=connection))
+        self.assertRollupMatchesPlans()
+
+    def test_admin_date_hierarchy_reads_the_rollup_while_it_is_complete(self):
+        admin = get_user_model().objects.create_superuser("admin")
+        self.client.force_login(admin)
+
+        def drill_down(query):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f"/admin/core/plan/{query}")
+            self.assertEqual(response.status_code, 200)
+            return any("core_plancalendarday" in q["sql"] for q in queries)
+
+        year = f"?session_date__year={self.plan.session_date.year}"
+        self.assertTrue(drill_down(year))
+        make_plan(None)
+        self.assertFalse(drill_down(year))
+        self.assertTrue(drill_down(f"{year}&owner_team__id__exact={self.team.pk}"))
+
+
+class PlanEditorTests(TestCase):
+    def setUp(self):
+        self.team = models.Team.objects.create(name="Riders")
+        self.plan = make_plan(self.team)
+        self.sections = list(self.plan.sections.order_by("order"))
+        for section in self.sections:
+            for n in range(2):
+                models.PlanSectionItem.objects.create(
+                    section=section,
+                    order=n,
+                    item_type="note",
+                    notes=f"{section.name} {n}",
+                )
+
+    def layout(self):
+        return [
+            (section.name, [item.notes for item in section.items.order_by("order")])
+            for section in self.plan.sections.order_by("order")
+        ]
+
+    def tree(self):
+        """The stored tree, as ids only; saving it unchanged writes nothing."""
+        return {
+            "sections": [
+                {
+                    "id": section.pk,
+                    "name": section.name,
+                    "items": [
+                        {"id": pk}
+                        for pk in section.items.order_by("order").values_list(
+                            "pk", flat=True
+                        )
+                    ],
+                }
+                for section in self.plan.sections.order_by("order")
+            ]
+        }
+
+    def test_unchanged_tree_writes_nothing(self):
+        tree = self.tree()
+        with query_budget(5):
+            changes = plan_editor.save_tree(self.plan.pk, tree)
+        self.assertFalse(changes["changed"])
+
+    def test_swaps_sections_and_moves_items_between_them(self):
+        tree = self.tree()
+        start, middle, end = tree["sections"]
+        end["items"].insert(0, start["items"].pop())
+        start["items"].reverse()
+        tree["sections"] = [end, middle, start]
+        changes = plan_editor.save_tree(self.plan.pk, tree)
+        self.assertEqual(changes["updated"], {"plan": 0, "sections": 2, "items": 3})
+        self.assertEqual(
+            self.layout(),
+            [
+                ("End", ["Start 1", "End 0", "End 1"]),
+                ("Middle", ["Middle 0", "Middle 1"]),
+                ("Start", ["Start 0"]),
+            ],
+        )
+
+    def test_adds_and_drops_rows(self):
+        tree = self.tree()
+        del tree["sections"][1]
+        tree["sections"][0]["items"][1:] = [{"item_type": "note", "notes": "Water"}]
+        moved = tree["sections"][1]["items"].pop(0)
+        tree["sections"].insert(1, {"name": "Skills", "items": [moved]})
+        changes = plan_editor.save_tree(self.plan.pk, tree)
+        self.assertEqual(
+            changes,
+            {
+                "created": {"sections": 1, "items": 1},
+                "updated": {"plan": 0, "sections": 0, "items": 2},
+                "deleted": {"sections": 1, "items": 3},
+                "changed": True,
+            },
+        )
+        self.assertEqual(
+            self.layout(),
+            [
+                ("Start", ["Start 0", "Water"]),
+                ("Skills", ["End 0"]),
+                ("End", ["End 1"]),
+            ],
+        )
+
+    def test_queries_do_not_grow_with_the_tree(self):
+        def reorder():
+            tree = self.tree()
+            tree["sections"].reverse()
+            for section in tree["sections"]:
+                section["items"].reverse()
+                section["items"].append({"item_type": "note", "notes": "Water"})
+            with query_budget(11, max_repeats=1) as queries:
+                plan_editor.save_tree(self.plan.pk, tree)
+            return queries.count
+
+        small = reorder()
+        for section in self.sections:
+            for n in range(10, 30):
+                models.PlanSectionItem.objects.create(
+                    section=section, order=n, item_type="note", notes=str(n)
+                )
+        self.assertEqual(reorder(), small)
+
+    def test_reports_every_problem_and_writes_nothing(self):
+        other = models.Team.objects.create(name="Other")
+        activity = models.Activity.objects.create(owner_team=other, name="Drill")
+        tree = self.tree()
+        tree["sections"][0]["items"][0]["id"] = -1
+        tree["sections"][1]["name"] = ""
+        tree["sections"][2]["items"] += [
+            {"item_type": "note"},
+            {"item_type": "activity", "activity_id": activity.pk},
+        ]
+        before = self.layout()
+        with self.assertRaises(plan_editor.TreeError) as caught:
+            plan_editor.save_tree(self.plan.pk, tree)
+        self.assertEqual(
+            [error["path"] for error in caught.exception.errors],
+            [
+                "sections[0].items[0]",
+                "sections[1]",
+                "sections[2].items[3]",
+                "sections[2].items[2]",
+            ],
+        )
+        self.assertEqual(self.layout(), before)
+
+    def test_saves_the_plan_fields(self):
+        park = models.Venue.objects.create(
+            owner_team=self.team, name="Park", address="2 Lane"
+        )
+        tree = self.tree()
+        tree.update(
+            venue_id=park.pk,
+            session_date="2028-03-01",
+            plan_goal="Jumps",
+            group_size=self.plan.group_size,
+        )
+        changes = plan_editor.save_tree(self.plan.pk, tree)
+        self.assertEqual(changes["updated"], {"plan": 1, "sections": 0, "items": 0})
+        self.plan.refresh_from_db()
+        self.assertEqual(
+            (self.plan.venue, self.plan.session_date, self.plan.plan_goal),
+            (park, date(2028, 3, 1), "Jumps"),
+        )
+        # Saved with its signals, so the calendar moved with it
+        self.assertEqual(
+            list(plan_calendar.days().values_list("venue", "session_date")),
+            [(park.pk, date(2028, 3, 1))],
+        )
+        self.assertFalse(plan_editor.save_tree(self.plan.pk, tree)["changed"])
+
+    def test_reports_bad_plan_fields(self):
+        other = models.Team.objects.create(name="Other")
+        venue = models.Venue.objects.create(owner_team=other, name="Yard", address="")
+        tree = self.tree()
+        tree.update(venue_id=venue.pk, group_size=-1, ability_level="expert")
+        with self.assertRaises(plan_editor.TreeError) as caught:
+            plan_editor.save_tree(self.plan.pk, tree)
+        errors = [error["error"] for error in caught.exception.errors]
+        self.assertEqual(len(errors), 3)
+        self.assertIn(f"venue: no venue {venue.pk} in this team", errors)
+        self.plan.refresh_from_db()
+        self.assertEqual((self.plan.group_size, self.plan.ability_level), (8, "mixed"))
+
+    def test_stale_etag_is_refused(self):
+        self.plan.refresh_from_db()
+        etag = tree_stamps.etag(self.plan.pk, self.plan.tree_modified_at)
+        tree = self.tree()
+        tree["sections"].reverse()
+        plan_editor.save_tree(self.plan.pk, tree, etag=etag)
+        with self.assertRaises(plan_editor.StaleTree):
+            plan_editor.save_tree(self.plan.pk, self.tree(), etag=etag)
@@ -0,0 +1,64 @@
+"""Keep ``Plan.tree_modified_at`` current for everything a plan shows.
+
+``tree_modified_at`` is ``auto_now``, so saving the plan updates it. These
+receivers also move it forward when one of the plan's sections or items is
+saved or deleted, and when a venue, location or activity the plan shows is
+edited or deleted. Each does one ``UPDATE`` through an indexed foreign key,
+in the same transaction as the change, so the stamp can never be older than
+the data it describes.
+
+Bulk operations send no signals; code using them calls ``touch_plans``.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.utils import timezone
+
+from core import models
+
+
+def touch_plans(queryset):
+    """Mark the plans in `queryset` as modified now."""
+    return queryset.update(tree_modified_at=timezone.now())
+
+
+def etag(plan_id, modified):
+    """The ETag for a plan's tree as of `modified`, its tree_modified_at."""
+    return f'"{plan_id}-{modified.timestamp():.6f}"'
+
+
+def plans_showing(sender, instance):
+    """Plans whose tree includes `instance`, a row of model `sender`."""
+    plans = models.Plan.objects.all()
+    if sender is models.PlanSection:
+        return plans.filter(pk=instance.plan_id)
+    if sender is models.PlanSectionItem:
+        return plans.filter(sections=instance.section_id)
+    if sender is models.Venue:
+        return plans.filter(venue=instance.pk)
+    if sender is models.Location:
+        return plans.filter(sections__items__location=instance.pk)
+    return plans.filter(sections__items__activity=instance.pk)
+
+
+def _row_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_plans(plans_showing(sender, instance))
+
+
+def _row_deleted(sender, instance, origin, **kwargs):
+    # Rows deleted along with their plan or section leave that to the
+    # plan's own delete or the section's stamp
+    model = origin._meta.model if hasattr(origin, "_meta") else origin.model
+    if model is sender:
+        touch_plans(plans_showing(sender, instance))
+
+
+def connect():
+    """Start keeping the stamps current (done in CoreConfig.ready)."""
+    for model in (models.PlanSection, models.PlanSectionItem):
+        post_save.connect(_row_saved, sender=model, dispatch_uid="tree_stamps")
+        post_delete.connect(_row_deleted, sender=model, dispatch_uid="tree_stamps")
+    # Before a delete: afterwards the items no longer point at the row
+    for model in (models.Venue, models.Location, models.Activity):
+        post_save.connect(_row_saved, sender=model, dispatch_uid="tree_stamps")
+        pre_delete.connect(_row_deleted, sender=model, dispatch_uid="tree_stamps")
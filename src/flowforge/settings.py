@@ -11,8 +11,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,11 +48,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.QueryBudgetMiddleware",
+    "core.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -83,11 +87,91 @@ WSGI_APPLICATION = "flowforge.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        # django.db.backends.sqlite3 plus WAL and connection PRAGMAs, see
+        # flowforge/backends/sqlite3/base.py
+        "ENGINE": "flowforge.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Keep connections open between requests rather than reconnecting
+        # (and re-running the PRAGMAs) every time.
+        "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", default=600, cast=int),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # Take the write lock at BEGIN so busy_timeout applies, instead of
+            # failing immediately when a read transaction tries to upgrade.
+            "transaction_mode": "IMMEDIATE",
+        },
+    }
+}
+
+# File-based so every worker process on the host shares one cache.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": config(
+            "CACHE_DIR", default=str(Path(tempfile.gettempdir()) / "flowforge-cache")
+        ),
+        "OPTIONS": {"MAX_ENTRIES": 5000},
     }
 }
 
+# Per-team versioned cache for read views (core/team_cache.py): the cache
+# alias, and how long entries live. A change to a team's data makes its old
+# entries unreachable straight away; the timeout only reclaims the space.
+TEAM_CACHE = "default"
+TEAM_CACHE_TIMEOUT = 24 * 3600
+
+# Read replicas: SQLite files kept in sync with `manage.py sync_replicas`.
+# Safe-method requests read from them; see core/routing.py.
+REPLICA_DATABASES = []
+for i, replica_name in enumerate(config("DB_REPLICAS", default="", cast=Csv())):
+    alias = f"replica{i + 1}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": replica_name,
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ["core.routing.ReplicaRouter"]
+
+# Seconds a client reads from the primary after making a write request
+REPLICA_PIN_SECONDS = config("REPLICA_PIN_SECONDS", default=10, cast=int)
+
+
+# Per-request query count/time instrumentation (Server-Timing header and a
+# log line on the "core.queries" logger), see core.middleware.
+QUERY_INSTRUMENTATION = config("QUERY_INSTRUMENTATION", default=DEBUG, cast=bool)
+# Log a warning when one statement runs more than this many times per request
+QUERY_REPEAT_THRESHOLD = 5
+
+
+# On-demand request profiling (core.middleware.ProfilingMiddleware), off by
+# default: number of profiles kept, and how long a `manage.py profile_token`
+# token is valid.
+PROFILING_ENABLED = config("PROFILING_ENABLED", default=False, cast=bool)
+PROFILING_KEEP = 200
+PROFILING_TOKEN_MAX_AGE = 3600
+
+# Sealed querysets: "off", "warn" or "raise" when a sealed instance lazily
+# loads a relation, see core/sealing.py.
+QUERYSET_SEALING = config("QUERYSET_SEALING", default="off")
+SEAL_ALL_QUERYSETS = config("SEAL_ALL_QUERYSETS", default=False, cast=bool)
+
+# Plan version history, see core/plan_versions.py: record a version when a
+# transaction changing a plan commits, storing a full snapshot at least
+# every PLAN_KEYFRAME_INTERVAL versions and deltas in between.
+PLAN_VERSIONING = config("PLAN_VERSIONING", default=True, cast=bool)
+PLAN_KEYFRAME_INTERVAL = 20
+
+# Threads shared by all requests for running team dashboard panels
+# concurrently, see core/dashboard.py.
+DASHBOARD_THREADS = config("DASHBOARD_THREADS", default=4, cast=int)
+
+# Unfiltered admin changelists of big tables show the database's row
+# estimate instead of an exact count once it passes this many rows, see
+# core.admin.EstimatedCountPaginator.
+ADMIN_COUNT_ESTIMATE_ABOVE = 100_000
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -125,6 +209,12 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Media files (user uploads such as LocationImage/ActivityImage)
+# https://docs.djangoproject.com/en/5.2/topics/files/
+
+MEDIA_URL = "media/"
+MEDIA_ROOT = config("MEDIA_ROOT", default=str(BASE_DIR / "media"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,3 +1,265 @@
-# from django.test import TestCase
+import json
+from datetime import date, time, timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase
+
+from core import dashboard, models, tree_stamps
+from core.testing import query_budget
+
+
+def add_member(team, username, role=models.TeamMembership.ROLE_SESSION_LEADER):
+    user, _ = get_user_model().objects.get_or_create(username=username)
+    models.TeamMembership.objects.create(team=team, user=user, role=role)
+    return user
+
+
+class LibraryCopyViewTests(TestCase):
+    def setUp(self):
+        self.target = models.Team.objects.create(name="Target")
+        self.source = models.Team.objects.create(name="Source")
+        self.user = add_member(
+            self.target, "planner", models.TeamMembership.ROLE_SESSION_PLANNER
+        )
+        add_member(self.source, "planner")
+        self.client.force_login(self.user)
+
+    def copy(self, *activities):
+        return self.client.post(
+            f"/teams/{self.target.pk}/library/copy",
+            json.dumps({"activities": [a.pk for a in activities]}),
+            content_type="application/json",
+        )
+
+    def test_copies_from_a_readable_team(self):
+        activity = models.Activity.objects.create(owner_team=self.source, name="Drill")
+        self.assertEqual(self.copy(activity).status_code, 200)
+        self.assertTrue(
+            models.Activity.objects.filter(
+                owner_team=self.target, name="Drill"
+            ).exists()
+        )
+
+    def test_refuses_ownerless_activities(self):
+        readable = models.Activity.objects.create(owner_team=self.source, name="Drill")
+        ownerless = models.Activity.objects.create(owner_team=None, name="Orphan")
+        self.assertEqual(self.copy(readable, ownerless).status_code, 403)
+        self.assertFalse(
+            models.Activity.objects.filter(owner_team=self.target).exists()
+        )
+
+    def test_refuses_activities_of_other_teams(self):
+        other = models.Team.objects.create(name="Other")
+        activity = models.Activity.objects.create(owner_team=other, name="Drill")
+        self.assertEqual(self.copy(activity).status_code, 403)
+
+
+class PlanDetailViewTests(TestCase):
+    def setUp(self):
+        team = models.Team.objects.create(name="Riders")
+        self.client.force_login(add_member(team, "leader"))
+        venue = models.Venue.objects.create(
+            owner_team=team, name="Track", address="1 Lane"
+        )
+        self.plan = models.Plan.objects.create(
+            owner_team=team,
+            venue=venue,
+            session_date=date(2026, 5, 2),
+            session_time=time(10),
+            session_length_minutes=60,
+            group_size=8,
+            age_range="8-10",
+            plan_goal="Cornering",
+        )
+        self.url = f"/plans/{self.plan.pk}"
+
+    def test_unchanged_plan_is_answered_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        # Session, user, the stamp and the membership check
+        with query_budget(4):
+            response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        models.PlanSectionItem.objects.create(
+            section=self.plan.sections.get(order=0), item_type="note", notes="Water"
+        )
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        items = response.json()["sections"][0]["items"]
+        self.assertEqual([item["notes"] for item in items], ["Water"])
+
+
+class ReadApiTests(TestCase):
+    def setUp(self):
+        self.team = models.Team.objects.create(name="Riders")
+        self.client.force_login(add_member(self.team, "leader"))
+        venue = models.Venue.objects.create(
+            owner_team=self.team, name="Track", address="1 Lane"
+        )
+        cones = models.Equipment.objects.create(owner_team=self.team, name="Cones")
+        self.plans = []
+        for n in range(5):
+            activity = models.Activity.objects.create(
+                owner_team=self.team, name=f"Drill {n}"
+            )
+            models.ActivityEquipment.objects.create(
+                owner_team=self.team, activity=activity, equipment=cones
+            )
+            plan = models.Plan.objects.create(
+                owner_team=self.team,
+                venue=venue,
+                # Two plans a day, so the cursor has to break ties on id
+                session_date=date(2026, 5, 1) + timedelta(days=n // 2),
+                session_time=time(10),
+                session_length_minutes=60,
+                group_size=8,
+                age_range="8-10",
+                plan_goal="Cornering",
+            )
+            models.PlanSectionItem.objects.create(
+                section=plan.sections.get(order=0),
+                item_type="activity",
+                activity=activity,
+            )
+            self.plans.append(plan.pk)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_next_links_walk_every_plan_once(self):
+        url, seen = "/api/plans?limit=2&fields=id", []
+        while url:
+            # Session, user, memberships and the page, on every page
+            with query_budget(4, max_repeats=1):
+                page = self.get(url)
+            self.assertLessEqual(len(page["results"]), 2)
+            seen += [row["id"] for row in page["results"]]
+            url = page["next"]
+        self.assertEqual(seen, self.plans)
+
+    def test_expanding_costs_the_same_for_any_page_size(self):
+        def count(limit):
+            with query_budget(max_repeats=1) as queries:
+                page = self.get(f"/api/plans?limit={limit}&expand=sections")
+            self.assertEqual(len(page["results"]), limit)
+            return queries.count
+
+        self.assertEqual(count(1), count(5))
+        page = self.get("/api/plans?limit=1&expand=sections")
+        item = page["results"][0]["sections"][0]["items"][0]
+        self.assertEqual(item["activity"]["name"], "Drill 0")
+        self.assertEqual(item["activity"]["equipment"][0]["name"], "Cones")
+
+    def test_export_streams_every_plan(self):
+        response = self.client.get("/api/plans.ndjson?fields=id")
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], self.plans)
+
+        response = self.client.get("/api/plans.json?fields=id,plan_goal")
+        rows = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(sorted(row["id"] for row in rows), self.plans)
+        self.assertEqual({row["plan_goal"] for row in rows}, {"Cornering"})
+
+    def test_bad_cursor_is_a_400(self):
+        for cursor in ["!!!", "e30", "WyIyMDI2LTEzLTAxIiwgMV0"]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f"/api/plans?cursor={cursor}")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Invalid cursor"})
+
+
+class TeamDashboardViewTests(TransactionTestCase):
+    # The panels run on other threads, which only see committed rows
+    def test_panels_for_a_member(self):
+        team = models.Team.objects.create(name="Riders")
+        venue = models.Venue.objects.create(
+            owner_team=team, name="Track", address="1 Lane"
+        )
+        plan = models.Plan.objects.create(
+            owner_team=team,
+            venue=venue,
+            session_date=date.today() + timedelta(days=1),
+            session_time=time(10),
+            session_length_minutes=60,
+            group_size=8,
+            age_range="8-10",
+            plan_goal="Cornering",
+        )
+        self.client.force_login(add_member(team, "leader"))
+        response = self.client.get(f"/teams/{team.pk}/dashboard")
+        self.assertEqual(response.status_code, 200)
+        panels = response.json()
+        self.assertEqual(set(panels), set(dashboard.PANELS))
+        self.assertEqual([row["id"] for row in panels["upcoming_plans"]], [plan.pk])
+        self.assertEqual(panels["member_counts"], {"leader": 1})
+
+        other = models.Team.objects.create(name="Other")
+        response = self.client.get(f"/teams/{other.pk}/dashboard")
+        self.assertEqual(response.status_code, 403)
+
+
+class PlanTreeViewTests(TestCase):
+    def setUp(self):
+        team = models.Team.objects.create(name="Riders")
+        self.client.force_login(
+            add_member(team, "planner", models.TeamMembership.ROLE_SESSION_PLANNER)
+        )
+        venue = models.Venue.objects.create(
+            owner_team=team, name="Track", address="1 Lane"
+        )
+        self.plan = models.Plan.objects.create(
+            owner_team=team,
+            venue=venue,
+            session_date=date(2026, 5, 2),
+            session_time=time(10),
+            session_length_minutes=60,
+            group_size=8,
+            age_range="8-10",
+            plan_goal="Cornering",
+        )
+
+    def put(self, tree, etag):
+        return self.client.put(
+            f"/plans/{self.plan.pk}/tree",
+            json.dumps(tree),
+            content_type="application/json",
+            headers={"if-match": etag},
+        )
+
+    def test_saves_against_the_etag_it_was_loaded_with(self):
+        self.plan.refresh_from_db()
+        etag = tree_stamps.etag(self.plan.pk, self.plan.tree_modified_at)
+        sections = [
+            {"id": pk, "items": []}
+            for pk in self.plan.sections.order_by("-order").values_list("pk", flat=True)
+        ]
+        sections[0]["items"].append({"item_type": "note", "notes": "Water"})
+        response = self.put({"sections": sections}, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        saved = response.json()["plan"]["sections"]
+        self.assertEqual([s["name"] for s in saved], ["End", "Middle", "Start"])
+        self.assertEqual(saved[0]["items"][0]["notes"], "Water")
+
+        response = self.put({"sections": sections}, etag)
+        self.assertEqual(response.status_code, 412)
+        response = self.put({"sections": [{"id": 0}]}, "*")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["path"], "sections[0]")
+
+    def test_detail_output_can_be_edited_and_sent_back(self):
+        loaded = self.client.get(f"/plans/{self.plan.pk}")
+        tree = loaded.json()
+        response = self.put(tree, loaded["ETag"])
+        self.assertFalse(response.json()["changes"]["changed"])
+
+        tree["plan_goal"] = "Braking"
+        response = self.put(tree, "*")
+        self.assertEqual(response.json()["changes"]["updated"]["plan"], 1)
+        self.assertEqual(response.json()["plan"]["plan_goal"], "Braking")
@@ -1 +1,53 @@
-urlpatterns = []
+from django.urls import path, re_path
+
+from frontend import views
+
+urlpatterns = [
+    re_path(
+        r"^api/(?P<resource>plans|activities|locations|venues|equipment)$",
+        views.ApiListView.as_view(),
+        name="api-list",
+    ),
+    re_path(
+        r"^api/(?P<resource>plans|activities|locations|venues|equipment)\.(?P<fmt>json|ndjson)$",
+        views.ApiExportView.as_view(),
+        name="api-export",
+    ),
+    re_path(
+        r"^teams/(?P<team_id>\d+)/library/(?P<kind>activities|equipment)\.(?P<fmt>csv|jsonl)$",
+        views.LibraryView.as_view(),
+        name="team-library",
+    ),
+    path(
+        "teams/<int:team_id>/library/copy",
+        views.LibraryCopyView.as_view(),
+        name="team-library-copy",
+    ),
+    path(
+        "teams/<int:team_id>/archive.zip",
+        views.TeamArchiveView.as_view(),
+        name="team-archive",
+    ),
+    path(
+        "teams/<int:team_id>/dashboard",
+        views.TeamDashboardView.as_view(),
+        name="team-dashboard",
+    ),
+    path(
+        "teams/<int:team_id>/calendar/<int:year>/<int:month>",
+        views.TeamCalendarView.as_view(),
+        name="team-calendar",
+    ),
+    path("plans/<int:plan_id>", views.PlanDetailView.as_view(), name="plan-detail"),
+    path("plans/<int:plan_id>/tree", views.PlanTreeView.as_view(), name="plan-tree"),
+    path(
+        "plans/<int:plan_id>/versions",
+        views.PlanVersionsView.as_view(),
+        name="plan-versions",
+    ),
+    path(
+        "plans/<int:plan_id>/versions/<int:number>/revert",
+        views.PlanRevertView.as_view(),
+        name="plan-revert",
+    ),
+]
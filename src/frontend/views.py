@@ -1,5 +1,38 @@
+import calendar
+import json
+from datetime import date
+
+from asgiref.sync import sync_to_async
 from django.core.exceptions import PermissionDenied
-from core.models import TeamMembership
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.views import View
+
+from core import (
+    dashboard,
+    dataloader,
+    json_stream,
+    library_copy,
+    library_io,
+    plan_calendar,
+    plan_editor,
+    plan_versions,
+    read_api,
+    team_archive,
+    team_cache,
+    tree_stamps,
+)
+from core.models import (
+    Activity,
+    Plan,
+    PlanSection,
+    PlanSectionItem,
+    PlanVersion,
+    Team,
+    TeamMembership,
+)
 
 
 class TeamOwnershipMixin:
@@ -42,3 +75,409 @@ class TeamOwnershipMixin:
             return qs
         team_ids = request.user.team_memberships.values_list("team", flat=True)
         return qs.filter(owner_team__in=team_ids).distinct()
+
+
+class LibraryView(TeamOwnershipMixin, View):
+    """Export (GET) or import (POST) a team's equipment or activities.
+
+    A POST takes the file either as the raw request body or as a multipart
+    ``file`` field, and answers with the import report as JSON.
+    """
+
+    def dispatch(self, request, team_id, kind, fmt):
+        if not request.user.is_authenticated:
+            raise PermissionDenied("Log in to use the library")
+        self.team = get_object_or_404(Team, pk=team_id)
+        self.kind = kind
+        self.fmt = fmt
+        return super().dispatch(request)
+
+    def get(self, request):
+        # Permission to read the team's library is permission to read any entry
+        self.check_team_permission(request, Activity(owner_team=self.team), "read")
+        records = library_io.iter_records(self.team, self.kind)
+        response = StreamingHttpResponse(
+            library_io.write_records(records, self.kind, self.fmt),
+            content_type=library_io.CONTENT_TYPES[self.fmt],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="team-{self.team.pk}-{self.kind}.{self.fmt}"'
+        )
+        return response
+
+    def post(self, request):
+        self.check_team_permission(request, Activity(owner_team=self.team), "write")
+        upload = request.FILES.get("file") or request
+        importer = library_io.LibraryImporter(self.team, self.kind)
+        report = importer.run(library_io.decode_lines(upload), self.fmt)
+        return JsonResponse(report.as_dict())
+
+
+class TeamArchiveView(TeamOwnershipMixin, View):
+    """Download (GET) or restore (POST) a team's whole library as a zip.
+
+    Both need team manager rights; a restore takes a multipart ``file`` and
+    only goes into a team whose library is still empty.
+    """
+
+    def dispatch(self, request, team_id):
+        if not request.user.is_authenticated:
+            raise PermissionDenied("Log in to use team archives")
+        self.team = get_object_or_404(Team, pk=team_id)
+        self.check_team_permission(request, Activity(owner_team=self.team), "manage")
+        return super().dispatch(request)
+
+    def get(self, request):
+        response = StreamingHttpResponse(
+            team_archive.iter_archive(self.team), content_type="application/zip"
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="team-{self.team.pk}.zip"'
+        )
+        return response
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return JsonResponse({"error": "Upload the archive as 'file'"}, status=400)
+        try:
+            importer = team_archive.import_archive(upload, self.team)
+        except team_archive.ArchiveError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        return JsonResponse(
+            {
+                "counts": importer.counts,
+                "skipped": importer.skipped,
+                "images": len(importer.files),
+            }
+        )
+
+
+class LibraryCopyView(TeamOwnershipMixin, View):
+    """Copy activities (JSON ``{"activities": [ids]}``) into this team.
+
+    Needs write access to the target team and read access to every team
+    the activities come from; only superusers can copy ownerless ones.
+    """
+
+    def post(self, request, team_id):
+        if not request.user.is_authenticated:
+            raise PermissionDenied("Log in to copy activities")
+        team = get_object_or_404(Team, pk=team_id)
+        self.check_team_permission(request, Activity(owner_team=team), "write")
+        try:
+            activity_ids = [int(pk) for pk in json.loads(request.body)["activities"]]
+        except (ValueError, TypeError, KeyError):
+            return JsonResponse(
+                {"error": 'Expected {"activities": [<id>, ...]}'}, status=400
+            )
+
+        if not request.user.is_superuser:
+            owners = dict(
+                Activity.objects.filter(pk__in=activity_ids).values_list(
+                    "pk", "owner_team_id"
+                )
+            )
+            # Unknown and ownerless activities are refused like in
+            # check_team_permission, not silently left out
+            if any(owners.get(pk) is None for pk in activity_ids):
+                raise PermissionDenied("Some of the activities have no owning team")
+            for source_id in set(owners.values()):
+                source = Activity(owner_team=Team(pk=source_id))
+                self.check_team_permission(request, source, "read")
+        copy = library_copy.copy_activities(activity_ids, team)
+        return JsonResponse({**copy.summary(), "ids": copy.activity_ids})
+
+
+class TeamDashboardView(TeamOwnershipMixin, View):
+    """A team's dashboard panels as JSON, see core/dashboard.py.
+
+    An async view, so under ASGI a worker isn't tied up while the panels'
+    queries run; under WSGI Django runs it in an event loop of its own.
+    """
+
+    async def get(self, request, team_id):
+        user = await request.auser()
+        if not user.is_authenticated:
+            raise PermissionDenied("Log in to see the dashboard")
+        team = await aget_object_or_404(Team, pk=team_id)
+        await sync_to_async(self.check_team_permission)(
+            request, Activity(owner_team=team), "read"
+        )
+        return JsonResponse(await dashboard.build(team.pk))
+
+
+class TeamCalendarView(TeamOwnershipMixin, View):
+    """How many plans a team has on each day of a month, per venue.
+
+    Read from the PlanCalendarDay rollup, so the cost follows the number of
+    days rather than plans. ``?venue=`` narrows to one venue.
+    """
+
+    def get(self, request, team_id, year, month):
+        if not request.user.is_authenticated:
+            raise PermissionDenied("Log in to see the calendar")
+        team = get_object_or_404(Team, pk=team_id)
+        self.check_team_permission(request, Activity(owner_team=team), "read")
+        try:
+            first = date(year, month, 1)
+            venue_id = int(request.GET["venue"]) if request.GET.get("venue") else None
+        except ValueError:
+            return JsonResponse({"error": "No such month or venue"}, status=400)
+        last = date(year, month, calendar.monthrange(year, month)[1])
+        days = plan_calendar.month(team.pk, first, last, venue_id)
+        return JsonResponse(
+            {
+                "team": team.pk,
+                "month": first.strftime("%Y-%m"),
+                "plans": sum(sum(venues.values()) for _, venues in days),
+                "days": [
+                    {"date": day, "plans": sum(venues.values()), "venues": venues}
+                    for day, venues in days
+                ],
+            }
+        )
+
+
+def plan_tree(plan_id):
+    """The plan with its sections and items, as JSON-ready dicts."""
+    plan = (
+        Plan.objects.filter(pk=plan_id)
+        .values(
+            "id",
+            "owner_team_id",
+            "venue_id",
+            "venue__name",
+            "session_date",
+            "session_time",
+            "session_length_minutes",
+            "group_size",
+            "age_range",
+            "ability_level",
+            "coaches_required",
+            "coach_qualification_required",
+            "plan_goal",
+            "tree_modified_at",
+        )
+        .get()
+    )
+    sections = {
+        section["id"]: {**section, "items": []}
+        for section in PlanSection.objects.filter(plan_id=plan_id)
+        .order_by("order")
+        .values("id", "name", "order")
+    }
+    items = (
+        PlanSectionItem.objects.filter(section__plan_id=plan_id)
+        .order_by("order")
+        .values(
+            "id",
+            "section_id",
+            "order",
+            "item_type",
+            "activity_id",
+            "activity__name",
+            "location_id",
+            "location__name",
+            "notes",
+            "duration_minutes",
+        )
+    )
+    for item in items:
+        sections[item.pop("section_id")]["items"].append(item)
+    return {**plan, "sections": list(sections.values())}
+
+
+class PlanDetailView(TeamOwnershipMixin, View):
+    """A plan's whole tree as JSON, with an ETag and Last-Modified.
+
+    Both come from ``Plan.tree_modified_at``, so a revalidation that still
+    matches is answered 304 from one primary key lookup, without loading
+    the tree.
+    """
+
+    def get(self, request, plan_id):
+        if not request.user.is_authenticated:
+            raise PermissionDenied("Log in to see plans")
+        stamp = (
+            Plan.objects.filter(pk=plan_id)
+            .values_list("owner_team_id", "tree_modified_at")
+            .first()
+        )
+        if stamp is None:
+            raise Http404("No such plan")
+        team_id, modified = stamp
+        # The permission check only needs the team's id, not the team
+        owner_team = Team(pk=team_id) if team_id else None
+        self.check_team_permission(request, Plan(owner_team=owner_team), "read")
+
+        etag = tree_stamps.etag(plan_id, modified)
+        last_modified = int(modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = team_cache.cached_response(
+                request,
+                team_id,
+                "plan-detail",
+                lambda: JsonResponse(plan_tree(plan_id)),
+                # The body must match the ETag sent with it, even in the
+                # moment between a commit and the team's cache version bump
+                etag,
+            )
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        # Clients may keep it, but must revalidate before reusing it
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class PlanTreeView(TeamOwnershipMixin, View):
+    """Save a plan's edited tree (PUT, JSON), see core/plan_editor.py.
+
+    Send the ETag from PlanDetailView as ``If-Match`` to be refused with a
+    412 if the plan has changed since. Answers with what was changed and
+    the saved tree, under its new ETag.
+    """
+
+    def put(self, request, plan_id):
+        if not request.user.is_authenticated:
+            raise PermissionDenied("Log in to edit plans")
+        team_id = (
+            Plan.objects.filter(pk=plan_id)
+            .values_list("owner_team_id", flat=True)
+            .first()
+        )
+        if team_id is None:
+            raise Http404("No such plan")
+        self.check_team_permission(request, Plan(owner_team=Team(pk=team_id)), "write")
+        try:
+            tree = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "Expected the plan tree as JSON"}, status=400)
+        etag = request.headers.get("If-Match")
+        try:
+            changes = plan_editor.save_tree(
+                plan_id, tree, etag=None if etag == "*" else etag
+            )
+        except plan_editor.StaleTree as exc:
+            return JsonResponse({"error": str(exc)}, status=412)
+        except plan_editor.TreeError as exc:
+            return JsonResponse({"error": str(exc), "errors": exc.errors}, status=400)
+        saved = plan_tree(plan_id)
+        response = JsonResponse({"changes": changes, "plan": saved})
+        response["ETag"] = tree_stamps.etag(plan_id, saved["tree_modified_at"])
+        return response
+
+
+class PlanVersionsView(TeamOwnershipMixin, View):
+    """List a plan's versions, or with ``?from=<n>&to=<n>`` what changed between two."""
+
+    def get(self, request, plan_id):
+        if not request.user.is_authenticated:
+            raise PermissionDenied("Log in to see plan history")
+        plan = get_object_or_404(Plan.objects.select_related("owner_team"), pk=plan_id)
+        self.check_team_permission(request, plan, "read")
+        return team_cache.cached_response(
+            request, plan.owner_team_id, "plan-versions", lambda: self.render(plan)
+        )
+
+    def render(self, plan):
+        request = self.request
+        if "from" not in request.GET and "to" not in request.GET:
+            versions = plan.versions.order_by("-number").values(
+                "number", "created_at", "keyframe"
+            )
+            return JsonResponse({"versions": list(versions)})
+        try:
+            old, new = int(request.GET["from"]), int(request.GET["to"])
+        except (KeyError, ValueError):
+            return JsonResponse({"error": "Give both from and to"}, status=400)
+        try:
+            return JsonResponse(plan_versions.diff_versions(plan, old, new))
+        except PlanVersion.DoesNotExist as exc:
+            return JsonResponse({"error": str(exc)}, status=404)
+
+
+class PlanRevertView(TeamOwnershipMixin, View):
+    """Revert a plan to one of its versions (POST); recorded as a new version."""
+
+    def post(self, request, plan_id, number):
+        if not request.user.is_authenticated:
+            raise PermissionDenied("Log in to revert plans")
+        plan = get_object_or_404(Plan.objects.select_related("owner_team"), pk=plan_id)
+        self.check_team_permission(request, plan, "write")
+        try:
+            plan_versions.revert(plan, number)
+        except PlanVersion.DoesNotExist as exc:
+            return JsonResponse({"error": str(exc)}, status=404)
+        current = plan.versions.order_by("-number").values_list("number", flat=True)
+        return JsonResponse({"reverted_to": number, "version": current.first()})
+
+
+class ApiListView(View):
+    """One page of a read API resource as JSON, see core/read_api.py.
+
+    ``?fields=a,b`` picks the columns, ``?expand=`` nests related rows,
+    ``?limit=`` sets the page size, ``?team=`` narrows to one of the user's
+    teams, and ``?cursor=`` continues from the ``next`` link of the previous
+    page. Plans also take ``?from=`` and ``?to=`` session dates.
+    """
+
+    def get(self, request, resource):
+        if not request.user.is_authenticated:
+            raise PermissionDenied("Log in to use the API")
+        spec = read_api.RESOURCES[resource]
+        try:
+            team_ids = read_api.select_teams(request.user, request.GET.get("team"))
+            fields = read_api.parse_fields(spec, request.GET.get("fields"))
+            expand = read_api.parse_expand(spec, request.GET.get("expand"))
+            rows, cursor = read_api.fetch_page(
+                spec,
+                team_ids,
+                fields,
+                cursor=request.GET.get("cursor"),
+                limit=read_api.parse_limit(request.GET.get("limit")),
+                filters=read_api.parse_filters(spec, request.GET),
+            )
+        except read_api.ApiError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+
+        next_url = None
+        if cursor is not None:
+            query = request.GET.copy()
+            query["cursor"] = cursor
+            next_url = f"{request.path}?{query.urlencode()}"
+        return JsonResponse(
+            {
+                "results": read_api.serialize_page(
+                    spec, rows, fields, expand, dataloader.for_request(request)
+                ),
+                "next": next_url,
+            }
+        )
+
+
+class ApiExportView(View):
+    """Every row of a read API resource, streamed as a JSON array or NDJSON.
+
+    Takes the same ``?team=``, ``?fields=`` and date filters as a page; see
+    core/json_stream.py.
+    """
+
+    def get(self, request, resource, fmt):
+        if not request.user.is_authenticated:
+            raise PermissionDenied("Log in to use the API")
+        spec = read_api.RESOURCES[resource]
+        try:
+            team_ids = read_api.select_teams(request.user, request.GET.get("team"))
+            fields = read_api.parse_fields(spec, request.GET.get("fields"))
+            queryset = read_api.export_queryset(
+                spec, team_ids, read_api.parse_filters(spec, request.GET)
+            )
+        except read_api.ApiError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        response = json_stream.stream_queryset(request, queryset, fields, fmt)
+        response["Content-Disposition"] = f'attachment; filename="{resource}.{fmt}"'
+        return response